@@ -1,18 +1,164 @@
+import os
+import sys
+import time
 import argparse
+import logging
+import numpy as np
 
 from prop_analyze.parsers.redfin import RFPropertyScraper, RFListingScraper
-from prop_analyze.utils import log, float_to_curr, float_to_percent
+from prop_analyze.parsers.transport import RFTransport, DEFAULT_POOL_SIZE
+from prop_analyze.parsers.cache import ResponseCache, CachingTransport, DEFAULT_CACHE_DIR, DEFAULT_TTLS, ENDPOINT_GIS
+from prop_analyze.utils import log, float_to_curr, float_to_percent, configure_logging, flush_logs
 from prop_analyze.analysis.parameters import all_params
-from prop_analyze.analysis.analyze import Analysis
-from prop_analyze.spreadsheet.xls import output_to_xls
+from prop_analyze.analysis.analyze import Analysis, RESULT_METRICS
+from prop_analyze.analysis.batch import PropertyBatch
+from prop_analyze.analysis.ranking import TopK
+from prop_analyze.analysis.scenarios import ScenarioGrid, evaluate_grid
+from prop_analyze.analysis.simulation import Distribution, Simulation, parse_distribution
+from prop_analyze.spreadsheet.xls import output_to_xls, output_batch_to_xls, output_workbook_to_xls
+from prop_analyze.pipeline import PipelineStats, run_pipeline
+from prop_analyze.store import PropertyStore, StoreFilter, DEFAULT_STORE_PATH
+from prop_analyze.watch import SearchWatcher
+from prop_analyze.profiling import Profiler, timed
+from prop_analyze.metrics import Metrics, MetricsFileWriter, MetricsServer, DEFAULT_INTERVAL, LISTINGS, set_gauge
+from prop_analyze.export import open_exporter
+from prop_analyze.work_queue import WorkQueue, enqueue_search, run_workers, DEFAULT_QUEUE_PATH, \
+    DEFAULT_LEASE_SECONDS, DEFAULT_LEASE_SIZE
+from prop_analyze.url_batch import URLBatch, read_urls, open_analyses_file, url_kind, KIND_PROPERTY, KIND_SEARCH, \
+    URLS_FILE, ANALYSES_FILE, RANKING_FILE
+
+
+def cache_ttl(value: str) -> (str, float):
+    """
+    Parse a --cache-ttl
+    :param value: ENDPOINT=SECONDS
+    :return: The endpoint and the seconds
+    """
+    endpoint, _, seconds = value.partition('=')
+    if endpoint not in DEFAULT_TTLS:
+        raise argparse.ArgumentTypeError(f'unknown endpoint {endpoint!r} in {value!r}, must be one of '
+                                         f'{", ".join(DEFAULT_TTLS)}')
+    try:
+        return endpoint, float(seconds)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'invalid number of seconds in {value!r}') from None
+
+
+def grid_spec(value: str) -> str:
+    """
+    Check a --grid when the command line is parsed, so a mistake in it is found before anything is scraped
+    :param value: KEY=START:STOP:STEP or KEY=V1,V2,...
+    :return: The spec, for ScenarioGrid.parse
+    """
+    if '=' not in value:
+        raise argparse.ArgumentTypeError(f'{value!r} must look like KEY=START:STOP:STEP or KEY=V1,V2,...')
+    try:
+        ScenarioGrid.parse([value])
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(f'invalid scenario {value!r}: {e}') from None
+    return value
+
+
+def positive_int(value: str) -> int:
+    """
+    Parse a count that must be at least 1
+    :param value: The count
+    :return: The count
+    """
+    try:
+        n = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'invalid int value: {value!r}') from None
+    if n < 1:
+        raise argparse.ArgumentTypeError(f'{value!r} must be at least 1')
+    return n
+
+
+def dist_spec(value: str) -> (str, Distribution):
+    """
+    Parse a --dist when the command line is parsed, so a mistake in it is found before anything is scraped
+    :param value: KEY=KIND:ARG1,ARG2,...
+    :return: The parameter key and its distribution
+    """
+    try:
+        key, dist = parse_distribution(value)
+        # Checks the key can be simulated, and the args make a valid distribution
+        Simulation({key: dist})
+        dist.sample(np.random.default_rng(), 1)
+    except (TypeError, ValueError) as e:
+        raise argparse.ArgumentTypeError(f'invalid distribution {value!r}: {e}') from None
+    return key, dist
+
+
+def make_transport(args, pool_size: int = DEFAULT_POOL_SIZE):
+    """
+    Create the HTTP transport shared by all the scrapers in this run, with the response cache layered on top
+    :param args: The parsed command line args
+    :param pool_size: The number of pooled connections to keep open
+    :return: The transport
+    """
+    transport = RFTransport(pool_size=pool_size)
+    if args.no_cache:
+        return transport
+
+    cache = ResponseCache(args.cache_dir, max_bytes=int(args.cache_size * 1024 * 1024))
+    return CachingTransport(transport, cache, ttls=dict(args.cache_ttl), offline=args.offline)
+
+
+def run_scenarios(batch: PropertyBatch, args):
+    """
+    Evaluate the properties against the scenario grid from the command line args and log a summary per scenario
+    :param batch: The properties
+    :param args: The parsed command line args
+    """
+    grid = ScenarioGrid.parse(args.grid)
+    log(f'Evaluating {len(batch)} properties against {len(grid)} scenarios')
+    cube = evaluate_grid(batch, grid)
+    columns = grid.columns()
+
+    log(f'********************************')
+    log(f'Scenarios')
+    log(f'********************************')
+
+    for s in range(len(grid)):
+        scenario = ', '.join(f'{k}={columns[k][s]:g}' for k in grid.keys)
+        cash_flow = cube['cash_flow_per_unit'][:, s]
+
+        if len(batch) == 1:
+            log(f'{scenario}\n'
+                f'\tCash Flow Per Unit: {float_to_curr(cash_flow[0])}\n'
+                f'\tCOCR: {float_to_percent(cube["cocr"][0, s])}\n'
+                f'\tDebt Coverage: {cube["debt_coverage"][0, s]:.2f}')
+        else:
+            best = batch.properties[int(np.nanargmax(cash_flow))]
+            log(f'{scenario}\n'
+                f'\tMedian Cash Flow Per Unit: {float_to_curr(np.nanmedian(cash_flow))}\n'
+                f'\tCash Flow Positive: {int((cash_flow > 0).sum())} of {len(batch)}\n'
+                f'\tBest: {best.display_name} ({float_to_curr(np.nanmax(cash_flow))} per unit)')
+
+    if args.grid_out:
+        cube.save(args.grid_out)
+        log(f'Outputted scenarios to {args.grid_out}')
+
+
+def make_simulation(args) -> Simulation:
+    """
+    Create the Monte Carlo simulation from the command line args
+    :param args: The parsed command line args
+    :return: The simulation, or None if it wasn't asked for
+    """
+    if not args.simulate:
+        return None
+    return Simulation(dict(args.dist), draws=args.simulate, seed=args.seed, workers=args.sim_workers)
 
 
 def analyze_property(args):
 
     url = args.url
+    simulation = make_simulation(args)
 
     # Create Redfin Scraper for this URL
-    rf_parser = RFPropertyScraper(url)
+    rf_parser = RFPropertyScraper(url, make_transport(args))
 
     # Scrape and convert to Property with the scraped data from Redfin
     log(f'Scraping {url}')
@@ -35,55 +181,291 @@ def analyze_property(args):
     prop = result.property
 
     if args.xls:
-        output_to_xls(prop)
+        with timed('xls'):
+            output_to_xls(prop)
+    elif args.grid:
+        run_scenarios(PropertyBatch.from_properties([prop]), args)
     else:
         # Start an analysis
         log(f'Analyzing property...')
-        analysis = Analysis(prop)
-        res = analysis.anaylze()
+        with timed('analysis', prop.url):
+            analysis = Analysis(prop)
+            res = analysis.anaylze()
+
+        if simulation:
+            log(f'Simulating {simulation.draws} draws...')
+            simulation.run(PropertyBatch.from_properties([prop])).apply([res])
 
         # TODO pretty print
-        print(res.to_json())
+        with timed('output'):
+            flush_logs()
+            print(res.to_json())
+
+
+def log_current_best(top: TopK, num_analyzed: int):
+    """
+    Log a short summary of the best properties found so far
+    :param top: The current top k
+    :param num_analyzed: The number of properties analyzed so far
+    """
+    log(f'Best {len(top)} after {num_analyzed} properties:')
+    for i, res in enumerate(top.ranked()):
+        log(f'\t{i+1}. {res.property.display_name} - {float_to_curr(res.cash_flow_per_unit)} per unit')
+
+
+def log_best(best: list, title: str):
+    """
+    Log the details of the best properties, best first
+    :param best: The AnalysisResults of the best properties
+    :param title: What they're the best of
+    """
+    log(f'********************************')
+    log(title)
+    log(f'********************************')
+
+    for i in range(len(best)):
+        res = best[i]
+        p = res.property
+        msg = f'{i+1}. {p.display_name}\n' \
+              f'\t{p.url}\n' \
+              f'\tNumber Of Units: {p.num_units}\n' \
+              f'\tAsking Price: {float_to_curr(p.price)}\n' \
+              f'\tCash Flow Per Unit: {float_to_curr(res.cash_flow_per_unit)}\n' \
+              f'\tCOCR: {float_to_percent(res.cocr)}\n'
+
+        if res.prob_negative_cash_flow is not None:
+            pcts = res.cash_flow_per_unit_percentiles
+            msg += f'\tChance of Negative Cash Flow: {float_to_percent(res.prob_negative_cash_flow)}\n' \
+                   f'\tCash Flow Per Unit (p5 - p95): {float_to_curr(pcts["p5"])} - {float_to_curr(pcts["p95"])}\n'
+
+        log(msg)
 
 
 def find_best(args):
     url = args.url
 
-    rf_parser = RFListingScraper(url)
+    # Keep at least one pooled connection per worker
+    transport = make_transport(args, pool_size=max(DEFAULT_POOL_SIZE, args.workers))
+    rf_parser = RFListingScraper(url, workers=args.workers, transport=transport, parse_workers=args.parse_workers)
 
-    log(f'Parsing listings at {url}')
-    all_results = rf_parser.parse_listings()
+    m = args.count
 
-    # Use only the results that parsed without critical errors
-    good_results = [r for r in all_results if len(r.errors) == 0]
+    # TODO sort by AnalysisResult.cash_flow_per_unit OR AnalysisResult.cocr
+    top = TopK(m, key=lambda res: res.cash_flow_per_unit)
 
-    log(f'Parsed {len(all_results)} total properties.  {len(good_results)} properties had no errors')
+    # Scenarios need every property, otherwise only the best ones are kept
+    good_props = [] if args.grid else None
+    simulation = make_simulation(args)
 
-    log(f'Analysing {len(good_results)} properties.')
-    analyses = []
-    for r in good_results:
-        analyses.append(Analysis(r.property).anaylze())
+    stats = PipelineStats()
+    store = PropertyStore(args.store) if args.store else None
+    exporters = [open_exporter(path) for path in args.export]
 
-    m = args.count
-    log(f'Finding {m} best')
+    def on_analysis(res):
+        if good_props is not None:
+            good_props.append(res.property)
+        for exporter in exporters:
+            exporter.write(res)
+        if args.report_every and stats.num_analyzed % args.report_every == 0:
+            log_current_best(top, stats.num_analyzed)
 
-    # TODO sort by AnalysisResult.cash_flow_per_unit OR AnalysisResult.cocr
-    analyses.sort(key=lambda r: r.cash_flow_per_unit, reverse=True)
-    best = analyses[:m]
+    # Scrape, analyze and rank the properties as they come in, so only the best ones are held on to
+    log(f'Parsing listings at {url}')
+    try:
+        run_pipeline(rf_parser, top, stats, on_analysis, store)
+    finally:
+        if store is not None:
+            store.close()
+        for exporter in exporters:
+            exporter.close()
 
-    log(f'********************************')
-    log(f'{m} best properties - by cash flow per unit')
-    log(f'********************************')
+    log(f'Parsed {stats.num_parsed} total properties.  {stats.num_analyzed} properties had no errors')
 
-    for i in range(len(best)):
-        res = best[i]
-        p = res.property
-        log(f'{i+1}. {p.display_name}\n'
-            f'\t{p.url}\n'
-            f'\tNumber Of Units: {p.num_units}\n'
-            f'\tAsking Price: {float_to_curr(p.price)}\n'
-            f'\tCash Flow Per Unit: {float_to_curr(res.cash_flow_per_unit)}\n'
-            f'\tCOCR: {float_to_percent(res.cocr)}\n')
+    best = top.ranked()
+
+    # Only the best properties are reported, so only they are simulated
+    if simulation and best:
+        log(f'Simulating {simulation.draws} draws for each of the {len(best)} best properties')
+        simulation.run(PropertyBatch.from_properties([res.property for res in best])).apply(best)
+
+    with timed('output'):
+        log_best(best, f'{m} best properties - by cash flow per unit')
+
+    if args.xls:
+        with timed('xls'):
+            output_batch_to_xls([res.property for res in best], workers=args.xls_workers)
+    if args.xls_workbook:
+        with timed('xls'):
+            output_workbook_to_xls(best, args.xls_workbook)
+
+    if args.grid and good_props:
+        run_scenarios(PropertyBatch.from_properties(good_props), args)
+
+
+def rank_stored(args):
+    if not os.path.exists(args.store):
+        log(f'There is no property store at {args.store}.  Run find_best with --store first')
+        return
+
+    store_filter = StoreFilter(state=args.state,
+                               city=args.city,
+                               min_units=args.min_units,
+                               max_units=args.max_units,
+                               min_price=args.min_price,
+                               max_price=args.max_price,
+                               scraped_since=time.time() - args.max_age * 86400 if args.max_age else None)
+
+    with PropertyStore(args.store) as store:
+        best = store.query(store_filter, order_by=args.by, limit=args.count)
+
+    log_best(best, f'{len(best)} best stored properties - by {args.by}')
+
+
+def watch_search(args):
+    # The whole point is to see the latest search results, so they're always revalidated unless told otherwise
+    args.cache_ttl = [(ENDPOINT_GIS, 0.0)] + args.cache_ttl
+    transport = make_transport(args, pool_size=max(DEFAULT_POOL_SIZE, args.workers))
+
+    with PropertyStore(args.store) as store:
+        watcher = SearchWatcher(args.url, store, workers=args.workers, transport=transport, count=args.count)
+        while True:
+            log(f'Checking {args.url}')
+            deltas = watcher.poll()
+            if deltas is not None:
+                for d in deltas:
+                    if args.json:
+                        flush_logs()
+                        print(d.to_json())
+                    else:
+                        log(d.describe())
+                log(f'{len(deltas)} changes')
+
+            if not args.interval:
+                break
+            time.sleep(args.interval)
+
+
+def run_batch(args):
+    if args.file == '-':
+        urls = read_urls(sys.stdin)
+    else:
+        with open(args.file) as f:
+            urls = read_urls(f)
+    if not urls:
+        log(f'There are no URLs in {args.file}')
+        return
+
+    transport = make_transport(args, pool_size=max(DEFAULT_POOL_SIZE, args.workers))
+    store = PropertyStore(args.store) if args.store else None
+    batch = URLBatch(urls, workers=args.workers, transport=transport, count=args.count, store=store,
+                     parse_workers=args.parse_workers)
+
+    log(f'Running {len(batch.urls)} URLs')
+    try:
+        with open_analyses_file(args.out) as analyses:
+            batch.run(analyses.write)
+    finally:
+        if store is not None:
+            store.close()
+    batch.save(args.out)
+
+    for o in batch.outcomes:
+        if o.errors:
+            log(f'{o.url}: {"; ".join(o.errors)}')
+    log(f'Saved the results of each URL and every analysis to {args.out}')
+
+    with timed('output'):
+        log_best(batch.top.ranked(), f'{len(batch.top)} best properties of {len(batch.urls)} URLs - by cash flow per unit')
+
+
+def log_queue_status(queue: WorkQueue):
+    counts = queue.counts()
+    log(f'Jobs: {", ".join(f"{n} {state}" for state, n in counts.items())}')
+
+
+def enqueue(args):
+    transport = make_transport(args)
+    with WorkQueue(args.queue) as queue:
+        if args.retry_failed:
+            log(f'Put {queue.retry_failed()} failed jobs back on the queue')
+
+        property_urls = [url for url in args.urls if url_kind(url) == KIND_PROPERTY]
+        if property_urls:
+            log(f'Added {queue.add(property_urls)} property jobs')
+        for url in args.urls:
+            if url_kind(url) == KIND_SEARCH:
+                added = enqueue_search(queue, url, transport)
+                log(f'Could not load {url}' if added is None else f'Added {added} jobs from {url}')
+
+        log_queue_status(queue)
+
+
+def work(args):
+    if args.profile_stats:
+        log('--profile-stats only profiles this process, not the worker processes.  Their stage timings are still in '
+            '--profile', logging.WARNING)
+    with WorkQueue(args.queue) as queue:
+        # For the ETA in the metrics
+        set_gauge(LISTINGS, queue.remaining())
+
+    log(f'Starting {args.processes} workers on {args.queue}')
+    start = time.perf_counter()
+    run_workers(args.queue, args.processes, args.store, args.lease_size, args.lease, args.wait)
+    log(f'Workers finished in {time.perf_counter() - start:.1f}s')
+
+    with WorkQueue(args.queue) as queue:
+        log_queue_status(queue)
+        for url, errors in queue.errors():
+            log(f'\tFAILED: {url}: {"; ".join(errors)}')
+
+
+def run_profiled(args):
+    """
+    Run a sub-command with its stages timed, and output the timing report when it's done
+    """
+    profiler = Profiler(pstats_file=args.profile_stats)
+    try:
+        with profiler:
+            args.func(args)
+    finally:
+        if args.profile_stats:
+            log(f'Saved the cProfile stats to {args.profile_stats}')
+        if args.profile == '-':
+            log(profiler.to_json())
+        elif args.profile:
+            with open(args.profile, 'w') as f:
+                f.write(profiler.to_json())
+            log(f'Saved the profile to {args.profile}')
+
+
+def run_with_metrics(args):
+    """
+    Run a sub-command while exporting live metrics, to a file and / or on a local port
+    """
+    metrics = Metrics()
+    exporters = []
+    if args.metrics_file:
+        exporters.append(MetricsFileWriter(metrics, args.metrics_file, args.metrics_interval))
+    if args.metrics_port is not None:
+        server = MetricsServer(metrics, args.metrics_port)
+        log(f'Serving metrics at {server.url}')
+        exporters.append(server)
+
+    with metrics:
+        for e in exporters:
+            e.start()
+        try:
+            run(args)
+        finally:
+            for e in exporters:
+                e.stop()
+
+
+def run(args):
+    if getattr(args, 'profile', None) or getattr(args, 'profile_stats', None):
+        run_profiled(args)
+    else:
+        args.func(args)
 
 
 def list_params(args):
@@ -94,13 +476,68 @@ def list_params(args):
 
 def main():
     parser = argparse.ArgumentParser(description='Analayzes a property on Redfin and outputs the results')
+    parser.add_argument('--log-level', default='info', choices=('debug', 'info', 'warning', 'error'),
+                        help='Only log messages at or above this level')
 
     subparsers = parser.add_subparsers(help='sub-command help')
 
+    # Options shared by every sub-command that talks to Redfin
+    http_parser = argparse.ArgumentParser(add_help=False)
+    http_parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR, help='Where to cache Redfin responses')
+    http_parser.add_argument('--cache-size', type=float, default=1024, help='The max size of the cache, in MB')
+    http_parser.add_argument('--cache-ttl', action='append', default=[], type=cache_ttl, metavar='ENDPOINT=SECONDS',
+                             help=f'How long cached responses stay fresh, per endpoint '
+                                  f'({", ".join(f"{k}={v}" for k, v in DEFAULT_TTLS.items())})')
+    # --offline only serves responses from the cache, so it can't be used without one
+    cache_mode = http_parser.add_mutually_exclusive_group()
+    cache_mode.add_argument('--no-cache', action='store_true', help='Do not cache Redfin responses')
+    cache_mode.add_argument('--offline', action='store_true', help='Only serve Redfin responses from the cache')
+
+    # Options for evaluating properties against a grid of parameter values
+    grid_parser = argparse.ArgumentParser(add_help=False)
+    grid_parser.add_argument('--grid', action='append', default=[], type=grid_spec, metavar='KEY=START:STOP:STEP',
+                             help='Vary a parameter over a range (STOP included) or list of values (KEY=V1,V2,...), '
+                                  'and evaluate every combination.  Can be given for multiple parameters')
+    grid_parser.add_argument('--grid-out', help='Save the cube of scenario results to this .npz file')
+
+    # Options for simulating the cash flow of properties
+    sim_parser = argparse.ArgumentParser(add_help=False)
+    sim_parser.add_argument('--simulate', type=positive_int, metavar='DRAWS',
+                            help='Simulate the cash flow with this many random draws of vacancy, repairs, capex '
+                                 'and utilities')
+    sim_parser.add_argument('--seed', type=int, help='The seed of the simulation, for reproducible results')
+    sim_parser.add_argument('--dist', action='append', default=[], type=dist_spec, metavar='KEY=KIND:ARGS',
+                            help='The distribution of a simulated parameter, ie. vacancy=triangular:0.02,0.07,0.2.  '
+                                 'KIND is one of fixed, uniform, triangular or normal')
+    sim_parser.add_argument('--sim-workers', type=int, default=1,
+                            help='The number of processes to run the simulation on')
+
+    # Options for profiling where the time goes
+    profile_parser = argparse.ArgumentParser(add_help=False)
+    profile_parser.add_argument('--profile', metavar='FILE', nargs='?', const='-',
+                                help='Time each stage (requests, parsing, analysis, output) and save a JSON report of '
+                                     'their totals and p50/p95/p99 latencies and the slowest listings to FILE, or log '
+                                     'it if no FILE is given')
+    profile_parser.add_argument('--profile-stats', metavar='FILE',
+                                help='Also run cProfile and save its stats to FILE, for pstats or snakeviz.  Only '
+                                     'covers the main thread, so use --workers 1 to include the scraping')
+
+    # Options for exporting live metrics during long scrapes
+    metrics_parser = argparse.ArgumentParser(add_help=False)
+    metrics_parser.add_argument('--metrics-file', metavar='FILE',
+                                help='Write live metrics (requests per second, errors by type, cache hit rate, ETA, '
+                                     '...) to FILE in the Prometheus text format')
+    metrics_parser.add_argument('--metrics-port', type=int, metavar='PORT',
+                                help='Serve live metrics in the Prometheus text format at '
+                                     'http://127.0.0.1:PORT/metrics')
+    metrics_parser.add_argument('--metrics-interval', type=float, default=DEFAULT_INTERVAL, metavar='SECONDS',
+                                help='How often to write the --metrics-file')
+
     params_parser = subparsers.add_parser('params', help='List all the configurable parameters')
     params_parser.set_defaults(func=list_params)
 
-    analyze_parser = subparsers.add_parser('analyze', help='Analyze a Redfin property')
+    analyze_parser = subparsers.add_parser('analyze', help='Analyze a Redfin property',
+                                           parents=[http_parser, grid_parser, sim_parser, profile_parser])
     analyze_parser.add_argument('url', help='A valid Redfin URL for a property/listing')
     analyze_parser.add_argument('--xls', action='store_true', help='Output analysis to XLS spreadsheet')
     # TODO support parameter value overrides as args
@@ -108,13 +545,115 @@ def main():
     #     analyze_parser.add_argument(f'--{p.key}', type=p.val_type, help=p.description)
     analyze_parser.set_defaults(func=analyze_property)
 
-    find_best_parser = subparsers.add_parser('find_best', help='Given a Redfin listing URL, find the best properties')
+    find_best_parser = subparsers.add_parser('find_best', help='Given a Redfin listing URL, find the best properties',
+                                             parents=[http_parser, grid_parser, sim_parser, profile_parser, metrics_parser])
     find_best_parser.add_argument('url', help='A valid Redfin URL for a property/listing')
     find_best_parser.add_argument('--count', type=int, default=10, help='The number of "best" properties to return')
+    find_best_parser.add_argument('--workers', type=int, default=1,
+                                  help='The number of properties to scrape concurrently')
+    find_best_parser.add_argument('--parse-workers', type=int, default=0, metavar='N',
+                                  help='The number of processes to parse the listing pages on, instead of on the '
+                                       'scraping threads.  0 to parse on the threads')
+    find_best_parser.add_argument('--report-every', type=int, default=100, metavar='N',
+                                  help='Log the best properties so far every N analyzed properties.  0 to turn off')
+    find_best_parser.add_argument('--store', metavar='PATH', nargs='?', const=DEFAULT_STORE_PATH,
+                                  help=f'Save every property and its analysis to a local database '
+                                       f'(defaults to {DEFAULT_STORE_PATH}), for the rank sub-command')
+    find_best_parser.add_argument('--xls', action='store_true',
+                                  help='Output an analysis XLS spreadsheet for each of the best properties')
+    find_best_parser.add_argument('--xls-workers', type=int, default=1, metavar='N',
+                                  help='The number of processes to write the --xls spreadsheets with')
+    find_best_parser.add_argument('--xls-workbook', metavar='FILE',
+                                  help='Output one XLS workbook with a summary sheet and a sheet for each of the best '
+                                       'properties')
+    find_best_parser.add_argument('--export', action='append', default=[], metavar='FILE',
+                                  help='Write every analyzed property to FILE as it completes, in the format of its '
+                                       'extension: .ndjson/.jsonl (one JSON object per line), .csv or .arrow (needs '
+                                       'pyarrow).  - writes NDJSON to stdout, and the logs to stderr.  Can be given '
+                                       'more than once')
     find_best_parser.set_defaults(func=find_best)
 
+    batch_parser = subparsers.add_parser('batch', help='Analyze many property and search URLs in one go',
+                                         parents=[http_parser, profile_parser, metrics_parser])
+    batch_parser.add_argument('file', help='A file of property and search URLs, one per line, or - to read them from '
+                                           'stdin.  Blank lines and lines starting with # are skipped')
+    batch_parser.add_argument('--out', metavar='DIR', default='batch_results',
+                              help=f'Where to save the results: {URLS_FILE} (what came of each URL), '
+                                   f'{ANALYSES_FILE} (every analysis) and {RANKING_FILE} (the best properties)')
+    batch_parser.add_argument('--count', type=int, default=10, help='The number of "best" properties to return')
+    batch_parser.add_argument('--workers', type=int, default=1,
+                              help='The number of properties to scrape concurrently, across all the URLs')
+    batch_parser.add_argument('--parse-workers', type=int, default=0, metavar='N',
+                              help='The number of processes to parse the listing pages on, instead of on the '
+                                   'scraping threads.  0 to parse on the threads')
+    batch_parser.add_argument('--store', metavar='PATH', nargs='?', const=DEFAULT_STORE_PATH,
+                              help=f'Save every property and its analysis to a local database '
+                                   f'(defaults to {DEFAULT_STORE_PATH}), for the rank sub-command')
+    batch_parser.set_defaults(func=run_batch)
+
+    enqueue_parser = subparsers.add_parser('enqueue', help='Add a job to the work queue for every listing of search '
+                                                           'URLs (or for property URLs), for the work sub-command',
+                                           parents=[http_parser])
+    enqueue_parser.add_argument('urls', nargs='*', metavar='url',
+                                help='Search or property URLs.  With none, only shows how many jobs are in each state')
+    enqueue_parser.add_argument('--queue', metavar='PATH', default=DEFAULT_QUEUE_PATH, help='The work queue database')
+    enqueue_parser.add_argument('--retry-failed', action='store_true', help='Put the failed jobs back on the queue')
+    enqueue_parser.set_defaults(func=enqueue)
+
+    work_parser = subparsers.add_parser('work', help='Scrape and analyze the jobs on the work queue, on any number of '
+                                                     'processes on this machine',
+                                        parents=[profile_parser, metrics_parser])
+    work_parser.add_argument('--queue', metavar='PATH', default=DEFAULT_QUEUE_PATH, help='The work queue database')
+    work_parser.add_argument('--store', metavar='PATH',
+                             help='The property store to save the analyses to, for the rank sub-command.  Defaults to '
+                                  'the work queue database')
+    work_parser.add_argument('--processes', type=int, default=1, help='The number of worker processes')
+    work_parser.add_argument('--lease', type=float, default=DEFAULT_LEASE_SECONDS, metavar='SECONDS',
+                             help='How long a worker has to finish the jobs it takes before they can be given to '
+                                  'another worker')
+    work_parser.add_argument('--lease-size', type=int, default=DEFAULT_LEASE_SIZE, metavar='N',
+                             help='The number of jobs a worker takes at a time')
+    work_parser.add_argument('--wait', action='store_true',
+                             help='Keep waiting for new jobs once the queue is empty, instead of stopping')
+    work_parser.set_defaults(func=work)
+
+    rank_parser = subparsers.add_parser('rank', help='Rank the properties saved by find_best --store, without '
+                                                     'going to Redfin')
+    rank_parser.add_argument('--store', metavar='PATH', default=DEFAULT_STORE_PATH, help='The database to rank from')
+    rank_parser.add_argument('--count', type=int, default=10, help='The number of "best" properties to return')
+    rank_parser.add_argument('--by', default='cash_flow_per_unit', choices=RESULT_METRICS,
+                             help='The metric to rank by, highest first')
+    rank_parser.add_argument('--state', help='Only properties in this state, ie. IL')
+    rank_parser.add_argument('--city', help='Only properties in this city')
+    rank_parser.add_argument('--min-units', type=int, help='Only properties with at least this many units')
+    rank_parser.add_argument('--max-units', type=int, help='Only properties with at most this many units')
+    rank_parser.add_argument('--min-price', type=float, help='Only properties asking at least this much')
+    rank_parser.add_argument('--max-price', type=float, help='Only properties asking at most this much')
+    rank_parser.add_argument('--max-age', type=float, metavar='DAYS',
+                             help='Only properties scraped in the last DAYS days')
+    rank_parser.set_defaults(func=rank_stored)
+
+    watch_parser = subparsers.add_parser('watch', help='Check a Redfin listing URL for new and changed listings, and '
+                                                       'only scrape those',
+                                         parents=[http_parser, metrics_parser])
+    watch_parser.add_argument('url', help='A valid Redfin URL for a property/listing')
+    watch_parser.add_argument('--store', metavar='PATH', default=DEFAULT_STORE_PATH,
+                              help='The database to keep the listings and their snapshots in')
+    watch_parser.add_argument('--count', type=int, default=10, help='The number of "best" properties to track')
+    watch_parser.add_argument('--workers', type=int, default=1,
+                              help='The number of properties to scrape concurrently')
+    watch_parser.add_argument('--interval', type=float, metavar='SECONDS',
+                              help='Keep checking every SECONDS seconds, instead of checking once')
+    watch_parser.add_argument('--json', action='store_true', help='Print the changes as JSON, one per line')
+    watch_parser.set_defaults(func=watch_search)
+
     args = parser.parse_args()
-    args.func(args)
+    # Keep the logs out of an export to stdout
+    configure_logging(args.log_level, sys.stderr if '-' in getattr(args, 'export', ()) else None)
+    if getattr(args, 'metrics_file', None) or getattr(args, 'metrics_port', None) is not None:
+        run_with_metrics(args)
+    else:
+        run(args)
 
 
 if __name__ == '__main__':
@@ -1,7 +1,105 @@
 from prop_analyze.property import Property
-from prop_analyze.analysis.parameters import get_variables_for_property
+from prop_analyze.analysis.parameters import get_variables_for_property, CompiledParameters
 from prop_analyze.analysis.result import AnalysisResult
 
+# The metrics on AnalysisResult, in the order they are calculated
+RESULT_METRICS = (
+    'loan_amount',
+    'total_cash_needed',
+    'gross_income',
+    'monthly_p_and_i',
+    'monthly_total_operating_expenses',
+    'net_operating_income',
+    'total_cash_flow',
+    'cash_flow_per_unit',
+    'cap_rate',
+    'loan_constant',
+    'cocr',
+    'debt_coverage',
+)
+
+
+def compute_metrics(price, rent, taxes, num_units, variables: dict) -> dict:
+    """
+    Calculate all of the analysis metrics.  This only uses plain arithmetic, so it works the same on floats or on
+    numpy arrays that broadcast together (see BatchAnalysis)
+    :param price: The asking price
+    :param rent: The total monthly rent
+    :param taxes: The annual taxes
+    :param num_units: The number of units
+    :param variables: The variables from get_variables_for_property
+    :return: dict of each of the RESULT_METRICS to its value
+    """
+    v_down_payment = variables['down_payment']
+    v_closing_costs = variables['closing_costs']
+    v_renovation = variables['renovation_budget']
+    v_loan_points = variables['loan_points']
+    v_other_income = variables['other_income']
+    v_interest_rate = variables['interest_rate']
+    v_loan_years = variables['loan_years']
+    v_electricity = variables['electricity_expense']
+    v_gas = variables['gas_expense']
+    v_water = variables['water_expense']
+    v_sewer = variables['sewer_expense']
+    v_garbage = variables['garbage_expense']
+    v_hoa = variables['hoa_expense']
+    v_insurance = variables['insurance_expense']
+    v_other_expenses = variables['other_expense']
+    v_vacancy = variables['vacancy']
+    v_repairs = variables['repairs']
+    v_capex = variables['capex']
+    v_prop_mgmt = variables['prop_mgmt']
+
+    m = dict()
+
+    # Loan Amount
+    m['loan_amount'] = price * (1 - v_down_payment)
+
+    # Total Cash Needed
+    m['total_cash_needed'] = v_closing_costs + v_renovation + \
+                             (price * v_down_payment) + \
+                             (m['loan_amount'] * v_loan_points)
+
+    # Gross Income
+    m['gross_income'] = rent + v_other_income
+
+    # P&I
+    m['monthly_p_and_i'] = ((v_interest_rate / 12) * m['loan_amount']) / \
+                           (1 - (1 + (v_interest_rate / 12)) ** (-12 * v_loan_years))
+
+    # Total Operating Expenses
+    m['monthly_total_operating_expenses'] = (v_electricity + v_gas + v_water + v_sewer + v_garbage + v_hoa) + \
+                                            (v_insurance / 12) + \
+                                            (taxes / 12) + \
+                                            v_other_expenses + \
+                                            (rent * v_vacancy) + \
+                                            (rent * v_repairs) + \
+                                            (rent * v_capex) + \
+                                            (rent * v_prop_mgmt)
+
+    # NOI
+    m['net_operating_income'] = m['gross_income'] - m['monthly_total_operating_expenses']
+
+    # Cash Flow
+    m['total_cash_flow'] = m['net_operating_income'] - m['monthly_p_and_i']
+
+    # Cash Flow Per Unit
+    m['cash_flow_per_unit'] = m['total_cash_flow'] / num_units
+
+    # Cap Rate
+    m['cap_rate'] = (m['net_operating_income'] * 12) / m['loan_amount']
+
+    # Loan Constant
+    m['loan_constant'] = (m['monthly_p_and_i'] * 12) / m['loan_amount']
+
+    # COCR
+    m['cocr'] = (m['total_cash_flow'] * 12) / m['total_cash_needed']
+
+    # Debt Coverage
+    m['debt_coverage'] = m['net_operating_income'] / m['monthly_p_and_i']
+
+    return m
+
 
 class Analysis:
 
@@ -14,85 +112,20 @@ class Analysis:
     # All of the variables needed to analyze
     variables: dict
     
-    def __init__(self, p: Property):
+    def __init__(self, p: Property, params: CompiledParameters = None):
         self.property = p
 
         # Collect the variables / parameters for this property
-        self.variables = get_variables_for_property(self.property)
+        self.variables = get_variables_for_property(self.property, params)
 
     def anaylze(self) -> AnalysisResult:
 
-        price = self.property.price
-        rent = self.property.total_rent
-        taxes = self.property.annual_taxes
-        num_units = self.property.num_units
-        v_down_payment = self.variables['down_payment']
-        v_closing_costs = self.variables['closing_costs']
-        v_renovation = self.variables['renovation_budget']
-        v_loan_points = self.variables['loan_points']
-        v_other_income = self.variables['other_income']
-        v_interest_rate = self.variables['interest_rate']
-        v_loan_years = self.variables['loan_years']
-        v_electricity = self.variables['electricity_expense']
-        v_gas = self.variables['gas_expense']
-        v_water = self.variables['water_expense']
-        v_sewer = self.variables['sewer_expense']
-        v_garbage = self.variables['garbage_expense']
-        v_hoa = self.variables['hoa_expense']
-        v_insurance = self.variables['insurance_expense']
-        v_other_expenses = self.variables['other_expense']
-        v_vacancy = self.variables['vacancy']
-        v_repairs = self.variables['repairs']
-        v_capex = self.variables['capex']
-        v_prop_mgmt = self.variables['prop_mgmt']
+        p = self.property
+        metrics = compute_metrics(p.price, p.total_rent, p.annual_taxes, p.num_units, self.variables)
 
         res = AnalysisResult()
         res.property = self.property
-
-        # Loan Amount
-        res.loan_amount = price * (1 - v_down_payment)
-
-        # Total Cash Needed
-        res.total_cash_needed = v_closing_costs + v_renovation + \
-                                (price * v_down_payment) + \
-                                (res.loan_amount * v_loan_points)
-
-        # Gross Income
-        res.gross_income = rent + v_other_income
-
-        # P&I
-        res.monthly_p_and_i = ((v_interest_rate / 12) * res.loan_amount) / \
-                              (1 - (1 + (v_interest_rate / 12)) ** (-12 * v_loan_years))
-
-        # Total Operating Expenses
-        res.monthly_total_operating_expenses = (v_electricity + v_gas + v_water + v_sewer + v_garbage + v_hoa) + \
-                                               (v_insurance / 12) + \
-                                               (taxes / 12) + \
-                                               v_other_expenses + \
-                                               (rent * v_vacancy) + \
-                                               (rent * v_repairs) + \
-                                               (rent * v_capex) + \
-                                               (rent * v_prop_mgmt)
-
-        # NOI
-        res.net_operating_income = res.gross_income - res.monthly_total_operating_expenses
-
-        # Cash Flow
-        res.total_cash_flow = res.net_operating_income - res.monthly_p_and_i
-
-        # Cash Flow Per Unit
-        res.cash_flow_per_unit = res.total_cash_flow / num_units
-
-        # Cap Rate
-        res.cap_rate = (res.net_operating_income * 12) / res.loan_amount
-
-        # Loan Constant
-        res.loan_constant = (res.monthly_p_and_i * 12) / res.loan_amount
-
-        # COCR
-        res.cocr = (res.total_cash_flow * 12) / res.total_cash_needed
-
-        # Debt Coverage
-        res.debt_coverage = res.net_operating_income / res.monthly_p_and_i
+        for k in RESULT_METRICS:
+            setattr(res, k, metrics[k])
 
         return res
@@ -0,0 +1,149 @@
+import numpy as np
+
+from prop_analyze.property import Property, Utilities
+from prop_analyze.analysis.parameters import all_params, Parameter
+from prop_analyze.analysis.result import AnalysisResult
+from prop_analyze.analysis.analyze import compute_metrics, RESULT_METRICS
+
+
+class PropertyBatch:
+    """
+    A columnar set of properties, with one array per field needed to analyze them
+    """
+
+    # The properties, if the batch was built from Property objects
+    properties: [Property] = None
+
+    price: np.ndarray
+    total_rent: np.ndarray
+    annual_taxes: np.ndarray
+    num_units: np.ndarray
+
+    # For each utility, the number of units per property that have it in their utilities paid
+    utility_counts: {Utilities: np.ndarray}
+
+    def __init__(self, price, total_rent, annual_taxes, num_units, utility_counts: dict):
+        self.price = np.asarray(price, dtype=np.float64)
+        self.total_rent = np.asarray(total_rent, dtype=np.float64)
+        self.annual_taxes = np.asarray(annual_taxes, dtype=np.float64)
+        self.num_units = np.asarray(num_units, dtype=np.int64)
+        self.utility_counts = dict((u, np.asarray(utility_counts[u], dtype=np.int64)) for u in Utilities)
+
+    def __len__(self):
+        return len(self.price)
+
+    @staticmethod
+    def from_properties(props: [Property]) -> 'PropertyBatch':
+        """
+        Build a batch out of Property objects
+        :param props: The properties
+        :return: The batch
+        """
+        counts = [p.utility_counts() for p in props]
+        utility_counts = dict((u, [c[i] for c in counts]) for i, u in enumerate(Utilities))
+
+        batch = PropertyBatch([p.price for p in props],
+                              [p.total_rent for p in props],
+                              [p.annual_taxes for p in props],
+                              [p.num_units for p in props],
+                              utility_counts)
+        batch.properties = list(props)
+        return batch
+
+
+def repeated_sum(val, counts: np.ndarray) -> np.ndarray:
+    """
+    Add up val count times for each count.  This matches adding it once per unit in a loop exactly, which
+    multiplying doesn't always do
+    :param val: The value to add up, or an array of values
+    :param counts: The number of times to add it
+    :return: The sums, with the shape of val followed by the shape of counts
+    """
+    val = np.asarray(val, dtype=np.float64)
+    max_count = int(counts.max()) if counts.size else 0
+    steps = np.broadcast_to(val[..., None], val.shape + (max_count,))
+    sums = np.concatenate((np.zeros(val.shape + (1,)), np.cumsum(steps, axis=-1)), axis=-1)
+    return sums[..., counts]
+
+
+def batch_variables(batch: PropertyBatch, params: [Parameter] = None) -> dict:
+    """
+    The vectorized version of get_variables_for_property, for a whole batch of properties
+    :param batch: The properties
+    :param params: The parameters to use.  Defaults to all_params
+    :return: dict of parameter key to either an array with a value per property, or a single value for all of them
+    """
+    variables = dict()
+    for p in params or all_params:
+        if p.utility_type:
+            v = repeated_sum(p.default_val, batch.utility_counts[p.utility_type])
+        elif p.per_unit:
+            v = p.default_val * batch.num_units
+        else:
+            v = p.default_val
+        variables[p.key] = v
+    return variables
+
+
+class BatchResult:
+    """
+    The AnalysisResult metrics for a batch of properties, with one array per metric
+    """
+
+    batch: PropertyBatch
+    metrics: {str: np.ndarray}
+
+    def __init__(self, batch: PropertyBatch, metrics: dict):
+        self.batch = batch
+        self.metrics = dict((k, np.broadcast_to(np.asarray(v, dtype=np.float64), (len(batch),)))
+                            for k, v in metrics.items())
+
+    def __getitem__(self, metric: str) -> np.ndarray:
+        return self.metrics[metric]
+
+    def rank(self, metric: str = 'cash_flow_per_unit') -> np.ndarray:
+        """
+        Order the properties from best to worst by a metric.  Ties keep their order in the batch
+        :param metric: The metric to rank by
+        :return: The indexes of the properties in the batch, best first
+        """
+        return np.argsort(-self.metrics[metric], kind='stable')
+
+    def to_results(self, indexes=None) -> [AnalysisResult]:
+        """
+        Convert to AnalysisResult objects
+        :param indexes: The indexes of the properties to convert, ie. from rank().  Defaults to all of them
+        :return: The results
+        """
+        if indexes is None:
+            indexes = np.arange(len(self.batch))
+        columns = dict((k, v[indexes].tolist()) for k, v in self.metrics.items())
+
+        results = []
+        for i, idx in enumerate(np.asarray(indexes).tolist()):
+            res = AnalysisResult()
+            res.property = self.batch.properties[idx] if self.batch.properties else None
+            for k in RESULT_METRICS:
+                setattr(res, k, columns[k][i])
+            results.append(res)
+        return results
+
+
+class BatchAnalysis:
+    """
+    Analyzes a whole batch of properties at once, with the same results as running Analysis on each of them.
+    Unlike Analysis, a property with no units or no loan gets inf/nan metrics instead of raising.
+    """
+
+    batch: PropertyBatch
+    variables: dict
+
+    def __init__(self, batch: PropertyBatch, params: [Parameter] = None):
+        self.batch = batch
+        self.variables = batch_variables(batch, params)
+
+    def analyze(self) -> BatchResult:
+        b = self.batch
+        with np.errstate(divide='ignore', invalid='ignore'):
+            metrics = compute_metrics(b.price, b.total_rent, b.annual_taxes, b.num_units, self.variables)
+        return BatchResult(b, metrics)
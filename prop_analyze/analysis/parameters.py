@@ -1,3 +1,5 @@
+import copy
+from functools import lru_cache
 from prop_analyze.property import Property, Utilities
 
 
@@ -160,30 +162,105 @@ all_params = [
 ]
 
 
-def get_variables_for_property(prop: Property):
-
-    params = dict((p.key, p) for p in all_params)
-
-    variables = dict()
-
-    # For each variable, use the default value from the param.  If it's per unit, then multiply
-    for k, p in params.items():
-
-        if p.utility_type:
-            # If this is a utlity, only count it if we know this unit pays utilities
-            v = 0.0
-            for utilities_for_unit in prop.utilities_paid_by_unit:
-                # If this utility is in the list of utilities paid by tenant, dont count it
-                if p.utility_type in utilities_for_unit:
-                    v += p.default_val
-
-        elif p.per_unit:
-            # If per unit, then multiply by number of units
-            v = p.default_val * prop.num_units
-        else:
-            # Otherwise just use the normal value
-            v = p.default_val
-
-        variables[k] = v
-
-    return variables
+# The index of each utility in Property.utility_counts()
+UTILITY_INDEXES = dict((u, i) for i, u in enumerate(Utilities))
+
+
+class CompiledParameters:
+    """
+    A set of parameters compiled into flat tables, so getting the variables of a property takes a lookup or a
+    multiply per parameter instead of a scan of its units.  Compile once, then use it for every property.
+    """
+
+    keys: tuple
+    base_values: tuple
+    per_unit: tuple
+
+    # For each utility parameter, the index of its utility in Property.utility_counts().  None for the others
+    utility_indexes: tuple
+
+    def __init__(self, params: [Parameter] = None, overrides: dict = None):
+        params = params or all_params
+        overrides = overrides or {}
+
+        unknown = set(overrides) - set(p.key for p in params)
+        if unknown:
+            raise ValueError(f'Unknown parameters {", ".join(sorted(unknown))}')
+
+        self.keys = tuple(p.key for p in params)
+        self.base_values = tuple(overrides.get(p.key, p.default_val) for p in params)
+        self.per_unit = tuple(p.per_unit for p in params)
+        self.utility_indexes = tuple(UTILITY_INDEXES[p.utility_type] if p.utility_type else None for p in params)
+
+        # For each utility parameter, its value added up once per unit, by the number of units.  Adding it up
+        # matches the per unit loop this replaced exactly, which multiplying doesn't always do.  Grown as needed
+        self._utility_sums = [[0.0] if u is not None else None for u in self.utility_indexes]
+
+    def with_overrides(self, overrides: dict) -> 'CompiledParameters':
+        """
+        Get a copy with some of the values overridden, without compiling the parameters again
+        :param overrides: dict of parameter key to its value
+        :return: The copy
+        """
+        unknown = set(overrides) - set(self.keys)
+        if unknown:
+            raise ValueError(f'Unknown parameters {", ".join(sorted(unknown))}')
+
+        compiled = copy.copy(self)
+        compiled.base_values = tuple(overrides.get(k, v) for k, v in zip(self.keys, self.base_values))
+        compiled._utility_sums = [([0.0] if k in overrides else sums) if sums is not None else None
+                                  for k, sums in zip(self.keys, self._utility_sums)]
+        return compiled
+
+    def _utility_sum(self, i: int, count: int) -> float:
+        sums = self._utility_sums[i]
+        if count >= len(sums):
+            # Grow a copy, so other threads never see a partly grown table
+            sums = list(sums)
+            while len(sums) <= count:
+                sums.append(sums[-1] + self.base_values[i])
+            self._utility_sums[i] = sums
+        return sums[count]
+
+    def variables_for(self, prop: Property) -> dict:
+        """
+        Get the variables needed to analyze a property
+        :param prop: The property
+        :return: dict of parameter key to its value for the property
+        """
+        counts = prop.utility_counts()
+        num_units = prop.num_units
+
+        variables = dict()
+        for i, k in enumerate(self.keys):
+            u = self.utility_indexes[i]
+            if u is not None:
+                # Only count the utility for the units that pay it
+                v = self._utility_sum(i, counts[u])
+            elif self.per_unit[i]:
+                # If per unit, then multiply by number of units
+                v = self.base_values[i] * num_units
+            else:
+                # Otherwise just use the normal value
+                v = self.base_values[i]
+            variables[k] = v
+
+        return variables
+
+
+@lru_cache(maxsize=None)
+def default_parameters() -> CompiledParameters:
+    """
+    :return: all_params with their default values, compiled once
+    """
+    return CompiledParameters(all_params)
+
+
+def get_variables_for_property(prop: Property, params: CompiledParameters = None) -> dict:
+    """
+    Get the variables needed to analyze a property
+    :param prop: The property
+    :param params: The compiled parameters to use.  Defaults to all_params with their default values
+    :return: dict of parameter key to its value for the property
+    """
+    return (params or default_parameters()).variables_for(prop)
@@ -0,0 +1,57 @@
+import heapq
+
+
+class TopK:
+    """
+    Keeps the best k items seen so far, using a bounded min-heap so memory stays O(k) however many items are
+    pushed.  The ranking is identical to a stable sort of every item by key, descending: ties go to the item
+    that was pushed first.
+    """
+
+    k: int
+
+    def __init__(self, k: int, key=lambda res: res.cash_flow_per_unit):
+        self.k = k
+        self.key = key
+
+        # The number of items pushed so far
+        self.count = 0
+
+        # Heap of (key, -push order, item).  The root is the worst of the best k
+        self._heap = []
+
+    def __len__(self):
+        return len(self._heap)
+
+    def push(self, item) -> bool:
+        """
+        Consider an item for the top k
+        :param item: The item
+        :return: boolean representing if the item is in the top k (for now)
+        """
+        entry = (self.key(item), -self.count, item)
+        self.count += 1
+
+        if self.k <= 0:
+            return False
+        if len(self._heap) < self.k:
+            heapq.heappush(self._heap, entry)
+            return True
+        if entry[:2] > self._heap[0][:2]:
+            heapq.heapreplace(self._heap, entry)
+            return True
+        return False
+
+    def ranked(self) -> list:
+        """
+        Get the best items so far
+        :return: The items, best first
+        """
+        return [item for _, _, item in sorted(self._heap, key=lambda e: e[:2], reverse=True)]
+
+    def ranked_with_order(self) -> [(int, object)]:
+        """
+        Like ranked(), but with the order each item was pushed in (starting at 0)
+        :return: List of (push order, item), best first
+        """
+        return [(-neg_order, item) for _, neg_order, item in sorted(self._heap, key=lambda e: e[:2], reverse=True)]
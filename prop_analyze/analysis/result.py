@@ -1,8 +1,28 @@
 import json
 from prop_analyze.property import Property
+from prop_analyze.utils import slots_to_dict
 
 
 class AnalysisResult:
+    # Slotted like Property, in the order the analysis sets them, which is the order to_json outputs them in
+    __slots__ = (
+        'property',
+        'loan_amount',
+        'total_cash_needed',
+        'gross_income',
+        'monthly_p_and_i',
+        'monthly_total_operating_expenses',
+        'net_operating_income',
+        'total_cash_flow',
+        'cash_flow_per_unit',
+        'cap_rate',
+        'loan_constant',
+        'cocr',
+        'debt_coverage',
+        'cash_flow_per_unit_percentiles',
+        'prob_negative_cash_flow',
+    )
+
     property: Property
     loan_amount: float
     total_cash_needed: float
@@ -17,5 +37,37 @@ class AnalysisResult:
     cocr: float
     debt_coverage: float
 
+    # Only set if the property was simulated (see simulation.py).  The monthly cash flow per unit at each
+    # percentile (ie. 'p5'), and the fraction of draws where the total cash flow was negative
+    cash_flow_per_unit_percentiles: dict
+    prob_negative_cash_flow: float
+
+    # The value of the optional fields until they're set
+    _DEFAULTS = {
+        'cash_flow_per_unit_percentiles': None,
+        'prob_negative_cash_flow': None,
+    }
+
+    def __getattr__(self, k: str):
+        # Only called for slots that haven't been set
+        try:
+            return AnalysisResult._DEFAULTS[k]
+        except KeyError:
+            raise AttributeError(f"'AnalysisResult' object has no attribute '{k}'") from None
+
+    def __getstate__(self) -> dict:
+        # Only pickle the slots that have been set, not their defaults
+        return slots_to_dict(self)
+
+    def __setstate__(self, state: dict):
+        for k, v in state.items():
+            setattr(self, k, v)
+
+    def to_dict(self) -> dict:
+        """
+        :return: The fields that have been set, like __dict__ would be
+        """
+        return slots_to_dict(self)
+
     def to_json(self) -> str:
-        return json.dumps(self, indent=4, default=lambda o: o.display_name if isinstance(o, Property) else o.__dict__)
\ No newline at end of file
+        return json.dumps(self, indent=4, default=lambda o: o.display_name if isinstance(o, Property) else o.to_dict())
@@ -0,0 +1,146 @@
+import numpy as np
+
+from prop_analyze.analysis.parameters import all_params, Parameter
+from prop_analyze.analysis.analyze import compute_metrics
+from prop_analyze.analysis.batch import PropertyBatch, repeated_sum
+
+# The metrics kept in a ScenarioCube
+CUBE_METRICS = ('cash_flow_per_unit', 'cocr', 'debt_coverage')
+
+
+class ScenarioGrid:
+    """
+    A Cartesian grid of parameter values.  Every combination of the values is one scenario
+    """
+
+    # The keys of the parameters that vary
+    keys: [str]
+
+    # The values of each parameter in the grid
+    values: [np.ndarray]
+
+    def __init__(self, ranges: dict):
+        known_keys = set(p.key for p in all_params)
+        for k in ranges:
+            if k not in known_keys:
+                raise ValueError(f'Unknown parameter {k}.  Must be one of {", ".join(sorted(known_keys))}')
+
+        self.keys = list(ranges.keys())
+        self.values = [np.asarray(ranges[k], dtype=np.float64) for k in self.keys]
+
+    def __len__(self):
+        return int(np.prod([len(v) for v in self.values])) if self.values else 1
+
+    @staticmethod
+    def parse(specs: [str]) -> 'ScenarioGrid':
+        """
+        Parse a grid from command line specs, which look like KEY=START:STOP:STEP (STOP is included) or
+        KEY=VAL1,VAL2,...
+        :param specs: The specs
+        :return: The grid
+        """
+        ranges = dict()
+        for spec in specs:
+            k, _, v = spec.partition('=')
+            if ':' in v:
+                bounds = v.split(':')
+                if len(bounds) != 3:
+                    raise ValueError(f'The range of {k} must be START:STOP:STEP')
+                start, stop, step = (float(x) for x in bounds)
+                if step <= 0:
+                    raise ValueError(f'The step of {k} must be positive')
+                # Round off the floating point noise from stepping
+                ranges[k] = np.round(np.arange(start, stop + step / 2, step), 10)
+            else:
+                ranges[k] = [float(x) for x in v.split(',')]
+        return ScenarioGrid(ranges)
+
+    def columns(self) -> dict:
+        """
+        Get the value of each varying parameter in every scenario
+        :return: dict of parameter key to an array with one value per scenario
+        """
+        if not self.keys:
+            return dict()
+        mesh = np.meshgrid(*self.values, indexing='ij')
+        return dict((k, m.ravel()) for k, m in zip(self.keys, mesh))
+
+
+class ScenarioCube:
+    """
+    The results of evaluating every property against every scenario in a grid.  Each metric is an array with
+    a row per property and a column per scenario
+    """
+
+    batch: PropertyBatch
+    grid: ScenarioGrid
+    metrics: {str: np.ndarray}
+
+    def __init__(self, batch: PropertyBatch, grid: ScenarioGrid, metrics: dict):
+        self.batch = batch
+        self.grid = grid
+        self.metrics = metrics
+
+    def __getitem__(self, metric: str) -> np.ndarray:
+        return self.metrics[metric]
+
+    def save(self, path: str):
+        """
+        Save the cube to a compressed .npz file, along with the scenario values and property URLs
+        :param path: The file to write
+        """
+        arrays = dict(self.metrics)
+        for k, v in self.grid.columns().items():
+            arrays[f'scenario_{k}'] = v
+        if self.batch.properties:
+            arrays['url'] = np.array([p.url for p in self.batch.properties])
+        np.savez_compressed(path, **arrays)
+
+
+def grid_variables(batch: PropertyBatch, grid: ScenarioGrid, params: [Parameter] = None) -> dict:
+    """
+    Like batch_variables, but with the parameters in the grid varying per scenario
+    :param batch: The properties
+    :param grid: The scenarios
+    :param params: The parameters to use.  Defaults to all_params
+    :return: dict of parameter key to a value that broadcasts to (# of properties, # of scenarios)
+    """
+    scenario_vals = grid.columns()
+    num_units = batch.num_units[:, None]
+
+    variables = dict()
+    for p in params or all_params:
+        # Vary across the scenarios (columns) if the parameter is in the grid
+        val = scenario_vals[p.key] if p.key in scenario_vals else p.default_val
+
+        if p.utility_type:
+            v = repeated_sum(val, batch.utility_counts[p.utility_type])
+            v = v.T if np.ndim(val) else v[:, None]
+        elif p.per_unit:
+            v = val * num_units
+        else:
+            v = val[None, :] if np.ndim(val) else val
+        variables[p.key] = v
+    return variables
+
+
+def evaluate_grid(batch: PropertyBatch, grid: ScenarioGrid, params: [Parameter] = None) -> ScenarioCube:
+    """
+    Evaluate every property against every scenario in one vectorized pass
+    :param batch: The properties
+    :param grid: The scenarios
+    :param params: The parameters to use.  Defaults to all_params
+    :return: The cube of results
+    """
+    variables = grid_variables(batch, grid, params)
+    shape = (len(batch), len(grid))
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        metrics = compute_metrics(batch.price[:, None],
+                                  batch.total_rent[:, None],
+                                  batch.annual_taxes[:, None],
+                                  batch.num_units[:, None],
+                                  variables)
+
+    cube_metrics = dict((k, np.broadcast_to(metrics[k], shape)) for k in CUBE_METRICS)
+    return ScenarioCube(batch, grid, cube_metrics)
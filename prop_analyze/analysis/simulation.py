@@ -0,0 +1,252 @@
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+from prop_analyze.analysis.parameters import all_params, Parameter
+from prop_analyze.analysis.analyze import compute_metrics
+from prop_analyze.analysis.batch import PropertyBatch, batch_variables
+from prop_analyze.analysis.result import AnalysisResult
+
+DEFAULT_DRAWS = 10000
+DEFAULT_PERCENTILES = (5, 25, 50, 75, 95)
+
+# Properties are simulated in fixed size chunks, each with its own random stream.  Since the chunks don't depend
+# on the number of workers, the results for a given seed are the same no matter how many workers are used
+CHUNK_PROPERTIES = 16
+
+
+class Distribution:
+    """
+    A distribution that a parameter is sampled from
+    """
+
+    def sample(self, rng: np.random.Generator, size) -> np.ndarray:
+        raise NotImplementedError()
+
+
+class Fixed(Distribution):
+    def __init__(self, val: float):
+        self.val = val
+
+    def sample(self, rng: np.random.Generator, size) -> np.ndarray:
+        return np.full(size, self.val, dtype=np.float64)
+
+
+class Uniform(Distribution):
+    def __init__(self, low: float, high: float):
+        self.low = low
+        self.high = high
+
+    def sample(self, rng: np.random.Generator, size) -> np.ndarray:
+        return rng.uniform(self.low, self.high, size)
+
+
+class Triangular(Distribution):
+    def __init__(self, low: float, mode: float, high: float):
+        self.low = low
+        self.mode = mode
+        self.high = high
+
+    def sample(self, rng: np.random.Generator, size) -> np.ndarray:
+        return rng.triangular(self.low, self.mode, self.high, size)
+
+
+class Normal(Distribution):
+    """
+    A normal distribution, clipped so it never goes below low (expenses and rates can't be negative)
+    """
+    def __init__(self, mean: float, std: float, low: float = 0.0):
+        self.mean = mean
+        self.std = std
+        self.low = low
+
+    def sample(self, rng: np.random.Generator, size) -> np.ndarray:
+        return np.maximum(rng.normal(self.mean, self.std, size), self.low)
+
+
+DISTRIBUTIONS = {
+    'fixed': Fixed,
+    'uniform': Uniform,
+    'triangular': Triangular,
+    'normal': Normal,
+}
+
+
+def _params_by_key(params: [Parameter]) -> dict:
+    return dict((p.key, p) for p in params)
+
+
+def default_distributions(params: [Parameter] = None) -> dict:
+    """
+    The default distributions of the uncertain parameters.  Vacancy, repairs and capex are skewed towards running
+    higher than their estimate, and utilities vary from 70% to 150% of theirs
+    :param params: The parameters to use.  Defaults to all_params
+    :return: dict of parameter key to Distribution
+    """
+    p = _params_by_key(params or all_params)
+    dists = {
+        'vacancy': Triangular(0.02, p['vacancy'].default_val, 0.20),
+        'repairs': Triangular(0.02, p['repairs'].default_val, 0.15),
+        'capex': Triangular(0.02, p['capex'].default_val, 0.15),
+    }
+    for param in p.values():
+        if param.utility_type:
+            dists[param.key] = Triangular(0.7 * param.default_val, param.default_val, 1.5 * param.default_val)
+    return dists
+
+
+def parse_distribution(spec: str) -> (str, Distribution):
+    """
+    Parse a distribution from the command line, which looks like KEY=KIND:ARG1,ARG2,...  ie. vacancy=uniform:0.05,0.1
+    :param spec: The spec
+    :return: The parameter key and its distribution
+    """
+    k, _, v = spec.partition('=')
+    kind, _, dist_args = v.partition(':')
+    if kind not in DISTRIBUTIONS:
+        raise ValueError(f'Unknown distribution {kind}.  Must be one of {", ".join(DISTRIBUTIONS)}')
+    return k, DISTRIBUTIONS[kind](*(float(a) for a in dist_args.split(',')))
+
+
+class SimulationResult:
+    """
+    The distribution of monthly cash flow of each property in a batch
+    """
+
+    percentiles: tuple
+
+    # The monthly cash flow per unit at each percentile, with a row per property
+    cash_flow_per_unit_percentiles: np.ndarray
+
+    # The fraction of draws with a negative total cash flow, per property
+    prob_negative_cash_flow: np.ndarray
+
+    def __init__(self, percentiles: tuple, cash_flow_per_unit_percentiles: np.ndarray,
+                 prob_negative_cash_flow: np.ndarray):
+        self.percentiles = percentiles
+        self.cash_flow_per_unit_percentiles = cash_flow_per_unit_percentiles
+        self.prob_negative_cash_flow = prob_negative_cash_flow
+
+    def apply(self, results: [AnalysisResult], indexes=None):
+        """
+        Set the simulation results on AnalysisResults
+        :param results: The results
+        :param indexes: The index in the batch of each result, ie. from BatchResult.rank().  Defaults to in order
+        """
+        if indexes is None:
+            indexes = range(len(results))
+        for res, idx in zip(results, indexes):
+            row = self.cash_flow_per_unit_percentiles[idx].tolist()
+            res.cash_flow_per_unit_percentiles = dict((f'p{p}', v) for p, v in zip(self.percentiles, row))
+            res.prob_negative_cash_flow = float(self.prob_negative_cash_flow[idx])
+
+
+def _simulate_chunk(fixed_cash_flow: np.ndarray,
+                    rent: np.ndarray,
+                    num_units: np.ndarray,
+                    utility_counts: dict,
+                    distributions: dict,
+                    draws: int,
+                    percentiles: tuple,
+                    seed: np.random.SeedSequence) -> (np.ndarray, np.ndarray):
+    """
+    Simulate a chunk of properties.  Every sampled value is an array with a row per property and a column per draw
+    :return: The cash flow per unit percentiles and the probability of a negative cash flow, per property
+    """
+    rng = np.random.default_rng(seed)
+    size = (len(rent), draws)
+
+    rent = rent[:, None]
+    cash_flow = np.broadcast_to(fixed_cash_flow[:, None], size).copy()
+
+    for k in ('vacancy', 'repairs', 'capex'):
+        cash_flow -= rent * distributions[k].sample(rng, size)
+
+    # Utilities are sampled per unit, and paid for every unit that has them
+    for k, count in utility_counts.items():
+        cash_flow -= distributions[k].sample(rng, size) * count[:, None]
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cash_flow_per_unit = cash_flow / num_units[:, None]
+    return np.percentile(cash_flow_per_unit, percentiles, axis=1).T, (cash_flow < 0).mean(axis=1)
+
+
+class Simulation:
+    """
+    Monte Carlo simulation of the monthly cash flow of properties, with vacancy, repairs, capex and the utility
+    expenses sampled from distributions instead of fixed at their estimates
+    """
+
+    distributions: dict
+    draws: int
+    seed: int
+    workers: int
+    percentiles: tuple
+    params: [Parameter]
+
+    def __init__(self,
+                 distributions: dict = None,
+                 draws: int = DEFAULT_DRAWS,
+                 seed: int = None,
+                 workers: int = 1,
+                 percentiles: tuple = DEFAULT_PERCENTILES,
+                 params: [Parameter] = None):
+        self.params = params or all_params
+        self.distributions = default_distributions(self.params)
+        self.distributions.update(distributions or {})
+        self.draws = draws
+        self.seed = seed
+        self.workers = max(1, workers)
+        self.percentiles = tuple(percentiles)
+
+        unknown = set(self.distributions) - set(self._sampled_keys())
+        if unknown:
+            raise ValueError(f'Can not simulate {", ".join(sorted(unknown))}.  '
+                             f'Only {", ".join(self._sampled_keys())} can be simulated')
+
+    def _sampled_keys(self) -> [str]:
+        return ['vacancy', 'repairs', 'capex'] + [p.key for p in self.params if p.utility_type]
+
+    def run(self, batch: PropertyBatch) -> SimulationResult:
+        """
+        Simulate every property in the batch
+        :param batch: The properties
+        :return: The results
+        """
+        # Everything that isn't sampled is the same in every draw, so calculate the cash flow without the sampled
+        # expenses once up front
+        variables = batch_variables(batch, self.params)
+        for k in self._sampled_keys():
+            variables[k] = 0.0
+        with np.errstate(divide='ignore', invalid='ignore'):
+            fixed_cash_flow = compute_metrics(batch.price, batch.total_rent, batch.annual_taxes, batch.num_units,
+                                              variables)['total_cash_flow']
+        fixed_cash_flow = np.broadcast_to(fixed_cash_flow, (len(batch),))
+
+        utility_types = dict((p.key, p.utility_type) for p in self.params if p.utility_type)
+
+        chunks = range(0, len(batch), CHUNK_PROPERTIES)
+        seeds = np.random.SeedSequence(self.seed).spawn(len(chunks))
+        jobs = []
+        for start, seed in zip(chunks, seeds):
+            end = start + CHUNK_PROPERTIES
+            jobs.append((fixed_cash_flow[start:end],
+                         batch.total_rent[start:end],
+                         batch.num_units[start:end],
+                         dict((k, batch.utility_counts[u][start:end]) for k, u in utility_types.items()),
+                         self.distributions,
+                         self.draws,
+                         self.percentiles,
+                         seed))
+
+        if self.workers > 1 and len(jobs) > 1:
+            with ProcessPoolExecutor(max_workers=self.workers) as executor:
+                chunk_results = list(executor.map(_simulate_chunk, *zip(*jobs)))
+        else:
+            chunk_results = [_simulate_chunk(*job) for job in jobs]
+
+        if not chunk_results:
+            return SimulationResult(self.percentiles, np.empty((0, len(self.percentiles))), np.empty(0))
+
+        return SimulationResult(self.percentiles,
+                                np.concatenate([r[0] for r in chunk_results]),
+                                np.concatenate([r[1] for r in chunk_results]))
@@ -0,0 +1,86 @@
+"""
+Microbenchmark of parsing the amenities out of a large recorded below the fold payload (a 24 unit building),
+comparing the indexed lookup against the old linear scan of the payload.
+
+Usage:
+    python -m prop_analyze.benchmarks.amenities [--number N]
+"""
+import argparse
+import json
+import timeit
+
+from prop_analyze.parsers.redfin import RFPropertyScraper, RFScrapeResult, index_amenities
+from prop_analyze.parsers.transport import StaticTransport
+from prop_analyze.property import Property
+from prop_analyze.tests.fixtures import load_fixture
+
+FIXTURE = 'below_the_fold_24_units.json'
+
+
+class _LinearScanScraper(RFPropertyScraper):
+    """
+    Looks up every amenity by walking the whole payload, like the parser did before it was indexed
+    """
+
+    def _get_amenity_from_extra_data(self, group_ref_name: str, amenity_ref_name: str):
+        super_groups = self.extra_data['amenitiesInfo']['superGroups']
+        for sg_dict in super_groups:
+            amenity_groups = sg_dict['amenityGroups']
+            for ag_dict in amenity_groups:
+                if ag_dict['referenceName'] == group_ref_name:
+                    entries = ag_dict['amenityEntries']
+                    for entry in entries:
+                        if entry['referenceName'] == amenity_ref_name:
+                            return entry['amenityValues']
+        return None
+
+    def _find_amenity(self, keys: tuple):
+        for key in keys:
+            values = self._get_amenity_from_extra_data(key[0], key[1])
+            if values:
+                return values
+        return None
+
+
+def _load_payload() -> dict:
+    return json.loads(load_fixture(FIXTURE)[len('{}&&'):])['payload']
+
+
+def _parse_amenities(scraper: RFPropertyScraper, extra_data: dict, index: bool) -> Property:
+    scraper.res = RFScrapeResult()
+    scraper.property = Property()
+    scraper.extra_data = extra_data
+    if index:
+        scraper.amenities = index_amenities(extra_data)
+
+    scraper._parse_num_units()
+    scraper._parse_total_rent()
+    scraper._parse_utilities_paid()
+    return scraper.property
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark parsing amenities from a below the fold payload')
+    parser.add_argument('--number', type=int, default=2000, help='The number of times to parse the payload')
+    args = parser.parse_args()
+
+    extra_data = _load_payload()
+    transport = StaticTransport()
+    indexed = RFPropertyScraper('', transport)
+    linear = _LinearScanScraper('', transport)
+
+    # Make sure both parse the same thing before timing them
+    a = _parse_amenities(indexed, extra_data, index=True)
+    b = _parse_amenities(linear, extra_data, index=False)
+    assert a.to_dict() == b.to_dict(), 'Indexed and linear scan parsing disagree'
+
+    t_indexed = timeit.timeit(lambda: _parse_amenities(indexed, extra_data, index=True), number=args.number)
+    t_linear = timeit.timeit(lambda: _parse_amenities(linear, extra_data, index=False), number=args.number)
+
+    print(f'{FIXTURE}: {a.num_units} units, {len(index_amenities(extra_data))} amenities')
+    print(f'linear scan: {t_linear / args.number * 1e6:10.1f} us per listing')
+    print(f'indexed:     {t_indexed / args.number * 1e6:10.1f} us per listing ({t_linear / t_indexed:.1f}x)')
+
+
+if __name__ == '__main__':
+    main()
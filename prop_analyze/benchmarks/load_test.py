@@ -0,0 +1,120 @@
+"""
+Load test of scraping a whole search with RFListingScraper, against the stand-in server in rf_server.py, reporting the
+throughput, the request latencies and how the injected faults were handled.  The server runs in its own process, so
+it doesn't compete with the scraper for the GIL.
+
+Usage:
+    python -m prop_analyze.benchmarks.load_test [--homes 10000] [--workers 16] [--latency triangular:0.005,0.02,0.2]
+        [--unavailable-rate 0.01] [--throttle-rate 0.01] [--drop-rate 0.005]
+"""
+import argparse
+import collections
+import multiprocessing
+import os
+import time
+
+import numpy as np
+
+from prop_analyze.benchmarks.rf_server import add_server_args, make_server
+from prop_analyze.parsers.transport import RFTransport, DEFAULT_POOL_SIZE
+
+
+class _TimedTransport:
+    """
+    Records how long every request takes, including the retries made for it, and how it ended
+    """
+
+    def __init__(self, transport):
+        self.transport = transport
+        self.latencies = []
+        self.outcomes = collections.Counter()
+
+    def get(self, url: str, headers: dict = None):
+        start = time.perf_counter()
+        try:
+            r = self.transport.get(url, headers=headers)
+        except Exception as e:
+            self.outcomes[type(e).__name__] += 1
+            raise
+        finally:
+            self.latencies.append(time.perf_counter() - start)
+        self.outcomes[r.status_code] += 1
+        return r
+
+    def close(self):
+        self.transport.close()
+
+
+def _serve(args, ready: multiprocessing.Queue, stop: multiprocessing.Event, stats: multiprocessing.Queue):
+    server = make_server(args)
+    server.start()
+    ready.put(server.url)
+    stop.wait()
+    server.stop()
+    stats.put(dict(server.stats))
+
+
+def _ms(seconds: float) -> str:
+    return f'{seconds * 1000:.1f} ms'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test scraping a search against a local stand-in for Redfin')
+    add_server_args(parser, port=0)
+    parser.set_defaults(homes=10000, latency='triangular:0.005,0.02,0.2', unavailable_rate=0.01, throttle_rate=0.01,
+                        drop_rate=0.005, retry_after=0)
+    parser.add_argument('--workers', type=int, default=16, help='The number of properties to scrape concurrently')
+    parser.add_argument('--retries', type=int, default=3, help='The number of times to retry a failed request')
+    args = parser.parse_args()
+
+    ready, stats = multiprocessing.Queue(), multiprocessing.Queue()
+    stop = multiprocessing.Event()
+    server = multiprocessing.Process(target=_serve, args=(args, ready, stop, stats), daemon=True)
+    server.start()
+    base_url = ready.get()
+
+    # RF_BASE_URL is read when the scraper is imported, so it's only imported once the server is up
+    os.environ['RF_BASE_URL'] = base_url
+    from prop_analyze.parsers.redfin import RFListingScraper
+    from prop_analyze.benchmarks.rf_server import SEARCH_PATH
+
+    transport = _TimedTransport(RFTransport(pool_size=max(DEFAULT_POOL_SIZE, args.workers), retries=args.retries))
+    scraper = RFListingScraper(f'{base_url}{SEARCH_PATH}', workers=args.workers, transport=transport)
+
+    num_parsed = 0
+    num_failed = 0
+    errors = collections.Counter()
+    start = time.perf_counter()
+    try:
+        for res in scraper.iter_listings():
+            num_parsed += 1
+            num_failed += bool(res.errors)
+            for e in res.errors:
+                # Group the errors by what went wrong, not which URL it went wrong for
+                errors[e.split(' URL ')[0]] += 1
+    finally:
+        elapsed = time.perf_counter() - start
+        transport.close()
+        stop.set()
+        server_stats = stats.get()
+        server.join()
+
+    latencies = np.array(transport.latencies)
+    p50, p95, p99 = np.percentile(latencies, (50, 95, 99)) if len(latencies) else (0.0, 0.0, 0.0)
+
+    print()
+    print(f'Scraped {num_parsed} properties in {elapsed:.1f}s with {args.workers} workers '
+          f'({num_parsed / elapsed:.1f} properties/s)')
+    print(f'Requests: {len(latencies)}  p50 {_ms(p50)}  p95 {_ms(p95)}  p99 {_ms(p99)}  '
+          f'max {_ms(latencies.max() if len(latencies) else 0.0)}')
+    print(f'Request outcomes (after retries): {dict(transport.outcomes)}')
+    print(f'Server: {server_stats}')
+    if scraper.coverage:
+        print(f'Search tiles: {scraper.coverage}')
+    print(f'Properties with errors: {num_failed}')
+    for e, n in errors.most_common():
+        print(f'\t{n:6}  {e}')
+
+
+if __name__ == '__main__':
+    main()
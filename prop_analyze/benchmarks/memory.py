@@ -0,0 +1,105 @@
+"""
+Benchmark of the memory it takes to hold scraped properties and their analyses, like find_best does when ranking,
+comparing the slotted Property and AnalysisResult against the old dict backed ones.
+
+Usage:
+    python -m prop_analyze.benchmarks.memory [--count N]
+"""
+import argparse
+import random
+import tracemalloc
+
+from prop_analyze.property import Property, Utilities
+from prop_analyze.analysis.analyze import Analysis
+from prop_analyze.analysis.result import AnalysisResult
+
+
+class _DictProperty:
+    """
+    A Property as it was before it was slotted, with a list of Utilities per unit
+    """
+
+    def __init__(self, p: Property):
+        for k, v in p.to_dict().items():
+            setattr(self, k, v)
+
+
+class _DictAnalysisResult:
+    """
+    An AnalysisResult as it was before it was slotted
+    """
+
+    def __init__(self, res: AnalysisResult, p: _DictProperty):
+        for k, v in res.to_dict().items():
+            setattr(self, k, v)
+        self.property = p
+
+
+def _create_property(i: int, rnd: random.Random) -> Property:
+    p = Property()
+    p.url = f'https://www.redfin.com/IL/Chicago/{i}-W-Example-St-60620/home/{10000000 + i}'
+    p.property_id = str(10000000 + i)
+    p.listing_id = str(20000000 + i)
+    p.street_address = f'{i} W Example St'
+    p.city = 'Chicago'
+    p.state = 'IL'
+    p.price = float(rnd.randint(100, 900) * 1000)
+    p.num_units = rnd.randint(2, 6)
+    p.total_rent = float(rnd.randint(800, 1500) * p.num_units)
+    p.tax_year = '2019'
+    p.annual_taxes = round(rnd.uniform(2000, 12000), 2)
+    p.utilities_paid_by_unit = [rnd.choice(([Utilities.ELECTRIC, Utilities.GAS], Utilities.all(), [Utilities.ELECTRIC]))
+                                for _ in range(p.num_units)]
+    return p
+
+
+def _measure(build) -> int:
+    """
+    :return: The bytes allocated by build that are still held by what it returns
+    """
+    tracemalloc.start()
+    try:
+        before, _ = tracemalloc.get_traced_memory()
+        held = build()
+        after, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del held
+    return after - before
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the memory held per property and analysis')
+    parser.add_argument('--count', type=int, default=20000, help='The number of properties to hold')
+    args = parser.parse_args()
+
+    rnd = random.Random(42)
+    results = [Analysis(p).anaylze() for p in (_create_property(i, rnd) for i in range(args.count))]
+
+    def _build_dict():
+        return [_DictAnalysisResult(res, _DictProperty(res.property)) for res in results]
+
+    def _build_slotted():
+        copies = []
+        for res in results:
+            p = Property()
+            for k, v in res.property.to_dict().items():
+                setattr(p, k, v)
+            copy = AnalysisResult()
+            for k, v in res.to_dict().items():
+                setattr(copy, k, v)
+            copy.property = p
+            copies.append(copy)
+        return copies
+
+    # Both keep the same strings and floats alive, so the difference is only the objects holding them
+    dict_bytes = _measure(_build_dict) / args.count
+    slotted_bytes = _measure(_build_slotted) / args.count
+
+    print(f'{args.count} properties with analyses')
+    print(f'dict backed: {dict_bytes:10.0f} bytes per property')
+    print(f'slotted:     {slotted_bytes:10.0f} bytes per property ({dict_bytes / slotted_bytes:.1f}x smaller)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""
+Benchmark of how scraping a search scales with the number of processes the listing pages are parsed on
+(RFListingScraper's parse_workers), against the stand-in server in rf_server.py.  Every listing is left incomplete in
+the search, so every listing page is fetched and parsed.  The requests are made on the same number of threads every
+run, so only the parsing changes.  0 processes is parsing on the scraping threads, as without --parse-workers.
+
+Usage:
+    python -m prop_analyze.benchmarks.parse_scaling [--homes 2000] [--workers 16] [--parse-workers 0,1,2,4]
+"""
+import argparse
+import multiprocessing
+import os
+import time
+
+from prop_analyze.benchmarks.load_test import _serve
+from prop_analyze.benchmarks.rf_server import add_server_args
+from prop_analyze.parsers.transport import RFTransport, DEFAULT_POOL_SIZE
+
+
+def _default_parse_workers() -> str:
+    """
+    :return: 0, then powers of 2 up to the number of cores, then the number of cores
+    """
+    cores = os.cpu_count() or 1
+    counts = [0]
+    n = 1
+    while n < cores:
+        counts.append(n)
+        n *= 2
+    counts.append(cores)
+    return ','.join(map(str, counts))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark scraping a search with the listing pages parsed on 0 to N '
+                                                 'processes')
+    add_server_args(parser, port=0)
+    parser.set_defaults(homes=2000, incomplete_rate=1.0)
+    parser.add_argument('--workers', type=int, default=16, help='The number of properties to fetch concurrently')
+    parser.add_argument('--parse-workers', default=_default_parse_workers(), metavar='N,N,...',
+                        help='The numbers of parsing processes to run with.  Defaults to 0 up to the number of cores')
+    args = parser.parse_args()
+    parse_workers = [int(n) for n in args.parse_workers.split(',')]
+
+    ready, stats = multiprocessing.Queue(), multiprocessing.Queue()
+    stop = multiprocessing.Event()
+    server = multiprocessing.Process(target=_serve, args=(args, ready, stop, stats), daemon=True)
+    server.start()
+    base_url = ready.get()
+
+    # RF_BASE_URL is read when the scraper is imported, so it's only imported once the server is up
+    os.environ['RF_BASE_URL'] = base_url
+    from prop_analyze.parsers.redfin import RFListingScraper
+    from prop_analyze.benchmarks.rf_server import SEARCH_PATH
+
+    print(f'{args.homes} listings, {args.workers} fetching threads, {os.cpu_count()} cores')
+    print(f'{"Processes":>9}  {"Seconds":>8}  {"Properties/s":>12}  {"Speedup":>7}  {"Errors":>6}')
+    baseline = None
+    try:
+        for n in parse_workers:
+            transport = RFTransport(pool_size=max(DEFAULT_POOL_SIZE, args.workers))
+            scraper = RFListingScraper(f'{base_url}{SEARCH_PATH}', workers=args.workers, transport=transport,
+                                       parse_workers=n)
+            num_parsed = 0
+            num_failed = 0
+            start = time.perf_counter()
+            try:
+                for res in scraper.iter_listings():
+                    num_parsed += 1
+                    num_failed += bool(res.errors)
+            finally:
+                elapsed = time.perf_counter() - start
+                transport.close()
+
+            rate = num_parsed / elapsed
+            baseline = baseline or rate
+            print(f'{n:>9}  {elapsed:>8.2f}  {rate:>12.1f}  {rate / baseline:>6.2f}x  {num_failed:>6}')
+    finally:
+        stop.set()
+        stats.get()
+        server.join()
+
+
+if __name__ == '__main__':
+    main()
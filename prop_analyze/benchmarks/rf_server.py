@@ -0,0 +1,309 @@
+"""
+A local stand-in for the parts of Redfin the scrapers use, for load testing them without going to redfin.com:
+- the search page, with the gis search API URL embedded in it
+- the gis search API, with any number of synthesized listings.  Like Redfin, it only returns the listings in the poly
+  given, and no more than num_homes of them
+- the listing pages and the below the fold API, built from the recorded responses in prop_analyze/tests/fixtures
+
+Responses can be slowed down by a latency distribution, and a fraction of them replaced with 503s, 429s or dropped
+connections.  Point the scrapers at it with the RF_BASE_URL environment variable.
+
+Usage:
+    python -m prop_analyze.benchmarks.rf_server [--port 8123] [--homes 10000] [--latency triangular:0.005,0.02,0.2]
+    RF_BASE_URL=http://127.0.0.1:8123 python prop_analyze.py find_best http://127.0.0.1:8123/city/29470/IL/Chicago
+"""
+import argparse
+import collections
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qsl
+
+import numpy as np
+
+from prop_analyze.analysis.simulation import Distribution, parse_distribution
+from prop_analyze.parsers.tiling import BBox, parse_poly, home_lat_lng
+from prop_analyze.tests.fixtures import load_fixture
+
+DEFAULT_PORT = 8123
+DEFAULT_NUM_HOMES = 1000
+
+SEARCH_PATH = '/city/29470/IL/Chicago/filter/property-type=multifamily'
+GIS_PATH = '/stingray/api/gis'
+BELOW_THE_FOLD_PATH = '/stingray/api/home/details/belowTheFold'
+
+# The IDs in the recorded listing page, which are swapped for each listing's own
+FIXTURE_PROPERTY_ID = '10000001'
+FIXTURE_LISTING_ID = '20000001'
+
+# The area the synthesized listings are spread over
+AREA = BBox(41.64, -87.94, 42.02, -87.52)
+
+
+def synthesize_homes(n: int, seed: int = 0, incomplete_rate: float = 0.0) -> [dict]:
+    """
+    Make gis search records for n listings, based on the ones in the recorded search
+    :param n: The number of listings
+    :param seed: The seed for their prices
+    :param incomplete_rate: The fraction of records to leave the price out of, so their listing page gets requested
+    :return: The records
+    """
+    rnd = random.Random(seed)
+    # The locations have their own generator, so the prices are the same as they were before there were locations
+    locations = random.Random(seed + 1)
+    recorded = json.loads(load_fixture('gis_search.json')[len('{}&&'):])['payload']['homes']
+    homes = []
+    for i in range(n):
+        h = json.loads(json.dumps(recorded[i % len(recorded)]))
+        property_id = 30000000 + i
+        h['propertyId'] = property_id
+        h['listingId'] = 40000000 + i
+        h['mlsId']['value'] = str(property_id)
+        h['streetLine']['value'] = f'{i} W Example St'
+        h['url'] = f'/IL/Chicago/{i}-W-Example-St-60620/home/{property_id}'
+        h['price']['value'] = rnd.randint(150, 900) * 1000
+        h['latLong'] = {'value': {'latitude': round(locations.uniform(AREA.south, AREA.north), 6),
+                                  'longitude': round(locations.uniform(AREA.west, AREA.east), 6)},
+                        'level': 1}
+        if rnd.random() < incomplete_rate:
+            del h['price']
+        homes.append(h)
+    return homes
+
+
+class RFStandInServer(ThreadingHTTPServer):
+    """
+    Serves the synthesized listings.  Faults are picked at random per request, from the rates given
+    """
+
+    daemon_threads = True
+
+    def __init__(self,
+                 port: int = 0,
+                 homes: [dict] = None,
+                 latency: Distribution = None,
+                 unavailable_rate: float = 0.0,
+                 throttle_rate: float = 0.0,
+                 drop_rate: float = 0.0,
+                 retry_after: int = None,
+                 seed: int = 0):
+        """
+        :param port: The port to listen on.  0 picks a free one
+        :param homes: The gis search records to serve.  Defaults to DEFAULT_NUM_HOMES synthesized ones
+        :param latency: The distribution of how long to wait, in seconds, before responding.  None to respond right away
+        :param unavailable_rate: The fraction of requests to respond to with a 503
+        :param throttle_rate: The fraction of requests to respond to with a 429
+        :param drop_rate: The fraction of requests to close the connection on without responding
+        :param retry_after: The Retry-After (whole) seconds to send with the 503s and 429s, if any
+        :param seed: The seed for the latencies and faults
+        """
+        super().__init__(('127.0.0.1', port), _RFHandler)
+        self.homes = homes if homes is not None else synthesize_homes(DEFAULT_NUM_HOMES, seed)
+        self.latency = latency
+        self.unavailable_rate = unavailable_rate
+        self.throttle_rate = throttle_rate
+        self.drop_rate = drop_rate
+        self.retry_after = retry_after
+
+        self._rng = np.random.default_rng(seed)
+        self._lock = threading.Lock()
+        self._thread = None
+
+        # Counts of requests by endpoint, and of the faults injected
+        self.stats = collections.Counter()
+
+        # Everything but the listing pages is the same for every request, so only encode it once
+        self.search_page = ('<!DOCTYPE html><html><head><title>Chicago, IL Multi-Family Homes | Redfin</title></head>'
+                            '<body><script>root.__reactServerState.InitialContext = {"searchUrl":"'
+                            + f'{GIS_PATH}?al=1&num_homes=350&region_id=29470&v=8'.replace('/', '\\u002F')
+                            + '"};</script></body></html>').encode('utf-8')
+        self.gis_payload = ('{}&&' + json.dumps({'version': 1, 'errorMessage': 'Success', 'resultCode': 0,
+                                                 'payload': {'homes': self.homes}})).encode('utf-8')
+        self.below_the_fold = load_fixture('below_the_fold.json').encode('utf-8')
+        self.listing_page = load_fixture('listing.html')
+        self.homes_by_path = dict((h['url'], h) for h in self.homes)
+        self.locations = [home_lat_lng(h) for h in self.homes]
+
+    @property
+    def url(self) -> str:
+        """
+        The base URL to set RF_BASE_URL to
+        """
+        return f'http://127.0.0.1:{self.server_address[1]}'
+
+    @property
+    def search_url(self) -> str:
+        return f'{self.url}{SEARCH_PATH}'
+
+    def start(self):
+        """
+        Serve from a background thread
+        """
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        if self._thread:
+            self._thread.join()
+
+    def gis_search(self, query: str) -> bytes:
+        """
+        :param query: The query string of a gis search
+        :return: The response to it
+        """
+        params = dict(parse_qsl(query))
+        box = parse_poly(params['poly']) if 'poly' in params else None
+        num_homes = int(params.get('num_homes', len(self.homes)))
+        if box is None and num_homes >= len(self.homes):
+            return self.gis_payload
+
+        homes = []
+        for h, location in zip(self.homes, self.locations):
+            if len(homes) >= num_homes:
+                break
+            if box is not None and (location is None or not (box.south <= location[0] <= box.north
+                                                              and box.west <= location[1] <= box.east)):
+                continue
+            homes.append(h)
+        return ('{}&&' + json.dumps({'version': 1, 'errorMessage': 'Success', 'resultCode': 0,
+                                     'payload': {'homes': homes}})).encode('utf-8')
+
+    def count(self, k: str):
+        with self._lock:
+            self.stats[k] += 1
+
+    def next_delay_and_fault(self) -> (float, str):
+        """
+        :return: How long to wait before responding, and the fault to inject (None, 503, 429 or drop)
+        """
+        # numpy generators aren't thread safe
+        with self._lock:
+            delay = max(0.0, float(self.latency.sample(self._rng, 1)[0])) if self.latency else 0.0
+            r = self._rng.random()
+
+        fault = None
+        if r < self.unavailable_rate:
+            fault = '503'
+        elif r < self.unavailable_rate + self.throttle_rate:
+            fault = '429'
+        elif r < self.unavailable_rate + self.throttle_rate + self.drop_rate:
+            fault = 'drop'
+        return delay, fault
+
+
+class _RFHandler(BaseHTTPRequestHandler):
+
+    # Keep connections alive, like Redfin does
+    protocol_version = 'HTTP/1.1'
+    server: RFStandInServer
+
+    def log_message(self, format, *args):
+        # Don't log every request
+        pass
+
+    def _send(self, status: int, body: bytes, content_type: str, headers: dict = None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _route(self, path: str, query: str) -> (str, bytes, str):
+        """
+        :return: The endpoint, and the response body and content type, or None for the body if there's nothing there
+        """
+        server = self.server
+        if path == GIS_PATH:
+            return 'gis', server.gis_search(query), 'application/json'
+        if path == BELOW_THE_FOLD_PATH:
+            return 'below_the_fold', server.below_the_fold, 'application/json'
+        if '/home/' in path:
+            home = server.homes_by_path.get(path)
+            if home is None:
+                return 'not_found', None, None
+            page = server.listing_page.replace(FIXTURE_PROPERTY_ID, str(home['propertyId'])) \
+                .replace(FIXTURE_LISTING_ID, str(home['listingId']))
+            return 'listing', page.encode('utf-8'), 'text/html'
+        if path.startswith('/city/'):
+            return 'search', server.search_page, 'text/html'
+        return 'not_found', None, None
+
+    def do_GET(self):
+        server = self.server
+        url = urlsplit(self.path)
+        endpoint, body, content_type = self._route(url.path, url.query)
+        server.count(endpoint)
+
+        delay, fault = server.next_delay_and_fault()
+        if delay:
+            time.sleep(delay)
+
+        if fault:
+            server.count(fault)
+        if fault == 'drop':
+            # Close the connection without responding
+            self.close_connection = True
+            return
+        if fault:
+            headers = {} if server.retry_after is None else {'Retry-After': str(server.retry_after)}
+            self._send(int(fault), b'', 'text/plain', headers)
+            return
+
+        if body is None:
+            self._send(404, b'', 'text/plain')
+        else:
+            self._send(200, body, content_type)
+
+
+def make_server(args) -> RFStandInServer:
+    """
+    Make a server from the command line arguments added by add_server_args
+    """
+    latency = parse_distribution(f'latency={args.latency}')[1] if args.latency else None
+    homes = synthesize_homes(args.homes, args.seed, args.incomplete_rate)
+    return RFStandInServer(args.port, homes, latency, args.unavailable_rate, args.throttle_rate, args.drop_rate,
+                           args.retry_after, args.seed)
+
+
+def add_server_args(parser: argparse.ArgumentParser, port: int = DEFAULT_PORT):
+    parser.add_argument('--port', type=int, default=port, help='The port to listen on.  0 picks a free one')
+    parser.add_argument('--homes', type=int, default=DEFAULT_NUM_HOMES, help='The number of listings in the search')
+    parser.add_argument('--latency', metavar='KIND:ARGS',
+                        help='The distribution of seconds to wait before responding, ie. triangular:0.005,0.02,0.2.  '
+                             'KIND is one of fixed, uniform, triangular or normal')
+    parser.add_argument('--unavailable-rate', type=float, default=0.0, help='The fraction of requests to 503')
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help='The fraction of requests to 429')
+    parser.add_argument('--drop-rate', type=float, default=0.0,
+                        help='The fraction of requests to close the connection on without responding')
+    parser.add_argument('--retry-after', type=int, help='The Retry-After seconds to send with the 503s and 429s')
+    parser.add_argument('--incomplete-rate', type=float, default=0.0,
+                        help='The fraction of listings to leave the price out of in the search, so their listing page '
+                             'gets scraped')
+    parser.add_argument('--seed', type=int, default=0, help='The seed for the listings, latencies and faults')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve a local stand-in for Redfin')
+    add_server_args(parser)
+    args = parser.parse_args()
+
+    server = make_server(args)
+    print(f'Serving {len(server.homes)} listings.  Search URL: {server.search_url}')
+    print(f'Point the scrapers at it with RF_BASE_URL={server.url}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(f'Requests: {dict(server.stats)}')
+
+
+if __name__ == '__main__':
+    main()
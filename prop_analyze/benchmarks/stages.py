@@ -0,0 +1,306 @@
+"""
+Benchmark suite that times each stage of finding the best properties on its own, against the recorded Redfin
+responses in prop_analyze/tests/fixtures, at a range of sizes.  The results can be saved as a JSON baseline, and a
+later run compared against it fails if any stage got slower by more than the threshold.
+
+Usage:
+    python -m prop_analyze.benchmarks.stages [--sizes 1,10,100] [--stages analyze,rank] [--save] [--threshold 0.2]
+"""
+import argparse
+import json
+import os
+import pickle
+import platform
+import sys
+import tempfile
+import time
+
+from prop_analyze.analysis.analyze import Analysis
+from prop_analyze.analysis.parameters import get_variables_for_property
+from prop_analyze.analysis.ranking import TopK
+from prop_analyze.parsers.redfin import RFListingScraper, RFPropertyScraper, RF_BASE_URL, extract_page_fields
+from prop_analyze.parsers.transport import StaticTransport
+from prop_analyze.property import Property
+from prop_analyze.spreadsheet.xls import output_batch_to_xls
+from prop_analyze.tests.fixtures import load_fixture
+
+BENCHMARKS_DIR = os.path.dirname(os.path.realpath(__file__))
+BASELINE_FILE = f'{BENCHMARKS_DIR}/baseline.json'
+
+DEFAULT_SIZES = (1, 10, 100, 1000, 10000)
+DEFAULT_THRESHOLD = 0.2
+
+# The number of runs of each stage and size to take the best of, to leave out the ones slowed down by something else
+REPEAT = 5
+
+# Batches faster than this are run repeatedly until they add up to it, so the smallest sizes aren't all timer noise
+MIN_BATCH_TIME = 0.05
+
+GIS_URL = f'{RF_BASE_URL}/stingray/api/gis?al=1&num_homes=3000&region_id=29470&v=8'
+EXTRA_DATA_URL = f'{RF_BASE_URL}/stingray/api/home/details/belowTheFold?' \
+                 f'propertyId={{}}&accessLevel=1&listingId={{}}'
+
+
+class Stage:
+    """
+    One stage of the pipeline to time.  setup builds the input for a given number of properties, outside of the
+    timing, and run processes all of them
+    """
+
+    def __init__(self, name: str, description: str, setup, run, max_size: int = None):
+        self.name = name
+        self.description = description
+        self.setup = setup
+        self.run = run
+        # The largest size this stage is run at, for the stages that take too long to run at every size
+        self.max_size = max_size
+
+
+def _gis_homes(n: int) -> [dict]:
+    """
+    :return: n gis search records, copied from the recorded search with their IDs changed to be unique
+    """
+    homes = json.loads(load_fixture('gis_search.json')[len('{}&&'):])['payload']['homes']
+    out = []
+    for i in range(n):
+        h = dict(homes[i % len(homes)])
+        h['propertyId'] = 10000000 + i
+        h['listingId'] = 20000000 + i
+        h['url'] = f'/IL/Chicago/{i}-W-Example-St-60620/home/{10000000 + i}'
+        out.append(h)
+    return out
+
+
+def _properties(n: int) -> [Property]:
+    """
+    :return: n properties, copied from the one parsed from the recorded responses, each with its own address and price
+    """
+    home = _gis_homes(1)[0]
+    transport = StaticTransport()
+    transport.add(EXTRA_DATA_URL.format(home['propertyId'], home['listingId']), load_fixture('below_the_fold.json'))
+    parsed = RFPropertyScraper(f'{RF_BASE_URL}{home["url"]}', transport, home, 'benchmark').parse().property
+
+    data = pickle.dumps(parsed)
+    props = []
+    for i in range(n):
+        p = pickle.loads(data)
+        p.property_id = str(10000000 + i)
+        p.street_address = f'{i} W Example St'
+        p.price = parsed.price * (0.5 + (i * 7919 % 1000) / 1000)
+        props.append(p)
+    return props
+
+
+def _setup_search_parse(n: int):
+    transport = StaticTransport()
+    transport.add(GIS_URL, '{}&&' + json.dumps({'errorMessage': 'Success', 'resultCode': 0,
+                                                'payload': {'homes': _gis_homes(n)}}))
+    scraper = RFListingScraper(GIS_URL, transport=transport)
+    scraper.gis_url = GIS_URL
+    # Only time parsing the search, not tiling it
+    scraper.max_listings = n + 1
+    return scraper
+
+
+def _run_search_parse(scraper: RFListingScraper):
+    scraper.load_homes()
+
+
+def _setup_html_parse(n: int) -> (str, int):
+    return load_fixture('listing.html'), n
+
+
+def _run_html_parse(args: (str, int)):
+    page_txt, n = args
+    for _ in range(n):
+        extract_page_fields(page_txt)
+
+
+def _setup_extra_data_parse(n: int) -> (StaticTransport, [dict]):
+    # Every record is complete, so only the below the fold data is requested and parsed, like it is for a search
+    homes = _gis_homes(n)
+    transport = StaticTransport()
+    extra_data = load_fixture('below_the_fold.json')
+    for h in homes:
+        transport.add(EXTRA_DATA_URL.format(h['propertyId'], h['listingId']), extra_data)
+    return transport, homes
+
+
+def _run_extra_data_parse(args: (StaticTransport, [dict])):
+    transport, homes = args
+    for h in homes:
+        RFPropertyScraper(f'{RF_BASE_URL}{h["url"]}', transport, h, 'benchmark').parse()
+
+
+def _run_variables(props: [Property]):
+    for p in props:
+        get_variables_for_property(p)
+
+
+def _run_analyze(props: [Property]):
+    for p in props:
+        Analysis(p).anaylze()
+
+
+def _setup_rank(n: int) -> list:
+    return [Analysis(p).anaylze() for p in _properties(n)]
+
+
+def _run_rank(results: list):
+    top = TopK(10)
+    for res in results:
+        top.push(res)
+    top.ranked()
+
+
+def _run_xls(props: [Property]):
+    with tempfile.TemporaryDirectory() as out_dir:
+        output_batch_to_xls(props, out_dir)
+
+
+STAGES = (
+    Stage('search_parse', 'Load the gis search payload into property URLs and records', _setup_search_parse,
+          _run_search_parse),
+    Stage('html_parse', 'Extract the fields from a listing page', _setup_html_parse, _run_html_parse, max_size=1000),
+    Stage('extra_data_parse', 'Parse a property from its gis record and below the fold data', _setup_extra_data_parse,
+          _run_extra_data_parse),
+    Stage('variables', 'Compute the variables for a property', _properties, _run_variables),
+    Stage('analyze', 'Analysis.anaylze', _properties, _run_analyze),
+    Stage('rank', 'Rank analyses into the top 10', _setup_rank, _run_rank),
+    Stage('xls', 'Output a spreadsheet per property', _properties, _run_xls, max_size=100),
+)
+
+
+def time_stage(stage: Stage, size: int) -> float:
+    """
+    Time a stage at a size, taking the best of a few runs
+    :return: The seconds per property
+    """
+    data = stage.setup(size)
+    best = None
+    number = 1
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        for _ in range(number):
+            stage.run(data)
+        elapsed = (time.perf_counter() - start) / number
+        best = elapsed if best is None else min(best, elapsed)
+        if elapsed < MIN_BATCH_TIME:
+            number = max(number, int(MIN_BATCH_TIME / max(elapsed, 1e-9)) + 1)
+    return best / size
+
+
+def run_suite(sizes: [int] = DEFAULT_SIZES, stages: [Stage] = STAGES, on_result=None) -> dict:
+    """
+    Time every stage at every size up to its max size
+    :param sizes: The numbers of properties
+    :param stages: The stages to time
+    :param on_result: Called with the stage name, size and seconds per property as each one is timed
+    :return: dict of stage name to a dict of size (as a str, like it is in the JSON) to seconds per property
+    """
+    results = dict()
+    for stage in stages:
+        timings = dict()
+        for size in sizes:
+            if stage.max_size is not None and size > stage.max_size:
+                continue
+            timings[str(size)] = time_stage(stage, size)
+            if on_result:
+                on_result(stage.name, size, timings[str(size)])
+        results[stage.name] = timings
+    return results
+
+
+def save_baseline(results: dict, path: str = BASELINE_FILE):
+    baseline = {
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'stages': results,
+    }
+    with open(path, 'w') as f:
+        json.dump(baseline, f, indent=2)
+
+
+def load_baseline(path: str = BASELINE_FILE) -> dict:
+    """
+    :return: The stage results of the baseline, or None if there isn't one
+    """
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)['stages']
+
+
+def find_regressions(baseline: dict, results: dict, threshold: float = DEFAULT_THRESHOLD) -> [tuple]:
+    """
+    Compare results against a baseline, for the stages and sizes that are in both
+    :param threshold: How much slower than the baseline a stage can get, as a fraction (0.2 is 20% slower)
+    :return: A (stage name, size, baseline seconds, seconds) tuple for each stage and size that regressed
+    """
+    regressions = []
+    for name, timings in results.items():
+        base_timings = baseline.get(name, {})
+        for size, seconds in timings.items():
+            base = base_timings.get(size)
+            if base is not None and seconds > base * (1 + threshold):
+                regressions.append((name, int(size), base, seconds))
+    return regressions
+
+
+def _us(seconds: float) -> str:
+    return f'{seconds * 1e6:12.1f} us'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark each stage of finding the best properties')
+    parser.add_argument('--sizes', default=','.join(str(s) for s in DEFAULT_SIZES),
+                        help='Comma separated numbers of properties to time each stage at')
+    parser.add_argument('--stages', help='Comma separated stages to time.  Defaults to all of them: '
+                                         + ', '.join(s.name for s in STAGES))
+    parser.add_argument('--baseline', default=BASELINE_FILE, help='The JSON baseline to compare against and save to')
+    parser.add_argument('--save', action='store_true', help='Save the results as the new baseline')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='Fail if a stage is this much slower than the baseline, as a fraction')
+    args = parser.parse_args()
+
+    sizes = [int(s) for s in args.sizes.split(',')]
+    stages = STAGES
+    if args.stages:
+        names = args.stages.split(',')
+        unknown = set(names) - set(s.name for s in STAGES)
+        if unknown:
+            parser.error(f'Unknown stages: {", ".join(sorted(unknown))}')
+        stages = [s for s in STAGES if s.name in names]
+
+    baseline = load_baseline(args.baseline)
+
+    def on_result(name: str, size: int, seconds: float):
+        line = f'{name:18} {size:>6} {_us(seconds)} per property'
+        base = (baseline or {}).get(name, {}).get(str(size))
+        if base is not None:
+            line += f'  (baseline {_us(base).strip()}, {(seconds / base - 1) * 100:+.0f}%)'
+        print(line, flush=True)
+
+    results = run_suite(sizes, stages, on_result)
+
+    if args.save:
+        save_baseline(results, args.baseline)
+        print(f'Saved the baseline to {args.baseline}')
+        return
+
+    if baseline is None:
+        print(f'No baseline at {args.baseline} to compare against.  Run with --save to create one')
+        return
+
+    regressions = find_regressions(baseline, results, args.threshold)
+    for name, size, base, seconds in regressions:
+        print(f'REGRESSION: {name} at {size} properties went from {_us(base).strip()} to {_us(seconds).strip()} '
+              f'per property')
+    if regressions:
+        sys.exit(1)
+    print(f'No stage is more than {args.threshold * 100:.0f}% slower than the baseline')
+
+
+if __name__ == '__main__':
+    main()
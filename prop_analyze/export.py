@@ -0,0 +1,219 @@
+import csv
+import json
+import operator
+import sys
+
+from prop_analyze.analysis.analyze import RESULT_METRICS
+from prop_analyze.analysis.result import AnalysisResult
+from prop_analyze.property import unpack_utilities
+
+# Every analysis is exported as one row with a fixed set of columns: the Property fields, then every metric of the
+# AnalysisResult.  The values are read with attrgetters built once from the columns, instead of going through
+# to_dict / to_json for every row, so exporting doesn't slow down a run with tens of thousands of listings.
+
+PROPERTY_COLUMNS = (
+    'url',
+    'property_id',
+    'listing_id',
+    'street_address',
+    'city',
+    'state',
+    'price',
+    'num_units',
+    'total_rent',
+    'tax_year',
+    'annual_taxes',
+)
+
+# The utilities the tenant of each unit pays.  In NDJSON it's a list per unit like Property.to_json, in CSV and Arrow
+# it's a string with the units separated by ; and the utilities of a unit by +, ie. ELECTRIC+GAS;ELECTRIC
+UTILITIES_COLUMN = 'utilities_paid_by_unit'
+
+EXPORT_COLUMNS = PROPERTY_COLUMNS + (UTILITIES_COLUMN,) + RESULT_METRICS
+
+# The Arrow type of each column
+COLUMN_TYPES = dict([(c, 'string') for c in ('url', 'property_id', 'listing_id', 'street_address', 'city', 'state',
+                                             'tax_year', UTILITIES_COLUMN)]
+                    + [(c, 'float64') for c in ('price', 'total_rent', 'annual_taxes') + RESULT_METRICS]
+                    + [('num_units', 'int64')])
+
+FORMAT_NDJSON = 'ndjson'
+FORMAT_CSV = 'csv'
+FORMAT_ARROW = 'arrow'
+
+FORMATS_BY_EXTENSION = {
+    '.ndjson': FORMAT_NDJSON,
+    '.jsonl': FORMAT_NDJSON,
+    '.json': FORMAT_NDJSON,
+    '.csv': FORMAT_CSV,
+    '.arrow': FORMAT_ARROW,
+    '.feather': FORMAT_ARROW,
+}
+
+_property_values = operator.attrgetter(*PROPERTY_COLUMNS)
+_result_values = operator.attrgetter(*RESULT_METRICS)
+
+# Packed utility codes to their exported forms.  There are only a handful of different combinations in practice
+_utilities_lists = dict()
+_utilities_strs = dict()
+
+
+def _utilities_list(codes: tuple) -> list:
+    if codes is None:
+        return None
+    v = _utilities_lists.get(codes)
+    if v is None:
+        v = _utilities_lists[codes] = [[u.name for u in unpack_utilities(c)] for c in codes]
+    return v
+
+
+def _utilities_str(codes: tuple) -> str:
+    if codes is None:
+        return None
+    v = _utilities_strs.get(codes)
+    if v is None:
+        v = _utilities_strs[codes] = ';'.join('+'.join(u.name for u in unpack_utilities(c)) for c in codes)
+    return v
+
+
+def export_row(res: AnalysisResult, utilities_as_str: bool = True) -> tuple:
+    """
+    :param res: The analysis
+    :param utilities_as_str: Whether to export the utilities as a string (CSV, Arrow) or a list per unit (NDJSON)
+    :return: The values of EXPORT_COLUMNS for an analysis
+    """
+    p = res.property
+    codes = p.utility_codes
+    utilities = _utilities_str(codes) if utilities_as_str else _utilities_list(codes)
+    return _property_values(p) + (utilities,) + _result_values(res)
+
+
+class Exporter:
+    """
+    Writes analyses out one at a time, as they're completed
+    """
+
+    # The number of analyses written so far
+    num_rows: int = 0
+
+    def __init__(self, out, close_out: bool = False):
+        """
+        :param out: The file to write to
+        :param close_out: Whether to close out when the exporter is closed
+        """
+        self.out = out
+        self.close_out = close_out
+        self.num_rows = 0
+
+    def write(self, res: AnalysisResult):
+        raise NotImplementedError()
+
+    def close(self):
+        if self.close_out:
+            self.out.close()
+        else:
+            self.out.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class NDJSONExporter(Exporter):
+    """
+    One JSON object per line, with the keys in the order of EXPORT_COLUMNS
+    """
+
+    _encode = json.JSONEncoder(separators=(',', ':')).encode
+
+    def write(self, res: AnalysisResult):
+        self.out.write(self._encode(dict(zip(EXPORT_COLUMNS, export_row(res, utilities_as_str=False)))))
+        self.out.write('\n')
+        self.num_rows += 1
+
+
+class CSVExporter(Exporter):
+    """
+    A CSV file with a header row of EXPORT_COLUMNS.  Fields that aren't set are left empty
+    """
+
+    def __init__(self, out, close_out: bool = False):
+        super().__init__(out, close_out)
+        self._writer = csv.writer(out)
+        self._writer.writerow(EXPORT_COLUMNS)
+
+    def write(self, res: AnalysisResult):
+        self._writer.writerow(export_row(res))
+        self.num_rows += 1
+
+
+class ArrowExporter(Exporter):
+    """
+    An Arrow IPC (Feather v2) file, written in record batches of batch_size rows.  Needs pyarrow
+    """
+
+    DEFAULT_BATCH_SIZE = 10000
+
+    def __init__(self, out, close_out: bool = False, batch_size: int = DEFAULT_BATCH_SIZE):
+        try:
+            import pyarrow
+            import pyarrow.ipc
+        except ImportError:
+            raise ValueError('Arrow export needs pyarrow.  Install it with pip install pyarrow') from None
+
+        super().__init__(out, close_out)
+        self._pa = pyarrow
+        self.schema = pyarrow.schema([(c, getattr(pyarrow, COLUMN_TYPES[c])()) for c in EXPORT_COLUMNS])
+        self.batch_size = batch_size
+        self._rows = []
+        self._writer = pyarrow.ipc.new_file(out, self.schema)
+
+    def _write_batch(self):
+        if not self._rows:
+            return
+        columns = [list(c) for c in zip(*self._rows)]
+        self._writer.write_batch(self._pa.record_batch(columns, schema=self.schema))
+        self._rows = []
+
+    def write(self, res: AnalysisResult):
+        self._rows.append(export_row(res))
+        self.num_rows += 1
+        if len(self._rows) >= self.batch_size:
+            self._write_batch()
+
+    def close(self):
+        self._write_batch()
+        self._writer.close()
+        super().close()
+
+
+def export_format(path: str) -> str:
+    """
+    :param path: The file to export to, or - for stdout
+    :return: The format to export in, from the file's extension.  NDJSON for stdout
+    """
+    if path == '-':
+        return FORMAT_NDJSON
+    for ext, fmt in FORMATS_BY_EXTENSION.items():
+        if path.lower().endswith(ext):
+            return fmt
+    raise ValueError(f'Can not tell the export format of {path}.  Use one of {", ".join(FORMATS_BY_EXTENSION)}')
+
+
+def open_exporter(path: str) -> Exporter:
+    """
+    Open an exporter to a file, in the format of its extension
+    :param path: The file, or - to write NDJSON to stdout
+    :return: The exporter.  Close it when done
+    """
+    fmt = export_format(path)
+    if path == '-':
+        return NDJSONExporter(sys.stdout)
+    if fmt == FORMAT_ARROW:
+        return ArrowExporter(open(path, 'wb'), close_out=True)
+    f = open(path, 'w', newline='' if fmt == FORMAT_CSV else None)
+    if fmt == FORMAT_CSV:
+        return CSVExporter(f, close_out=True)
+    return NDJSONExporter(f, close_out=True)
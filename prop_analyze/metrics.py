@@ -0,0 +1,356 @@
+import collections
+import os
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Live metrics for long running scrapes, in the Prometheus text format.  They can be written to a file every so often
+# (ie. for node_exporter's textfile collector) or served on a local port.  Like profiling, nothing is recorded unless a
+# Metrics registry is started, so the instrumented code only pays for a None check otherwise.
+
+DEFAULT_INTERVAL = 15.0
+
+# The rates (ie. requests per second) are over this many of the most recent seconds
+RATE_WINDOW = 60.0
+
+# Errors and warnings are counted by a fixed category rather than by their message, since the messages have URLs, unit
+# numbers, values and exception text in them, and every different label value is its own series.  The first pattern
+# that matches a message wins
+MESSAGE_TYPES = (
+    (re.compile(r'^URL must start with'), 'invalid_url'),
+    (re.compile(r'^Could not request'), 'request_failed'),
+    (re.compile(r'^Redfin is currently down'), 'unavailable'),
+    (re.compile(r'^Received a 429 '), 'throttled'),
+    (re.compile(r'^Received a \d+ error code'), 'http_error'),
+    (re.compile(r'^Could not find the Redfin property and listing IDs'), 'missing_ids'),
+    (re.compile(r'^Could not find Price'), 'missing_price'),
+    (re.compile(r'^Could not find # of Units'), 'missing_units'),
+    (re.compile(r'^Could not find rent for Unit'), 'missing_rent'),
+    (re.compile(r'^Could not parse out taxes'), 'bad_taxes'),
+    (re.compile(r'^Unknown Tenant Pays value'), 'unknown_tenant_pays'),
+    (re.compile(r'^Could not read the gis search response'), 'bad_search_response'),
+    (re.compile(r'tiles could not be searched'), 'failed_tiles'),
+    (re.compile(r'^Only the first \d+ listings|tiles still had \d+ listings'), 'truncated_search'),
+)
+OTHER_MESSAGE_TYPE = 'other'
+
+REQUESTS_TOTAL = 'prop_analyze_requests_total'
+REQUESTS_IN_FLIGHT = 'prop_analyze_requests_in_flight'
+REQUEST_RETRIES_TOTAL = 'prop_analyze_request_retries_total'
+CACHE_LOOKUPS_TOTAL = 'prop_analyze_cache_lookups_total'
+LISTINGS = 'prop_analyze_listings'
+PROPERTIES_PARSED_TOTAL = 'prop_analyze_properties_parsed_total'
+PROPERTIES_ANALYZED_TOTAL = 'prop_analyze_properties_analyzed_total'
+SCRAPE_ERRORS_TOTAL = 'prop_analyze_scrape_errors_total'
+SCRAPE_WARNINGS_TOTAL = 'prop_analyze_scrape_warnings_total'
+REQUESTS_PER_SECOND = 'prop_analyze_requests_per_second'
+PARSE_RATE = 'prop_analyze_properties_parsed_per_second'
+ETA_SECONDS = 'prop_analyze_eta_seconds'
+CACHE_HIT_RATIO = 'prop_analyze_cache_hit_ratio'
+UPTIME_SECONDS = 'prop_analyze_uptime_seconds'
+
+# The type and help text of every metric, in the order they're output
+METRICS = {
+    REQUESTS_TOTAL: ('counter', 'Requests made to Redfin, by endpoint and status code (error if none was received)'),
+    REQUESTS_IN_FLIGHT: ('gauge', 'Requests to Redfin waiting on a response'),
+    REQUEST_RETRIES_TOTAL: ('counter', 'Requests to Redfin that were retried, by the status code that was retried '
+                                       '(error if none was received).  A rising count of 429s is throttling'),
+    CACHE_LOOKUPS_TOTAL: ('counter', 'Response cache lookups, by whether they were a hit, revalidated or a miss'),
+    LISTINGS: ('gauge', 'Listings to scrape in this run, across every search and poll so far'),
+    PROPERTIES_PARSED_TOTAL: ('counter', 'Properties scraped'),
+    PROPERTIES_ANALYZED_TOTAL: ('counter', 'Properties analyzed'),
+    SCRAPE_ERRORS_TOTAL: ('counter', 'Errors scraping properties, by type'),
+    SCRAPE_WARNINGS_TOTAL: ('counter', 'Warnings scraping properties, by type'),
+    REQUESTS_PER_SECOND: ('gauge', f'Requests made per second over the last {RATE_WINDOW:.0f} seconds'),
+    PARSE_RATE: ('gauge', f'Properties scraped per second over the last {RATE_WINDOW:.0f} seconds'),
+    ETA_SECONDS: ('gauge', 'Seconds until every listing is scraped, at the current rate'),
+    CACHE_HIT_RATIO: ('gauge', 'Fraction of cache lookups that were served without downloading the response'),
+    UPTIME_SECONDS: ('gauge', 'Seconds since the metrics were started'),
+}
+
+_active = None
+
+
+def message_type(msg: str) -> str:
+    """
+    Group error and warning messages by what went wrong
+    :param msg: The message
+    :return: The category of the message in MESSAGE_TYPES, or other
+    """
+    for pattern, category in MESSAGE_TYPES:
+        if pattern.search(msg):
+            return category
+    return OTHER_MESSAGE_TYPE
+
+
+def _key(name: str, labels: dict) -> tuple:
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items())) if labels else ()
+
+
+def _escape(v) -> str:
+    return str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_value(v: float) -> str:
+    if isinstance(v, float) and v.is_integer():
+        return str(int(v))
+    return repr(v)
+
+
+class Metrics:
+    """
+    Counters and gauges, by name and labels.  Safe to update from the scraper's worker threads
+    """
+
+    def __init__(self):
+        # (name, sorted label items) to value
+        self.values = dict()
+        self._lock = threading.Lock()
+        self._start = time.monotonic()
+
+        # (time, requests, properties parsed) as of each time the metrics were rendered, for the rates
+        self._samples = collections.deque()
+
+    def start(self):
+        """
+        Start recording.  Only one registry records at a time
+        """
+        global _active
+        _active = self
+
+    def stop(self):
+        global _active
+        if _active is self:
+            _active = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def add(self, name: str, n: float = 1, labels: dict = None):
+        k = _key(name, labels)
+        with self._lock:
+            self.values[k] = self.values.get(k, 0) + n
+
+    def set(self, name: str, value: float, labels: dict = None):
+        k = _key(name, labels)
+        with self._lock:
+            self.values[k] = value
+
+    def drain(self) -> dict:
+        """
+        Take every value recorded so far, leaving the registry empty.  For sending what a worker process recorded to
+        the process that started it, to be merged into its registry
+        :return: dict of (name, sorted label items) to value, picklable
+        """
+        with self._lock:
+            values = self.values
+            self.values = dict()
+        return values
+
+    def merge(self, values: dict):
+        """
+        Add the values another registry recorded, ie. in a worker process.  They're added, so gauges are only merged
+        correctly if the worker changes them with inc(), like the requests in flight
+        :param values: What its drain() returned
+        """
+        with self._lock:
+            for k, v in values.items():
+                self.values[k] = self.values.get(k, 0) + v
+
+    def total(self, name: str, **labels) -> float:
+        """
+        :return: The sum of a metric over every label value, or only the ones matching the labels given
+        """
+        with self._lock:
+            return sum(v for (n, items), v in self.values.items()
+                       if n == name and all(dict(items).get(k) == str(lv) for k, lv in labels.items()))
+
+    def _derived(self) -> dict:
+        """
+        Compute the rates, ETA and cache hit ratio from the counters
+        """
+        now = time.monotonic()
+        requests = self.total(REQUESTS_TOTAL)
+        parsed = self.total(PROPERTIES_PARSED_TOTAL)
+
+        with self._lock:
+            self._samples.append((now, requests, parsed))
+            while len(self._samples) > 2 and now - self._samples[1][0] >= RATE_WINDOW:
+                self._samples.popleft()
+            since, since_requests, since_parsed = self._samples[0] if len(self._samples) > 1 \
+                else (self._start, 0, 0)
+
+        elapsed = now - since
+        parse_rate = (parsed - since_parsed) / elapsed if elapsed > 0 else 0.0
+        derived = {
+            REQUESTS_PER_SECOND: (requests - since_requests) / elapsed if elapsed > 0 else 0.0,
+            PARSE_RATE: parse_rate,
+            UPTIME_SECONDS: now - self._start,
+        }
+
+        remaining = self.total(LISTINGS) - parsed
+        if parse_rate > 0 and remaining >= 0:
+            derived[ETA_SECONDS] = remaining / parse_rate
+
+        lookups = self.total(CACHE_LOOKUPS_TOTAL)
+        if lookups:
+            derived[CACHE_HIT_RATIO] = (lookups - self.total(CACHE_LOOKUPS_TOTAL, result='miss')) / lookups
+        return derived
+
+    def render(self) -> str:
+        """
+        :return: Every metric in the Prometheus text format
+        """
+        derived = self._derived()
+        with self._lock:
+            by_name = collections.defaultdict(list)
+            for (name, items), v in self.values.items():
+                by_name[name].append((items, v))
+        for name, v in derived.items():
+            by_name[name].append(((), v))
+
+        lines = []
+        for name, (kind, help_text) in METRICS.items():
+            if name not in by_name:
+                continue
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            for items, v in sorted(by_name[name]):
+                labels = ','.join(f'{k}="{_escape(lv)}"' for k, lv in items)
+                lines.append(f'{name}{{{labels}}} {_format_value(v)}' if labels else f'{name} {_format_value(v)}')
+        return '\n'.join(lines) + '\n'
+
+
+class MetricsFileWriter:
+    """
+    Writes the metrics to a file every interval seconds, from a background thread.  The file is replaced in one go,
+    so whatever reads it never sees half of it
+    """
+
+    def __init__(self, metrics: Metrics, path: str, interval: float = DEFAULT_INTERVAL):
+        self.metrics = metrics
+        self.path = path
+        self.interval = interval
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def write(self):
+        tmp = f'{self.path}.tmp'
+        with open(tmp, 'w') as f:
+            f.write(self.metrics.render())
+        os.replace(tmp, self.path)
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            self.write()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stop, writing the final values
+        """
+        self._stopped.set()
+        if self._thread:
+            self._thread.join()
+        self.write()
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+
+    server: 'MetricsServer'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split('?')[0] not in ('/', '/metrics'):
+            self.send_error(404)
+            return
+        body = self.server.metrics.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class MetricsServer(ThreadingHTTPServer):
+    """
+    Serves the metrics at /metrics on a local port, from a background thread
+    """
+
+    daemon_threads = True
+
+    def __init__(self, metrics: Metrics, port: int, host: str = '127.0.0.1'):
+        super().__init__((host, port), _MetricsHandler)
+        self.metrics = metrics
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        return f'http://{self.server_address[0]}:{self.server_address[1]}/metrics'
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        if self._thread:
+            self._thread.join()
+
+
+def is_recording() -> bool:
+    """
+    For skipping work that's only needed for a metric, like working out its labels
+    """
+    return _active is not None
+
+
+def inc(name: str, n: float = 1, labels: dict = None):
+    """
+    Add to a counter (or a gauge, with a negative n), if recording
+    """
+    m = _active
+    if m is not None:
+        m.add(name, n, labels)
+
+
+def set_gauge(name: str, value: float, labels: dict = None):
+    m = _active
+    if m is not None:
+        m.set(name, value, labels)
+
+
+def merge(values: dict):
+    """
+    Add what a registry in a worker process recorded to the active registry, if recording
+    :param values: What the worker's Metrics.drain() returned
+    """
+    m = _active
+    if m is not None:
+        m.merge(values)
+
+
+def record_scrape(res):
+    """
+    Count a scraped property, and its errors and warnings by type, if recording
+    :param res: The RFScrapeResult
+    """
+    m = _active
+    if m is None:
+        return
+    m.add(PROPERTIES_PARSED_TOTAL)
+    for e in res.errors:
+        m.add(SCRAPE_ERRORS_TOTAL, 1, {'type': message_type(e)})
+    for w in res.warnings:
+        m.add(SCRAPE_WARNINGS_TOTAL, 1, {'type': message_type(w)})
@@ -0,0 +1,274 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+import zlib
+import requests
+
+from prop_analyze.parsers.transport import TransportResponse
+from prop_analyze import metrics
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'prop_analyze')
+
+# Evict the least recently used responses once the cache grows past this many bytes
+DEFAULT_MAX_BYTES = 1024 * 1024 * 1024
+
+# The classes of Redfin endpoints, which go stale at different rates
+ENDPOINT_GIS = 'gis'
+ENDPOINT_DETAILS = 'details'
+ENDPOINT_PAGE = 'page'
+
+# How long (in seconds) a cached response of each endpoint class is used without asking Redfin again
+DEFAULT_TTLS = {
+    ENDPOINT_GIS: 15 * 60,
+    ENDPOINT_DETAILS: 24 * 60 * 60,
+    ENDPOINT_PAGE: 24 * 60 * 60,
+}
+
+
+def endpoint_class(url: str) -> str:
+    """
+    Classify a Redfin URL by the kind of endpoint it hits
+    :param url: The URL
+    :return: One of ENDPOINT_GIS, ENDPOINT_DETAILS or ENDPOINT_PAGE
+    """
+    if '/stingray/api/gis' in url:
+        return ENDPOINT_GIS
+    if '/stingray/api/home/details/' in url:
+        return ENDPOINT_DETAILS
+    return ENDPOINT_PAGE
+
+
+class OfflineCacheMiss(requests.RequestException):
+    """
+    Raised in offline mode when a URL is not in the cache
+    """
+    pass
+
+
+class CacheEntry:
+    url: str
+    status_code: int
+    text: str
+    etag: str = None
+    last_modified: str = None
+
+    # When the response was stored or last revalidated, as a unix timestamp
+    stored_at: float
+
+    def age(self) -> float:
+        return time.time() - self.stored_at
+
+    def to_response(self) -> TransportResponse:
+        headers = {}
+        if self.etag:
+            headers['ETag'] = self.etag
+        if self.last_modified:
+            headers['Last-Modified'] = self.last_modified
+        return TransportResponse(self.url, self.status_code, self.text, headers)
+
+
+class ResponseCache:
+    """
+    A persistent on-disk cache of HTTP responses, keyed by URL.  Each response is stored in its own file as a
+    line of JSON metadata followed by the zlib compressed body.
+    """
+
+    path: str
+    max_bytes: int
+
+    # The approximate total size of the cache on disk
+    size: int
+
+    def __init__(self, path: str = DEFAULT_CACHE_DIR, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+        os.makedirs(self.path, exist_ok=True)
+        self.size = sum(os.path.getsize(f) for f in self._all_files())
+
+    def _all_files(self) -> [str]:
+        for root, _, files in os.walk(self.path):
+            for f in files:
+                if f.endswith('.cache'):
+                    yield os.path.join(root, f)
+
+    def _file_for(self, url: str) -> str:
+        key = hashlib.sha256(url.encode('utf-8')).hexdigest()
+        return os.path.join(self.path, key[:2], f'{key}.cache')
+
+    @staticmethod
+    def _read(filename: str) -> CacheEntry:
+        with open(filename, 'rb') as f:
+            meta_line, body = f.read().split(b'\n', 1)
+
+        meta = json.loads(meta_line)
+        entry = CacheEntry()
+        entry.url = meta['url']
+        entry.status_code = meta['status_code']
+        entry.etag = meta.get('etag')
+        entry.last_modified = meta.get('last_modified')
+        entry.stored_at = meta['stored_at']
+        entry.text = zlib.decompress(body).decode('utf-8')
+        return entry
+
+    def _write(self, filename: str, entry: CacheEntry):
+        meta = {
+            'url': entry.url,
+            'status_code': entry.status_code,
+            'etag': entry.etag,
+            'last_modified': entry.last_modified,
+            'stored_at': entry.stored_at,
+        }
+        data = json.dumps(meta).encode('utf-8') + b'\n' + zlib.compress(entry.text.encode('utf-8'))
+
+        # Write to a temp file and move it into place, so readers never see a partial file
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(filename))
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+
+        with self._lock:
+            old_size = os.path.getsize(filename) if os.path.exists(filename) else 0
+            os.replace(tmp, filename)
+            self.size += len(data) - old_size
+
+        if self.size > self.max_bytes:
+            self._evict()
+
+    def get(self, url: str) -> CacheEntry:
+        """
+        Get the cached response for a URL
+        :param url: The URL
+        :return: The cache entry, or None if the URL is not cached
+        """
+        filename = self._file_for(url)
+        try:
+            entry = self._read(filename)
+        except (OSError, ValueError, zlib.error):
+            return None
+
+        # Guard against hash collisions
+        if entry.url != url:
+            return None
+
+        # Bump the modified time, which is what eviction uses to find the least recently used entries
+        try:
+            os.utime(filename)
+        except OSError:
+            pass
+        return entry
+
+    def put(self, url: str, response) -> CacheEntry:
+        """
+        Store a response in the cache
+        :param url: The URL that was requested
+        :param response: The response
+        :return: The new cache entry
+        """
+        entry = CacheEntry()
+        entry.url = url
+        entry.status_code = response.status_code
+        entry.text = response.text
+        entry.etag = response.headers.get('ETag')
+        entry.last_modified = response.headers.get('Last-Modified')
+        entry.stored_at = time.time()
+        self._write(self._file_for(url), entry)
+        return entry
+
+    def refresh(self, entry: CacheEntry):
+        """
+        Mark a cached entry as fresh again, ie. after Redfin told us it has not changed
+        :param entry: The entry
+        """
+        entry.stored_at = time.time()
+        self._write(self._file_for(entry.url), entry)
+
+    def _evict(self):
+        """
+        Delete the least recently used responses until the cache is comfortably below its max size
+        """
+        with self._lock:
+            target = self.max_bytes * 0.9
+            if self.size <= target:
+                return
+
+            files = []
+            for f in self._all_files():
+                try:
+                    st = os.stat(f)
+                except OSError:
+                    continue
+                files.append((st.st_mtime, st.st_size, f))
+            files.sort()
+
+            self.size = sum(s for _, s, _ in files)
+            for _, file_size, f in files:
+                if self.size <= target:
+                    break
+                try:
+                    os.remove(f)
+                except OSError:
+                    continue
+                self.size -= file_size
+
+
+class CachingTransport:
+    """
+    A transport that serves responses from a ResponseCache while they are fresh, revalidates stale responses
+    with Redfin using their ETag / Last-Modified headers, and stores new successful responses.
+    """
+
+    transport = None
+    cache: ResponseCache
+    ttls: dict
+
+    # If set, only serve from the cache and never make a request
+    offline: bool = False
+
+    def __init__(self, transport, cache: ResponseCache, ttls: dict = None, offline: bool = False):
+        self.transport = transport
+        self.cache = cache
+        self.ttls = dict(DEFAULT_TTLS)
+        self.ttls.update(ttls or {})
+        self.offline = offline
+
+    def get(self, url: str, headers: dict = None):
+        entry = self.cache.get(url)
+
+        if self.offline:
+            if not entry:
+                metrics.inc(metrics.CACHE_LOOKUPS_TOTAL, labels={'result': 'miss'})
+                raise OfflineCacheMiss(f'{url} is not cached (offline mode)')
+            metrics.inc(metrics.CACHE_LOOKUPS_TOTAL, labels={'result': 'hit'})
+            return entry.to_response()
+
+        if entry and entry.age() < self.ttls[endpoint_class(url)]:
+            metrics.inc(metrics.CACHE_LOOKUPS_TOTAL, labels={'result': 'hit'})
+            return entry.to_response()
+
+        # If we have a stale copy, ask Redfin if it changed
+        headers = dict(headers or {})
+        if entry and entry.etag:
+            headers['If-None-Match'] = entry.etag
+        if entry and entry.last_modified:
+            headers['If-Modified-Since'] = entry.last_modified
+
+        r = self.transport.get(url, headers=headers)
+
+        if r.status_code == 304 and entry:
+            metrics.inc(metrics.CACHE_LOOKUPS_TOTAL, labels={'result': 'revalidated'})
+            self.cache.refresh(entry)
+            return entry.to_response()
+
+        metrics.inc(metrics.CACHE_LOOKUPS_TOTAL, labels={'result': 'miss'})
+
+        if r.status_code == 200:
+            self.cache.put(url, r)
+        return r
+
+    def close(self):
+        self.transport.close()
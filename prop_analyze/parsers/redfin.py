@@ -1,17 +1,170 @@
+import os
+import logging
 import requests
 import re
 import json
+import html
+import itertools
+import collections
+import multiprocessing
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
 from bs4 import BeautifulSoup
 from fake_useragent import UserAgent
 
 from prop_analyze.utils import log, curr_str_to_float
+from prop_analyze.profiling import Profiler, timed, count, is_profiling
+from prop_analyze.parsers.cache import endpoint_class
+from prop_analyze import metrics, profiling
 from prop_analyze.property import Property, Utilities
+from prop_analyze.parsers.transport import get_default_transport, StaticTransport
+from prop_analyze.parsers.tiling import parse_poly, format_poly, parse_viewport, bbox_of_homes, split_bbox, can_split, \
+    get_query_param, set_query_param, HOMES_BBOX_MARGIN
 
-RF_BASE_URL = 'https://www.redfin.com'
+# Can be pointed somewhere else, ie. at the stand-in server in prop_analyze/benchmarks/rf_server.py
+RF_BASE_URL = os.environ.get('RF_BASE_URL', 'https://www.redfin.com').rstrip('/')
 RF_ITEM_PROP = 'itemprop'
 MAX_LISTINGS = 3000
 
+# The gis search API doesn't include the accessLevel needed for the below the fold data, so assume public listings
+RF_DEFAULT_ACCESS_LEVEL = '1'
+
+# The (group referenceName, amenity referenceName) combos in the below the fold data that can hold each value,
+# in the order they are tried.  For the per unit values, {n} is the number of the unit (starting at 1)
+NUM_UNITS_KEYS = (
+    ('BuildingInformation', 'TNU'),
+    ('Multi-FamilyInformation', 'UNT'),
+    ('Multi-FamilyFeatures', 'INCPTUNL'),
+    ('Multi-UnitInformation', 'MFM2_UNIT'),
+)
+UNIT_RENT_KEYS = (
+    ('Unit{n}Information', 'RT{n}'),
+    ('Unit{n}Information', 'IN{n}'),
+    ('Unit{n}Information', 'INCPU{n}_RT'),
+    ('Unit{n}Information', 'MFM2_U{n}_RT'),
+)
+UNIT_COUNT_KEYS = (
+    ('Unit{n}Information', 'AT{n}'),
+)
+UNIT_TENANT_PAYS_KEYS = (
+    ('Unit{n}Information', 'TP{n}'),
+)
+
+
+# Everything we need from a listing page is found with a single pass of this pattern over the HTML.  For the
+# itemprop spans and the price block it only matches the opening tag, and the text is matched after it
+PAGE_FIELDS_RE = re.compile(
+    r'<span\b[^>]*?\bitemprop=["\'](?P<itemprop>streetAddress|addressLocality|addressRegion)["\'][^>]*>'
+    r'|(?P<price><div\b[^>]*?\bclass=["\']info-block price["\'][^>]*>)'
+    r'|"(?P<id_name>propertyId|listingId|accessLevel)":(?P<id_value>\d+)'
+)
+ITEMPROP_TEXT_RE = re.compile(r'([^<]*)</span>')
+PRICE_TEXT_RE = re.compile(r'\s*<div\b[^>]*>([^<]*)</div>')
+PAGE_FIELDS = ('streetAddress', 'addressLocality', 'addressRegion', 'price', 'propertyId', 'listingId', 'accessLevel')
+
+# Just the IDs, for requesting the below the fold data before the rest of the page is parsed.  It's much quicker than
+# PAGE_FIELDS_RE, as it only starts matching at a "
+PAGE_IDS_RE = re.compile(r'"(?P<id_name>propertyId|listingId|accessLevel)":(?P<id_value>\d+)')
+PAGE_IDS = ('propertyId', 'listingId', 'accessLevel')
+
+
+def extract_page_fields(page_txt: str) -> dict:
+    """
+    Pull the address, price and IDs out of a listing page without building a full HTML tree
+    :param page_txt: The HTML of the listing page
+    :return: dict of the PAGE_FIELDS that were found to their text.  The first occurrence of each field wins.  A
+    field is None if it was found but isn't plain text (ie. has nested tags), so it needs a full parse
+    """
+    fields = {}
+    for m in PAGE_FIELDS_RE.finditer(page_txt):
+        if m.group('id_name'):
+            fields.setdefault(m.group('id_name'), m.group('id_value'))
+        else:
+            name = m.group('itemprop') or 'price'
+            if name in fields:
+                continue
+            text_re = PRICE_TEXT_RE if m.group('price') else ITEMPROP_TEXT_RE
+            t = text_re.match(page_txt, m.end())
+            fields[name] = html.unescape(t.group(1)) if t else None
+
+        if len(fields) == len(PAGE_FIELDS):
+            break
+    return fields
+
+
+def extract_page_ids(page_txt: str) -> dict:
+    """
+    Pull only the IDs out of a listing page, like extract_page_fields
+    :param page_txt: The HTML of the listing page
+    :return: dict of the PAGE_IDS that were found to their text.  The first occurrence of each ID wins
+    """
+    ids = {}
+    for m in PAGE_IDS_RE.finditer(page_txt):
+        ids.setdefault(m.group('id_name'), m.group('id_value'))
+        if len(ids) == len(PAGE_IDS):
+            break
+    return ids
+
+
+@lru_cache(maxsize=None)
+def unit_keys(keys: tuple, n: int) -> tuple:
+    """
+    Fill in the unit number of a table of per unit amenity keys.  These are cached, since every listing asks
+    for the same few units
+    :param keys: The table of keys, ie. UNIT_RENT_KEYS
+    :param n: The number of the unit, starting at 1
+    :return: The table of keys for that unit
+    """
+    return tuple((g.format(n=n), a.format(n=n)) for g, a in keys)
+
+
+def index_amenities(extra_data: dict) -> dict:
+    """
+    Index all of the amenities in the below the fold data in a single pass
+    :param extra_data: The 'payload' of the below the fold data
+    :return: dict of (group referenceName, amenity referenceName) to the amenityValues.  If a combo appears more
+    than once, the first one wins
+    """
+    amenities = {}
+    super_groups = extra_data.get('amenitiesInfo', {}).get('superGroups', [])
+    for sg_dict in super_groups:
+        for ag_dict in sg_dict.get('amenityGroups', []):
+            group_ref_name = ag_dict.get('referenceName')
+            for entry in ag_dict.get('amenityEntries', []):
+                amenities.setdefault((group_ref_name, entry.get('referenceName')), entry.get('amenityValues'))
+    return amenities
+
+
+def gis_value(home: dict, k: str):
+    """
+    Get a field of a gis search record.  Most look like {"value": ..., "level": 1}, but some are plain values
+    :param home: The gis search record
+    :param k: The field
+    :return: The value, or None if the record doesn't have it
+    """
+    v = home.get(k)
+    return v.get('value') if isinstance(v, dict) else v
+
+
+def home_key(home: dict):
+    """
+    :return: What identifies a gis search record, for dropping the listings found by more than one tile
+    """
+    return home.get('propertyId') or home['url']
+
+
+@lru_cache(maxsize=None)
+def _user_agents() -> UserAgent:
+    """
+    Loading the fake user agent data is slow, so only do it once and share it between scrapers
+    :return: The UserAgent
+    """
+    return UserAgent()
+
+
 class RFScrapeResult:
+    __slots__ = ('property', 'errors', 'warnings', 'raw')
+
     property: Property
 
     # Critical errors that stop us from parsing/analysing
@@ -20,9 +173,14 @@ class RFScrapeResult:
     # Non-critical warnings that shouldn't stop parsing/analysing
     warnings: [str]
 
+    # The raw Redfin fields the property was built from:  the gis search record ('home') and the fields pulled out
+    # of the listing page ('page_fields')
+    raw: dict
+
     def __init__(self):
         self.errors = []
         self.warnings = []
+        self.raw = None
 
     def add_error(self, e: str):
         self.errors.append(e)
@@ -42,13 +200,20 @@ class RFScraper:
     soup = None
     res: RFScrapeResult = None
 
-    def __init__(self, rf_url: str):
+    # The HTTP transport used to make all requests.  Shared between scrapers by default
+    transport = None
+
+    def __init__(self, rf_url: str, transport=None, user_agent: str = None):
         self.url = rf_url
+        self.transport = transport or get_default_transport()
 
-        # Get a fake user agent
-        ua = UserAgent()
-        # ua.update() TODO figure out why this times out
-        self.user_agent = ua.random
+        # Get a fake user agent, unless there's one to share
+        if user_agent:
+            self.user_agent = user_agent
+        else:
+            ua = _user_agents()
+            # ua.update() TODO figure out why this times out
+            self.user_agent = ua.random
 
     def _validate(self):
         """
@@ -60,30 +225,84 @@ class RFScraper:
             return False
         return True
 
-    def _make_request(self, url):
+    def _profile_key(self) -> str:
+        """
+        :return: The listing the time spent by this scraper is counted towards when profiling
+        """
+        return self.url
+
+    def _make_request(self, url, res: RFScrapeResult = None):
         """
         Makes a GET request to a Redfin URL
         :param url: The URL to request
+        :param res: The result to add any error to.  Defaults to this scraper's
         :return: Request Response
         """
+        res = res or self.res
 
         headers = {'user-agent': self.user_agent}
-        r = requests.get(url, headers=headers)
+        recording = metrics.is_recording()
+        if recording:
+            metrics.inc(metrics.REQUESTS_IN_FLIGHT)
+        try:
+            with timed('request', self._profile_key()):
+                r = self.transport.get(url, headers=headers)
+        except requests.RequestException as e:
+            count('request_errors')
+            if recording:
+                metrics.inc(metrics.REQUESTS_TOTAL, labels={'endpoint': endpoint_class(url), 'status': 'error'})
+            res.add_error(f'Could not request Redfin URL {url}: {e}')
+            return None
+        finally:
+            if recording:
+                metrics.inc(metrics.REQUESTS_IN_FLIGHT, -1)
+
+        if recording:
+            metrics.inc(metrics.REQUESTS_TOTAL, labels={'endpoint': endpoint_class(url), 'status': r.status_code})
+
+        count('requests')
+        if is_profiling():
+            content = getattr(r, 'content', None)
+            count('response_bytes', len(content) if content is not None else len(r.text.encode('utf-8')))
 
         if r.status_code == 200:
             return r
         elif r.status_code == 503:
-            self.res.add_error('Redfin is currently down for maintenance.')
+            res.add_error('Redfin is currently down for maintenance.')
         else:
-            self.res.add_error(f'Received a {r.status_code} error code requesting Redfin URL {url}')
+            res.add_error(f'Received a {r.status_code} error code requesting Redfin URL {url}')
         return None
 
 
 class RFPropertyScraper(RFScraper):
 
-    extra_data: str
+    # The below the fold data, as it was downloaded and once it's parsed
+    extra_data_txt: str = None
+    extra_data: dict = None
     property: Property = None
 
+    # The amenities in the extra data, indexed by index_amenities
+    amenities: dict = None
+
+    # The fields pulled out of the listing page by extract_page_fields
+    page_fields: dict = None
+
+    # The record for this property from the gis search API, if it was found through a listings search
+    home: dict = None
+
+    # The IDs needed to request the below the fold data
+    property_id: str = None
+    listing_id: str = None
+    access_level: str = None
+
+    # If given, the CPU bound parsing is done on this process pool, so it doesn't hold the GIL in the threads doing
+    # the requests.  See ParsedListing
+    parse_pool = None
+
+    def __init__(self, rf_url: str, transport=None, home: dict = None, user_agent: str = None):
+        super().__init__(rf_url, transport, user_agent)
+        self.home = home
+
     @staticmethod
     def _sanitize_value(val):
         """
@@ -96,31 +315,27 @@ class RFPropertyScraper(RFScraper):
         else:
             return val
 
-    def _get_extra_data(self):
+    def _fetch_extra_data(self):
         """
         In order to get their "below the fold" data to get some things we need, we need to make another request
         to one of their APIs. The query parameters for this API are embedded in the HTML somewhere.
         :return: boolean representing if the operation succeeded
         """
-
-        def _parse_out_val(v: str):
-            a = re.findall(f'\"{v}\":\d+', self.page_txt)
-            if a and len(a) > 0:
-                b = a[0].split(':')
-                if b and len(b) > 1:
-                    return b[1]
-            return None
-
-        # We need the propertyId, accessLevel, and listingId, so parse those out
-        property_id = _parse_out_val('propertyId')
-        access_level = _parse_out_val('accessLevel')
-        listing_id = _parse_out_val('listingId')
+        # We need the propertyId, accessLevel, and listingId, so use any we didn't get from the gis record.  The gis
+        # records usually leave out the accessLevel, so it falls back to the default if the page didn't have it either
+        property_id = self.property_id or self.page_fields.get('propertyId')
+        access_level = self.access_level or self.page_fields.get('accessLevel') or RF_DEFAULT_ACCESS_LEVEL
+        listing_id = self.listing_id or self.page_fields.get('listingId')
 
         if not property_id or not access_level or not listing_id:
+            self.res.add_error('Could not find the Redfin property and listing IDs')
             return False
 
+        self.property.property_id = property_id
+        self.property.listing_id = listing_id
+
         # Construct the URL to their API
-        extra_data_url = f'https://www.redfin.com/stingray/api/home/details/belowTheFold?' \
+        extra_data_url = f'{RF_BASE_URL}/stingray/api/home/details/belowTheFold?' \
                          f'propertyId={property_id}&accessLevel={access_level}&listingId={listing_id}'
 
         # Make the request
@@ -128,46 +343,73 @@ class RFPropertyScraper(RFScraper):
 
         if not r:
             return False
+        self.extra_data_txt = r.text
+        return True
 
-        res_text = r.text
+    def _parse_extra_data(self):
+        with timed('extra_data_parse', self.url):
+            res_text = self.extra_data_txt
 
-        # For some reason, Redfin prefixes JSON data with {}&&, so strip that out
-        prefix = '{}&&'
-        if res_text.startswith(prefix):
-            res_text = res_text[len(prefix):]
+            # For some reason, Redfin prefixes JSON data with {}&&, so strip that out
+            prefix = '{}&&'
+            if res_text.startswith(prefix):
+                res_text = res_text[len(prefix):]
 
-        # Now we should have just JSON left, so load it up.  The interesting part is in 'payload' key.
-        inner_data = json.loads(res_text)
-        self.extra_data = inner_data['payload']
-        return True
+            # Now we should have just JSON left, so load it up.  The interesting part is in 'payload' key.
+            inner_data = json.loads(res_text)
+            self.extra_data = inner_data['payload']
+            self.amenities = index_amenities(self.extra_data)
+        self.extra_data_txt = None
 
     def _get_amenity_from_extra_data(self, group_ref_name: str, amenity_ref_name: str):
         """
-        Utility method that parses out the value of a "amenity" from the extra_data
+        Utility method that looks up the value of a "amenity" from the extra_data
         :param group_ref_name: The 'referenceName' of the group that the amenity is in
         :param amenity_ref_name:  The 'referenceName' of the amenityEntry in the group
         :return: The amenityValues for the given parameters.  This looks like its usually a list
         """
-        super_groups = self.extra_data['amenitiesInfo']['superGroups']
-        for sg_dict in super_groups:
-            amenity_groups = sg_dict['amenityGroups']
-            for ag_dict in amenity_groups:
-                if ag_dict['referenceName'] == group_ref_name:
-                    entries = ag_dict['amenityEntries']
-                    for entry in entries:
-                        if entry['referenceName'] == amenity_ref_name:
-                            return entry['amenityValues']
-
-        # If we get here that means we found nothing
+        return self.amenities.get((group_ref_name, amenity_ref_name))
+
+    def _find_amenity(self, keys: tuple):
+        """
+        Find the first combo in a table of amenity keys that has a value
+        :param keys: The table of (group referenceName, amenity referenceName) combos to try, in order
+        :return: The amenityValues, or None if none of the combos had any
+        """
+        for key in keys:
+            values = self.amenities.get(key)
+            if values:
+                return values
         return None
 
+    def _get_soup(self):
+        """
+        Parse the page text with BeautifulSoup.  This is only needed when the fast extraction misses something
+        :return: The soup
+        """
+        if self.soup is None:
+            with timed('soup', self.url):
+                self.soup = BeautifulSoup(self.page_txt, 'html.parser')
+        return self.soup
+
+    def _get_item_prop(self, item_prop: str) -> str:
+        """
+        Get the text of an itemprop span in the HTML
+        :param item_prop: The itemprop
+        :return: The text, or empty if the span isn't on the page
+        """
+        t = self.page_fields.get(item_prop)
+        if t is None:
+            v = self._get_soup().find('span', attrs={RF_ITEM_PROP: item_prop})
+            t = v.get_text() if v else ''
+        return t
+
     def _parse_street_address(self):
         """
         Parse out the street address from the HTML and set it on the property
         :return:
         """
-        v = self.soup.find('span', attrs={RF_ITEM_PROP: 'streetAddress'})
-        t = v.get_text() if v else ''
+        t = self._get_item_prop('streetAddress')
         self.property.street_address = self._sanitize_value(t)
 
     def _parse_city(self):
@@ -175,8 +417,7 @@ class RFPropertyScraper(RFScraper):
         Parse out the city from the HTML and set it on the property
         :return:
         """
-        v = self.soup.find('span', attrs={RF_ITEM_PROP: 'addressLocality'})
-        t = v.get_text() if v else ''
+        t = self._get_item_prop('addressLocality')
         self.property.city = self._sanitize_value(t)
 
     def _parse_state(self):
@@ -184,8 +425,7 @@ class RFPropertyScraper(RFScraper):
         Parse out the state from the HTML and set it on the property
         :return:
         """
-        v = self.soup.find('span', attrs={RF_ITEM_PROP: 'addressRegion'})
-        t = v.get_text() if v else ''
+        t = self._get_item_prop('addressRegion')
         self.property.state = self._sanitize_value(t)
 
     def _parse_price(self):
@@ -193,9 +433,13 @@ class RFPropertyScraper(RFScraper):
         Parse out the purchase price from the HTML and set it on the property
         :return:
         """
-        el = self.soup.find('div', attrs={'class': 'info-block price'})
-        if el and el.find('div'):
-            price_text = el.find('div').get_text()
+        price_text = self.page_fields.get('price')
+        if price_text is None:
+            el = self._get_soup().find('div', attrs={'class': 'info-block price'})
+            if el and el.find('div'):
+                price_text = el.find('div').get_text()
+
+        if price_text is not None:
             price_float = curr_str_to_float(price_text)
             self.property.price = self._sanitize_value(price_float)
         else:
@@ -207,19 +451,7 @@ class RFPropertyScraper(RFScraper):
         Parse out the number of units from the extra data and set it on the property
         :return:
         """
-        values = None
-        combos = [
-            ('BuildingInformation', 'TNU'),
-            ('Multi-FamilyInformation', 'UNT'),
-            ('Multi-FamilyFeatures', 'INCPTUNL'),
-            ('Multi-FamilyFeatures', 'INCPTUNL'),
-            ('Multi-UnitInformation', 'MFM2_UNIT')
-        ]
-
-        for combo in combos:
-            values = self._get_amenity_from_extra_data(combo[0], combo[1])
-            if values:
-                break
+        values = self._find_amenity(NUM_UNITS_KEYS)
 
         if values:
             self.property.num_units = int(values[0])
@@ -240,18 +472,7 @@ class RFPropertyScraper(RFScraper):
         while i < self.property.num_units and units_accounted_for < self.property.num_units:
             rent_found = False
 
-            unit_rent_arr = None
-            combos = [
-                (f'Unit{i+1}Information', f'RT{i+1}'),
-                (f'Unit{i+1}Information', f'IN{i+1}'),
-                (f'Unit{i+1}Information', f'INCPU{i+1}_RT'),
-                (f'Unit{i+1}Information', f'MFM2_U{i+1}_RT'),
-            ]
-
-            for combo in combos:
-                unit_rent_arr = self._get_amenity_from_extra_data(combo[0], combo[1])
-                if unit_rent_arr:
-                    break
+            unit_rent_arr = self._find_amenity(unit_keys(UNIT_RENT_KEYS, i + 1))
 
             if unit_rent_arr:
                 try:
@@ -259,7 +480,7 @@ class RFPropertyScraper(RFScraper):
                     unit_rent_float = (curr_str_to_float(unit_rent_arr[0]))
 
                     # Get the number of units this rent accounts for
-                    units_of_this_type_arr = self._get_amenity_from_extra_data(f'Unit{i+1}Information', f'AT{i+1}')
+                    units_of_this_type_arr = self._find_amenity(unit_keys(UNIT_COUNT_KEYS, i + 1))
                     units_of_this_type = int(units_of_this_type_arr[0]) if units_of_this_type_arr else 1
 
                     # Add to the total rent taking into account of the number of units of this type
@@ -309,7 +530,7 @@ class RFPropertyScraper(RFScraper):
             'Tenant Pays Water': Utilities.WATER
         }
         for i in range(self.property.num_units):
-            tenant_pays = self._get_amenity_from_extra_data(f'Unit{i+1}Information', f'TP{i+1}')
+            tenant_pays = self._find_amenity(unit_keys(UNIT_TENANT_PAYS_KEYS, i + 1))
 
             if not tenant_pays:
                 # If not found, assume tenant pays all
@@ -329,25 +550,110 @@ class RFPropertyScraper(RFScraper):
 
         self.property.utilities_paid_by_unit = utilities_paid
 
+    def release(self):
+        """
+        Let go of the page text, soup and below the fold data, which are only needed while parsing
+        """
+        self.page_txt = None
+        self.soup = None
+        self.page_fields = None
+        self.extra_data_txt = None
+        self.extra_data = None
+        self.amenities = None
+        self.home = None
+
+    def _seed_from_home(self) -> bool:
+        """
+        Fill in everything we can from the gis search record, so the listing page doesn't need to be requested
+        :return: boolean representing if the record had everything we would otherwise get from the page
+        """
+        h = self.home
+        if not h:
+            return False
+
+        if h.get('propertyId') is not None:
+            self.property_id = str(h['propertyId'])
+        if h.get('listingId') is not None:
+            self.listing_id = str(h['listingId'])
+        if h.get('accessLevel') is not None:
+            self.access_level = str(h['accessLevel'])
+
+        street_address = gis_value(h, 'streetLine')
+        if street_address:
+            self.property.street_address = self._sanitize_value(street_address)
+        if h.get('city'):
+            self.property.city = self._sanitize_value(h['city'])
+        if h.get('state'):
+            self.property.state = self._sanitize_value(h['state'])
+
+        price = gis_value(h, 'price')
+        if price:
+            self.property.price = float(price)
+
+        return bool(self.property_id and self.listing_id and street_address and h.get('city') and h.get('state')
+                    and price)
+
+    def _parse_fields(self):
+        """
+        Parse the below the fold data, and the fields we still need out of the page.  This is the CPU bound part
+        """
+        self._parse_extra_data()
+
+        # Start parsing out the things we care about, skipping anything we already got from the gis record
+        if self.property.street_address is None:
+            self._parse_street_address()
+        if self.property.city is None:
+            self._parse_city()
+        if self.property.state is None:
+            self._parse_state()
+        if not self.property.price:
+            self._parse_price()
+        with timed('amenities', self.url):
+            self._parse_num_units()
+            self._parse_total_rent()
+            self._parse_taxes()
+            self._parse_utilities_paid()
+
     def _do_parse(self):
+        if self.parse_pool is not None:
+            self._do_parse_on_pool()
+            return
 
-        # Parse the page text with BeautifulSoup
-        self.soup = BeautifulSoup(self.page_txt, 'html.parser')
+        # Pull what we need out of the page, if we needed to request it
+        if self.page_txt is not None:
+            with timed('page_parse', self.url):
+                self.page_fields = extract_page_fields(self.page_txt)
+        else:
+            self.page_fields = {}
+        self.res.raw = {'home': self.home, 'page_fields': self.page_fields}
 
         # Get the extra "below the fold" data
-        if not self._get_extra_data():
+        if not self._fetch_extra_data():
             # If this failed, no point in continuing
             return
 
-        # Start parsing out the things we care about
-        self._parse_street_address()
-        self._parse_city()
-        self._parse_state()
-        self._parse_price()
-        self._parse_num_units()
-        self._parse_total_rent()
-        self._parse_taxes()
-        self._parse_utilities_paid()
+        self._parse_fields()
+
+    def _do_parse_on_pool(self):
+        """
+        Like _do_parse, but with the page and below the fold data parsed on the parse pool, in one job.  Only the IDs
+        needed to request the below the fold data are pulled out of the page here
+        """
+        if self.page_txt is not None:
+            with timed('page_ids', self.url):
+                self.page_fields = extract_page_ids(self.page_txt)
+        else:
+            self.page_fields = {}
+        self.res.raw = {'home': self.home, 'page_fields': self.page_fields}
+
+        if not self._fetch_extra_data():
+            return
+
+        listing = self.parse_pool.submit(parse_listing, ParsedListing(self), is_profiling()).result()
+        if listing.recorded:
+            profiling.merge(listing.recorded)
+        self.res = listing.res
+        self.property = self.res.property
 
     def parse(self) -> RFScrapeResult:
 
@@ -361,36 +667,156 @@ class RFPropertyScraper(RFScraper):
         if not self._validate():
             return self.res
 
-        # Request the page at the URL provided
-        response = self._make_request(self.url)
+        # Only request the page at the URL provided if the gis record was missing something
+        if not self._seed_from_home():
+            response = self._make_request(self.url)
 
-        # Make sure we got a valid response
-        if not response:
-            return self.res
+            # Make sure we got a valid response
+            if not response:
+                return self.res
 
-        # Grab the page response
-        self.page_txt = response.text
+            # Grab the page response
+            self.page_txt = response.text
 
         # Parse it into a Property and return
         self._do_parse()
         return self.res
 
 
+class ParsedListing:
+    """
+    Everything downloaded for a property, to be parsed in another process, and then the result of parsing it.  It's
+    only what the parsing needs, so it's quick to pickle:  the page and below the fold data are sent as they were
+    downloaded, and let go of once they're parsed
+    """
+    __slots__ = ('url', 'home', 'res', 'page_txt', 'extra_data_txt', 'recorded')
+
+    def __init__(self, scraper: RFPropertyScraper):
+        self.url = scraper.url
+        self.home = scraper.home
+        self.res = scraper.res
+        self.page_txt = scraper.page_txt
+        self.extra_data_txt = scraper.extra_data_txt
+
+        # What the profiler recorded while it was parsed, if profiling
+        self.recorded = None
+
+    def parse(self):
+        """
+        Parse the page, if there is one, and the below the fold data into the scrape result's property
+        """
+        scraper = RFPropertyScraper(self.url, StaticTransport(), self.home, user_agent='parse')
+        scraper.res = self.res
+        scraper.property = self.res.property
+        scraper.page_txt = self.page_txt
+        scraper.extra_data_txt = self.extra_data_txt
+        if self.page_txt is not None:
+            with timed('page_parse', self.url):
+                scraper.page_fields = extract_page_fields(self.page_txt)
+        else:
+            scraper.page_fields = {}
+        self.res.raw = {'home': self.home, 'page_fields': scraper.page_fields}
+        scraper._parse_fields()
+
+        self.page_txt = None
+        self.extra_data_txt = None
+
+
+def parse_listing(listing: ParsedListing, profile: bool = False) -> ParsedListing:
+    """
+    Parse a listing on the parse pool.  The profiler of the process that submitted it isn't active in the pool's
+    processes, so if it's profiling, the timings are recorded here and sent back with the listing to be merged into it
+    :param listing: The listing
+    :param profile: Whether to record the timings
+    :return: The listing, parsed
+    """
+    if not profile:
+        listing.parse()
+        return listing
+
+    with Profiler() as profiler:
+        listing.parse()
+    listing.recorded = profiler.drain()
+    return listing
+
+
 class RFListingScraper(RFScraper):
 
-    property_urls: [str] = []
-    results: [RFScrapeResult] = []
+    property_urls: [str]
+    homes: [dict]
+    results: [RFScrapeResult]
+
+    # The number of properties to scrape at the same time
+    workers: int = 1
+
+    # The gis search API URL that gives us all of the listings, once it's been found on the listings page
+    gis_url: str = None
+
+    # How many scrapes each worker can run ahead of the result being consumed.  This is the backpressure that
+    # keeps memory flat when results are consumed more slowly than they are scraped
+    MAX_PENDING_PER_WORKER = 2
+
+    # The most listings the gis search API is asked for.  A search that gets this many back is missing some, so it's
+    # split into tiles that are searched on their own
+    max_listings: int = MAX_LISTINGS
+
+    # Tiles that still hit max_listings are split again, down to this many levels (at most 4 ** MAX_TILE_DEPTH tiles)
+    MAX_TILE_DEPTH = 6
+
+    # The tiles are searched on this many threads, or on workers threads if there are more of them
+    TILE_WORKERS = 4
+
+    # How the last search was tiled, if it was: the number of tiles searched, split (including the whole search),
+    # still at max_listings (truncated) and failed, and the listings found, dropped as duplicates and only found by
+    # the whole search (outside_tiles)
+    coverage: dict = None
+
+    def __init__(self, rf_url: str, workers: int = 1, transport=None, user_agent: str = None,
+                 parse_workers: int = 0):
+        """
+        :param rf_url: The search URL
+        :param workers: The number of properties to scrape at the same time, on threads
+        :param transport: The transport to make the requests with
+        :param user_agent: The user agent to make the requests as.  Defaults to a random one
+        :param parse_workers: If more than 0, the listing pages and below the fold data are parsed on a pool of this
+        many processes instead of on the scraping threads, so parsing isn't limited to one core by the GIL
+        """
+        super().__init__(rf_url, transport, user_agent)
+        self.workers = max(1, workers)
+        self.parse_workers = parse_workers
+        self._parse_pool = None
+        self.property_urls = []
+        self.homes = []
+        self.results = []
+
+    def _profile_key(self) -> str:
+        # The search isn't a listing, so it isn't one of the slowest listings
+        return None
 
     def _extract_properties(self):
 
         # Dig out the API url that gives us all of the Listings
         api_url = re.findall('\\\\u002Fstingray\\\\u002Fapi\\\\u002Fgis\?.*?(?=\")', self.page_txt)[0]
         api_url = api_url.encode('utf-8').decode('unicode_escape')
-        api_url = re.sub('num_homes=\d+', f'num_homes={MAX_LISTINGS}', api_url)
-        api_url = f'{RF_BASE_URL}{api_url}'
+        api_url = re.sub('num_homes=\d+', f'num_homes={self.max_listings}', api_url)
+        self.gis_url = f'{RF_BASE_URL}{api_url}'
 
-        # Make the request
-        r = self._make_request(api_url)
+        self._load_homes()
+
+    def _warn(self, w: str):
+        self.res.add_warning(w)
+        log(w, logging.WARNING)
+
+    def _fetch_gis(self, url: str, res: RFScrapeResult = None) -> [dict]:
+        """
+        Request a gis search
+        :param url: The gis search API URL
+        :param res: The result to add any error to.  Defaults to this scraper's
+        :return: The gis search records of the listings, or None if the request failed
+        """
+        r = self._make_request(url, res)
+        if not r:
+            return None
         res_text = r.text
 
         # For some reason, Redfin prefixes JSON data with {}&&, so strip that out
@@ -400,38 +826,269 @@ class RFListingScraper(RFScraper):
 
         # Now we should have just JSON left, so load it up.  The interesting part is in 'payload' key.
         inner_data = json.loads(res_text)
-        homes = inner_data['payload']['homes']
+        return inner_data['payload']['homes']
+
+    def _fetch_tile(self, url: str) -> ([dict], [str]):
+        """
+        Request one tile of a split search.  A tile that fails doesn't fail the search, so its errors are kept apart
+        from the search's
+        :param url: The tile's gis search API URL
+        :return: The gis search records of the tile's listings, or None if it failed, and the errors if it did
+        """
+        res = RFScrapeResult()
+        try:
+            homes = self._fetch_gis(url, res)
+        except Exception as e:
+            res.add_error(f'Could not read the gis search response for {url}: {e!r}')
+            homes = None
+        return homes, res.errors
+
+    def _tile_search(self, homes: [dict]) -> [dict]:
+        """
+        Split a search that hit max_listings into four tiles, and any tile that hits it too into four more, until none
+        do.  The tiles are searched concurrently, each as soon as its parent is back
+        :param homes: The listings the whole search returned
+        :return: Every listing found, once each, in the order of the tiles.  Then the listings of the whole search
+        that none of the tiles found
+        """
+        coverage = self.coverage = {'tiles': 1, 'split': 0, 'truncated': 0, 'failed': 0,
+                                    'listings': 0, 'duplicates': 0, 'outside_tiles': 0}
+
+        # Tile the area searched, or if it isn't known, around the area the listings returned are in
+        box = parse_poly(get_query_param(self.gis_url, 'poly') or '') or parse_viewport(self.url) \
+            or bbox_of_homes(homes, HOMES_BBOX_MARGIN)
+        if box is None or not can_split(box):
+            coverage['truncated'] = 1
+            coverage['listings'] = len(homes)
+            self._warn(f'Only the first {self.max_listings} listings were found.  The search area could not be split '
+                       f'into tiles, since the listings have no locations')
+            return homes
+
+        # The homes of each tile that wasn't split, by its path of quarters from the whole search, ie. (0, 3)
+        tiles = dict()
+        tile_errors = []
+        with ThreadPoolExecutor(max_workers=max(self.workers, self.TILE_WORKERS)) as executor:
+            pending = dict()
+
+            def split(path: tuple, tile_box):
+                coverage['split'] += 1
+                for i, quarter in enumerate(split_bbox(tile_box)):
+                    f = executor.submit(self._fetch_tile, set_query_param(self.gis_url, 'poly', format_poly(quarter)))
+                    pending[f] = (path + (i,), quarter)
+
+            split((), box)
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for f in done:
+                    path, tile_box = pending.pop(f)
+                    tile_homes, errors = f.result()
+                    coverage['tiles'] += 1
+                    if tile_homes is None:
+                        coverage['failed'] += 1
+                        tile_errors.extend(errors)
+                    elif len(tile_homes) < self.max_listings:
+                        tiles[path] = tile_homes
+                    elif len(path) < self.MAX_TILE_DEPTH and can_split(tile_box):
+                        split(path, tile_box)
+                    else:
+                        coverage['truncated'] += 1
+                        tiles[path] = tile_homes
+
+        # Homes on the edge of two tiles can be in both
+        seen = set()
+        merged = []
+        for path in sorted(tiles):
+            for h in tiles[path]:
+                k = home_key(h)
+                if k in seen:
+                    coverage['duplicates'] += 1
+                    continue
+                seen.add(k)
+                merged.append(h)
+        for h in homes:
+            k = home_key(h)
+            if k not in seen:
+                coverage['outside_tiles'] += 1
+                seen.add(k)
+                merged.append(h)
+        coverage['listings'] = len(merged)
+
+        log(f'Searched {coverage["tiles"]} tiles ({coverage["split"]} split, {coverage["failed"]} failed, '
+            f'{coverage["truncated"]} still at {self.max_listings} listings) and found {len(merged)} listings.  '
+            f'Dropped {coverage["duplicates"]} duplicates')
+        if coverage['failed']:
+            # The listings of the tiles that did load are still scraped, but the failed tiles' are missing
+            self._warn(f'{coverage["failed"]} tiles could not be searched, so some listings may be missing: '
+                       f'{tile_errors[0] if tile_errors else "no response"}')
+        if coverage['truncated']:
+            self._warn(f'{coverage["truncated"]} tiles still had {self.max_listings} listings, so some listings may '
+                       f'be missing')
+        return merged
+
+    def _load_homes(self):
+        """
+        Request the gis search results and extract the property URLs and records from them.  If there are more
+        listings than the search returns, the search is split into tiles
+        """
+        self.property_urls = []
+        self.homes = []
+        self.coverage = None
+
+        homes = self._fetch_gis(self.gis_url)
+        if homes is None:
+            return
+        if len(homes) >= self.max_listings:
+            homes = self._tile_search(homes)
 
         for h in homes:
             prop_url = h['url']
             self.property_urls.append(f'{RF_BASE_URL}{prop_url}')
+            self.homes.append(h)
 
-    def _parse_properties(self):
-        for url in self.property_urls:
-            scraper = RFPropertyScraper(url)
-            self.results.append(scraper.parse())
+    def _scrape_property(self, url: str, home: dict = None) -> RFScrapeResult:
+        """
+        Scrape a single property URL, sharing this scraper's transport and user agent, like a browser would
+        :param url: The property URL
+        :param home: The gis search record for the property, if there is one
+        :return: The scrape result
+        """
+        scraper = RFPropertyScraper(url, self.transport, home, self.user_agent)
+        scraper.parse_pool = self._parse_pool
+        with timed('scrape'):
+            res = scraper.parse()
+        scraper.release()
+        metrics.record_scrape(res)
+        return res
+
+    def _log_progress(self, num_parsed: int):
+        if num_parsed % 10 == 0:
+            log(f'Parsed {num_parsed} out of {len(self.property_urls)} properties')
+
+    def _iter_properties(self):
+        """
+        Scrape all the properties, yielding each result in the order of the property URLs as soon as it's ready
+        :return: Generator of RFScrapeResult
+        """
+        # Added to rather than set, so the progress and ETA cover every search of a batch or every poll of a watch
+        metrics.inc(metrics.LISTINGS, len(self.property_urls))
 
-            if len(self.results) % 10 == 0:
-                log(f'Parsed {len(self.results)} out of {len(self.property_urls)} properties')
+        if not self.parse_workers:
+            yield from self._iter_scrapes()
+            return
 
-    def parse_listings(self) -> [RFScrapeResult]:
+        # The parsing processes are started fresh instead of forked, since forking while the scraping threads are
+        # running can copy locks they hold
+        with ProcessPoolExecutor(self.parse_workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+            self._parse_pool = pool
+            try:
+                yield from self._iter_scrapes()
+            finally:
+                self._parse_pool = None
+
+    def _iter_scrapes(self):
+        if self.workers == 1:
+            for i, (url, home) in enumerate(zip(self.property_urls, self.homes)):
+                res = self._scrape_property(url, home)
+                self._log_progress(i + 1)
+                yield res
+            return
+
+        # Scrape with a bounded pool of threads, since almost all of the time is spent waiting on Redfin.
+        # Progress is counted as the scrapes complete, but the results keep the order of the property URLs.
+        # Only a bounded window of scrapes is submitted ahead of the result being consumed.
+        num_parsed = itertools.count(1)
+        max_pending = self.workers * self.MAX_PENDING_PER_WORKER
+        pending = collections.deque()
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            try:
+                for url, home in zip(self.property_urls, self.homes):
+                    if len(pending) >= max_pending:
+                        yield pending.popleft().result()
+
+                    f = executor.submit(self._scrape_property, url, home)
+                    f.add_done_callback(lambda _: self._log_progress(next(num_parsed)))
+                    pending.append(f)
+
+                while pending:
+                    yield pending.popleft().result()
+            finally:
+                # If the consumer stopped early, don't bother with the scrapes that haven't started
+                for f in pending:
+                    f.cancel()
+
+    def _parse_properties(self):
+        self.results.extend(self._iter_properties())
+
+    def _load_listings(self) -> bool:
+        """
+        Request the listings page and extract the property URLs from it
+        :return: boolean representing if the operation succeeded
+        """
+        self.res = RFScrapeResult()
 
         # Validate first
         self._validate()
 
         # Request the page at the URL provided
         response = self._make_request(self.url)
+        if not response:
+            log(f'Could not load listings: {", ".join(self.res.errors)}')
+            return False
         self.page_txt = response.text
 
-        # Extract the property URLs from the listings
+        # Extract the property URLs from the listings.  The page isn't needed after that
         self._extract_properties()
+        self.page_txt = None
         log(f'Found {len(self.property_urls)} total properties')
+        return True
 
-        # Scape all the properties individually
-        self._parse_properties()
+    def load_homes(self) -> bool:
+        """
+        Load the gis search results, without requesting the listings page again if the gis URL is already known
+        :return: boolean representing if the operation succeeded
+        """
+        if not self.gis_url:
+            return self._load_listings() and not self.res.errors
 
-        # Return the results
-        return self.results
+        self.res = RFScrapeResult()
+        self._load_homes()
+        if self.res.errors:
+            log(f'Could not load listings: {", ".join(self.res.errors)}')
+            return False
+        return True
 
+    def iter_homes(self, homes: [dict]):
+        """
+        Scrape only some of the loaded listings
+        :param homes: The gis search records of the listings to scrape
+        :return: Generator of RFScrapeResult, in the order of homes
+        """
+        yield from self.iter_urls([f'{RF_BASE_URL}{h["url"]}' for h in homes], homes)
 
+    def iter_urls(self, urls: [str], homes: [dict] = None):
+        """
+        Scrape any property URLs, not just the ones from this scraper's search
+        :param urls: The property URLs
+        :param homes: The gis search record of each URL, or None for the ones that don't have one
+        :return: Generator of RFScrapeResult, in the order of urls
+        """
+        self.property_urls = list(urls)
+        self.homes = list(homes) if homes is not None else [None] * len(self.property_urls)
+        yield from self._iter_properties()
 
+    def iter_listings(self):
+        """
+        Like parse_listings, but yields each result as soon as it's ready instead of waiting for all of them
+        :return: Generator of RFScrapeResult, in the order of the listings
+        """
+        if self._load_listings():
+            yield from self._iter_properties()
+
+    def parse_listings(self) -> [RFScrapeResult]:
+
+        # Scape all the properties individually
+        if self._load_listings():
+            self._parse_properties()
+
+        # Return the results
+        return self.results
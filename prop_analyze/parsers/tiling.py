@@ -0,0 +1,110 @@
+import collections
+import re
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode, quote
+
+# The gis search API only returns up to num_homes listings, so big searches are split into smaller boxes (tiles) that
+# are each searched on their own.  A box is (south, west, north, east) in degrees.  The API takes a box as the poly
+# parameter, a closed ring of "longitude latitude" points.
+
+BBox = collections.namedtuple('BBox', ('south', 'west', 'north', 'east'))
+
+# The viewport filter of a search page URL, ie. viewport=42.02:41.64:-87.52:-87.94 (north:south:east:west)
+VIEWPORT_RE = re.compile(r'viewport=(-?[\d.]+):(-?[\d.]+):(-?[\d.]+):(-?[\d.]+)')
+
+# When the area searched isn't known, the box around the listings the search returned is tiled instead.  They're only
+# some of the listings, so the box is widened by this fraction of its size on each side
+HOMES_BBOX_MARGIN = 0.5
+
+# Tiles smaller than this (in degrees, about 10m) aren't split any further
+MIN_TILE_SIZE = 0.0001
+
+
+def parse_poly(poly: str) -> BBox:
+    """
+    :param poly: A gis poly parameter, ie. -87.94 41.64,-87.52 41.64,-87.52 42.02,-87.94 42.02,-87.94 41.64
+    :return: The box around it, or None if it can't be parsed
+    """
+    try:
+        points = [tuple(float(v) for v in point.split()) for point in poly.split(',')]
+        lngs, lats = zip(*points)
+    except ValueError:
+        return None
+    return BBox(min(lats), min(lngs), max(lats), max(lngs))
+
+
+def format_poly(box: BBox) -> str:
+    """
+    :return: The gis poly parameter for a box
+    """
+    corners = ((box.west, box.south), (box.east, box.south), (box.east, box.north), (box.west, box.north),
+               (box.west, box.south))
+    return ','.join(f'{lng:.6f} {lat:.6f}' for lng, lat in corners)
+
+
+def parse_viewport(url: str) -> BBox:
+    """
+    :param url: A search page URL
+    :return: The box of its viewport filter, or None if it doesn't have one
+    """
+    m = VIEWPORT_RE.search(url)
+    if not m:
+        return None
+    north, south, east, west = (float(v) for v in m.groups())
+    return BBox(min(south, north), min(west, east), max(south, north), max(west, east))
+
+
+def home_lat_lng(home: dict) -> (float, float):
+    """
+    :param home: A gis search record
+    :return: Its latitude and longitude, or None if it doesn't have them
+    """
+    value = (home.get('latLong') or {}).get('value') or {}
+    if 'latitude' not in value or 'longitude' not in value:
+        return None
+    return value['latitude'], value['longitude']
+
+
+def bbox_of_homes(homes: [dict], margin: float = 0.0) -> BBox:
+    """
+    :param homes: gis search records
+    :param margin: The fraction of the box's height and width to widen it by, on each side
+    :return: The box around the locations of the homes, or None if none of them have one
+    """
+    points = [p for p in map(home_lat_lng, homes) if p is not None]
+    if not points:
+        return None
+    lats, lngs = zip(*points)
+    d_lat = (max(lats) - min(lats)) * margin
+    d_lng = (max(lngs) - min(lngs)) * margin
+    return BBox(min(lats) - d_lat, min(lngs) - d_lng, max(lats) + d_lat, max(lngs) + d_lng)
+
+
+def split_bbox(box: BBox) -> [BBox]:
+    """
+    :return: The four quarters of a box, southwest, southeast, northwest then northeast
+    """
+    mid_lat = (box.south + box.north) / 2
+    mid_lng = (box.west + box.east) / 2
+    return [
+        BBox(box.south, box.west, mid_lat, mid_lng),
+        BBox(box.south, mid_lng, mid_lat, box.east),
+        BBox(mid_lat, box.west, box.north, mid_lng),
+        BBox(mid_lat, mid_lng, box.north, box.east),
+    ]
+
+
+def can_split(box: BBox) -> bool:
+    return box.north - box.south > MIN_TILE_SIZE or box.east - box.west > MIN_TILE_SIZE
+
+
+def get_query_param(url: str, k: str) -> str:
+    return dict(parse_qsl(urlsplit(url).query)).get(k)
+
+
+def set_query_param(url: str, k: str, v: str) -> str:
+    """
+    :return: The URL with the query parameter k set to v, keeping the order of the other parameters
+    """
+    parts = urlsplit(url)
+    query = [(qk, qv) for qk, qv in parse_qsl(parts.query, keep_blank_values=True) if qk != k] + [(k, v)]
+    return urlunsplit(parts._replace(query=urlencode(query, quote_via=quote)))
@@ -0,0 +1,130 @@
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util import make_headers
+from urllib3.util.retry import Retry
+
+from prop_analyze import metrics
+
+# The number of connections kept open per host
+DEFAULT_POOL_SIZE = 16
+
+# Seconds to wait to connect to / read from Redfin
+DEFAULT_CONNECT_TIMEOUT = 5.0
+DEFAULT_READ_TIMEOUT = 30.0
+
+# Transient errors are retried with an exponential backoff
+DEFAULT_RETRIES = 3
+DEFAULT_BACKOFF_FACTOR = 0.5
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+
+class TransportResponse:
+    """
+    A minimal HTTP response, for transports that don't go through requests (ie. cached or canned responses)
+    """
+    url: str
+    status_code: int
+    text: str
+    headers: dict
+
+    def __init__(self, url: str, status_code: int, text: str, headers: dict = None):
+        self.url = url
+        self.status_code = status_code
+        self.text = text
+        self.headers = headers or {}
+
+
+class RFTransport:
+    """
+    A pooled, keep-alive HTTP transport.  A single instance is meant to be shared by every scraper, so that
+    connections to Redfin are reused instead of paying a new TCP+TLS handshake for every request.
+    """
+
+    session: requests.Session
+    timeout: (float, float)
+
+    def __init__(self,
+                 pool_size: int = DEFAULT_POOL_SIZE,
+                 connect_timeout: float = DEFAULT_CONNECT_TIMEOUT,
+                 read_timeout: float = DEFAULT_READ_TIMEOUT,
+                 retries: int = DEFAULT_RETRIES,
+                 backoff_factor: float = DEFAULT_BACKOFF_FACTOR):
+        self.timeout = (connect_timeout, read_timeout)
+
+        retry = Retry(total=retries,
+                      backoff_factor=backoff_factor,
+                      status_forcelist=RETRY_STATUS_CODES,
+                      allowed_methods=frozenset(['GET']),
+                      respect_retry_after_header=True,
+                      raise_on_status=False)
+
+        # pool_maxsize limits the connections per host. Block instead of opening throwaway connections past it.
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, pool_block=True, max_retries=retry)
+
+        self.session = requests.Session()
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        # Ask for compressed responses (brotli is included when the brotli package is installed)
+        self.session.headers.update(make_headers(keep_alive=True, accept_encoding=True))
+
+    def get(self, url: str, headers: dict = None):
+        """
+        Makes a GET request
+        :param url: The URL to request
+        :param headers: Any extra headers to send
+        :return: The response.  Raises a requests.RequestException if the request could not be made
+        """
+        r = self.session.get(url, headers=headers, timeout=self.timeout)
+
+        # The retries are made by urllib3, so the only sign of them is in the history of the final response
+        if metrics.is_recording():
+            retries = getattr(r.raw, 'retries', None)
+            for h in retries.history if retries else ():
+                metrics.inc(metrics.REQUEST_RETRIES_TOTAL, labels={'status': h.status or 'error'})
+        return r
+
+    def close(self):
+        self.session.close()
+
+
+class StaticTransport:
+    """
+    A stand-in transport that serves canned responses, keyed by URL.  Useful for tests.
+    """
+
+    responses: dict
+    requested_urls: [str]
+
+    def __init__(self, responses: dict = None):
+        self.responses = responses or {}
+        self.requested_urls = []
+
+    def add(self, url: str, text: str, status_code: int = 200, headers: dict = None):
+        self.responses[url] = TransportResponse(url, status_code, text, headers)
+
+    def get(self, url: str, headers: dict = None):
+        self.requested_urls.append(url)
+        if url in self.responses:
+            return self.responses[url]
+        return TransportResponse(url, 404, '')
+
+    def close(self):
+        pass
+
+
+_default_transport: RFTransport = None
+_default_transport_lock = threading.Lock()
+
+
+def get_default_transport() -> RFTransport:
+    """
+    Get the transport shared by all scrapers that weren't given one explicitly
+    :return: The shared transport
+    """
+    global _default_transport
+    with _default_transport_lock:
+        if _default_transport is None:
+            _default_transport = RFTransport()
+        return _default_transport
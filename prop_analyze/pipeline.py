@@ -0,0 +1,87 @@
+from prop_analyze.parsers.redfin import RFListingScraper
+from prop_analyze.analysis.analyze import Analysis
+from prop_analyze.analysis.ranking import TopK
+from prop_analyze.store import PropertyStore
+from prop_analyze.profiling import timed
+from prop_analyze import metrics
+
+# The find_best pipeline, as a chain of generators:  scrape -> analyze -> rank
+# Each stage pulls one item at a time from the stage before it, so nothing gets further ahead than the scraper's
+# bounded window of pending scrapes, and nothing is held on to once the last stage is done with it.
+
+
+class PipelineStats:
+    """
+    Counts of what has gone through the pipeline so far
+    """
+
+    # The number of properties scraped
+    num_parsed: int = 0
+
+    # The number of properties that scraped without critical errors and were analyzed
+    num_analyzed: int = 0
+
+
+def scrape_listings(scraper: RFListingScraper, stats: PipelineStats):
+    """
+    The first stage.  Scrape the properties of a listing
+    :param scraper: The listing scraper
+    :param stats: The stats to update
+    :return: Generator of RFScrapeResult, in the order of the listings
+    """
+    for res in scraper.iter_listings():
+        stats.num_parsed += 1
+        yield res
+
+
+def analyze_results(results, stats: PipelineStats, store: PropertyStore = None):
+    """
+    Analyze the scrape results that don't have critical errors
+    :param results: The scrape results
+    :param stats: The stats to update
+    :param store: If given, every analysis is added to it along with the raw fields of its property
+    :return: Generator of AnalysisResult
+    """
+    for res in results:
+        if len(res.errors):
+            continue
+        stats.num_analyzed += 1
+        url = res.property.url
+        with timed('analysis', url):
+            analysis = Analysis(res.property).anaylze()
+        metrics.inc(metrics.PROPERTIES_ANALYZED_TOTAL)
+        if store is not None:
+            with timed('store', url):
+                store.add(analysis, res.raw)
+        yield analysis
+
+
+def rank_analyses(analyses, top: TopK, on_analysis=None) -> TopK:
+    """
+    The last stage.  Keep only the best of the analyses
+    :param analyses: The analyses
+    :param top: The top k to push them onto
+    :param on_analysis: Optionally called with every analysis after it's pushed
+    :return: top
+    """
+    for res in analyses:
+        with timed('rank'):
+            top.push(res)
+        if on_analysis:
+            on_analysis(res)
+    return top
+
+
+def run_pipeline(scraper: RFListingScraper, top: TopK, stats: PipelineStats = None, on_analysis=None,
+                 store: PropertyStore = None) -> TopK:
+    """
+    Scrape, analyze and rank the properties of a listing in one pass, holding only the best of them at the end
+    :param scraper: The listing scraper
+    :param top: The top k to rank the analyses in
+    :param stats: The stats to update, if they're needed
+    :param on_analysis: Optionally called with every analysis after it's ranked
+    :param store: If given, every analysis is also added to it
+    :return: top
+    """
+    stats = stats or PipelineStats()
+    return rank_analyses(analyze_results(scrape_listings(scraper, stats), stats, store), top, on_analysis)
@@ -0,0 +1,224 @@
+import cProfile
+import heapq
+import json
+import threading
+import time
+
+# Low overhead timers and counters for the stages of scraping and analyzing properties.  They only record anything
+# while a Profiler is started.  Otherwise timed() hands back a shared do-nothing context manager, and count() returns
+# right away, so the instrumented code costs next to nothing when it isn't being profiled.
+
+DEFAULT_PERCENTILES = (50, 95, 99)
+DEFAULT_NUM_SLOWEST = 10
+
+_active = None
+
+
+class Profiler:
+    """
+    Collects the time spent in each stage, per listing, and counters like requests made and bytes downloaded.
+    Safe to record from the scraper's worker threads
+    """
+
+    def __init__(self, num_slowest: int = DEFAULT_NUM_SLOWEST, pstats_file: str = None):
+        """
+        :param num_slowest: The number of slowest listings to report
+        :param pstats_file: If given, also run cProfile and dump its stats to this file when stopped.  cProfile only
+        profiles the thread it's started in, so scrapes on worker threads are left out of it
+        """
+        self.num_slowest = num_slowest
+        self.pstats_file = pstats_file
+
+        # Stage name to the list of seconds each time it ran
+        self.timings = dict()
+        # Counter name to count
+        self.counters = dict()
+        # Listing URL to the seconds spent on it per stage
+        self.listings = dict()
+
+        self._lock = threading.Lock()
+        self._cprofile = None
+        self._start = None
+        self._wall = None
+
+    def start(self):
+        """
+        Start recording.  Only one profiler records at a time
+        """
+        global _active
+        self._start = time.perf_counter()
+        if self.pstats_file:
+            self._cprofile = cProfile.Profile()
+            self._cprofile.enable()
+        _active = self
+
+    def stop(self):
+        global _active
+        if _active is self:
+            _active = None
+        if self._cprofile:
+            self._cprofile.disable()
+            self._cprofile.dump_stats(self.pstats_file)
+            self._cprofile = None
+        self._wall = time.perf_counter() - self._start
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def record(self, stage: str, seconds: float, key: str = None):
+        """
+        Record one run of a stage
+        :param stage: The stage
+        :param seconds: How long it took
+        :param key: The listing URL it was for, if it was for one
+        """
+        with self._lock:
+            self.timings.setdefault(stage, []).append(seconds)
+            if key is not None:
+                stages = self.listings.setdefault(key, {})
+                stages[stage] = stages.get(stage, 0.0) + seconds
+
+    def add(self, counter: str, n: int = 1):
+        with self._lock:
+            self.counters[counter] = self.counters.get(counter, 0) + n
+
+    def drain(self) -> dict:
+        """
+        Take everything recorded so far, leaving the profiler empty.  For sending what a worker process recorded to the
+        process that started it, to be merged into its profiler
+        :return: The timings, counters and listings, picklable
+        """
+        with self._lock:
+            recorded = {'timings': self.timings, 'counters': self.counters, 'listings': self.listings}
+            self.timings, self.counters, self.listings = dict(), dict(), dict()
+        return recorded
+
+    def merge(self, recorded: dict):
+        """
+        Add what another profiler recorded, ie. in a worker process
+        :param recorded: What its drain() returned
+        """
+        with self._lock:
+            for stage, seconds in recorded['timings'].items():
+                self.timings.setdefault(stage, []).extend(seconds)
+            for counter, n in recorded['counters'].items():
+                self.counters[counter] = self.counters.get(counter, 0) + n
+            for key, stages in recorded['listings'].items():
+                listing = self.listings.setdefault(key, {})
+                for stage, seconds in stages.items():
+                    listing[stage] = listing.get(stage, 0.0) + seconds
+
+    def report(self, percentiles: tuple = DEFAULT_PERCENTILES) -> dict:
+        """
+        :return: The totals and latency percentiles of each stage, the counters and the slowest listings
+        """
+        with self._lock:
+            stages = dict()
+            for stage, seconds in self.timings.items():
+                ordered = sorted(seconds)
+                summary = {
+                    'count': len(ordered),
+                    'total': sum(ordered),
+                    'mean': sum(ordered) / len(ordered),
+                }
+                for q in percentiles:
+                    summary[f'p{q}'] = percentile(ordered, q)
+                summary['max'] = ordered[-1]
+                stages[stage] = summary
+
+            slowest = heapq.nlargest(self.num_slowest, self.listings.items(), key=lambda kv: sum(kv[1].values()))
+            return {
+                'wall_seconds': self._wall if self._wall is not None else time.perf_counter() - self._start,
+                'stages': stages,
+                'counters': dict(self.counters),
+                'slowest_listings': [{'url': url, 'total': sum(s.values()), 'stages': dict(s)} for url, s in slowest],
+            }
+
+    def to_json(self) -> str:
+        return json.dumps(self.report(), indent=4)
+
+
+def percentile(ordered: list, q: float) -> float:
+    """
+    The nearest rank percentile
+    :param ordered: The values, sorted
+    :param q: The percentile, from 0 to 100
+    :return: The value
+    """
+    if not ordered:
+        return None
+    rank = int(round(q / 100 * (len(ordered) - 1)))
+    return ordered[rank]
+
+
+class _Timer:
+    __slots__ = ('profiler', 'stage', 'key', 'start')
+
+    def __init__(self, profiler: Profiler, stage: str, key: str):
+        self.profiler = profiler
+        self.stage = stage
+        self.key = key
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.profiler.record(self.stage, time.perf_counter() - self.start, self.key)
+        return False
+
+
+class _NoTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        return False
+
+
+_NO_TIMER = _NoTimer()
+
+
+def timed(stage: str, key: str = None):
+    """
+    Time a block of code as a stage, if profiling.  Use as `with timed('request', url):`
+    :param stage: The stage
+    :param key: The listing URL it's for, if it's for one
+    :return: A context manager
+    """
+    profiler = _active
+    if profiler is None:
+        return _NO_TIMER
+    return _Timer(profiler, stage, key)
+
+
+def count(counter: str, n: int = 1):
+    """
+    Add to a counter, if profiling
+    """
+    profiler = _active
+    if profiler is not None:
+        profiler.add(counter, n)
+
+
+def merge(recorded: dict):
+    """
+    Add what a profiler in a worker process recorded to the active profiler, if profiling
+    :param recorded: What the worker's Profiler.drain() returned
+    """
+    profiler = _active
+    if profiler is not None:
+        profiler.merge(recorded)
+
+
+def is_profiling() -> bool:
+    """
+    For skipping work that's only needed to count something, like measuring the size of a response
+    """
+    return _active is not None
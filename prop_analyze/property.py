@@ -1,6 +1,9 @@
 import json
+from array import array
 from enum import Enum
 
+from prop_analyze.utils import slots_to_dict
+
 
 class Utilities(Enum):
     WATER = 1
@@ -14,22 +17,138 @@ class Utilities(Enum):
         return [u for u in Utilities]
 
 
+# Utilities are packed into one small int per unit, UTILITY_BITS bits per utility in the order they were listed.
+# A unit can have at most one of each utility, so 5 x 3 bits always fits in an unsigned short.
+UTILITY_BITS = 3
+UTILITY_MASK = (1 << UTILITY_BITS) - 1
+
+
+def pack_utilities(utilities: [Utilities]) -> int:
+    code = 0
+    for i, u in enumerate(utilities):
+        code |= u.value << (i * UTILITY_BITS)
+    return code
+
+
+def unpack_utilities(code: int) -> [Utilities]:
+    utilities = []
+    while code:
+        utilities.append(Utilities(code & UTILITY_MASK))
+        code >>= UTILITY_BITS
+    return utilities
+
+
 class Property:
-    url: str = None
-    street_address: str = None
-    city: str = None
-    state: str = None
-    price: float = 0.0
-    num_units: int = 0
-    total_rent: float = 0.0
-    annual_taxes: float = 0.0
-    tax_year: str = None
-    utilities_paid_by_unit: [[Utilities]] = None
+    # Properties are held by the tens of thousands when ranking, so they're slotted instead of dict backed.
+    # The slots are in the order the scraper sets them, which is the order to_json outputs them in.
+    __slots__ = (
+        'url',
+        'property_id',
+        'listing_id',
+        'street_address',
+        'city',
+        'state',
+        'price',
+        'num_units',
+        'total_rent',
+        'tax_year',
+        'annual_taxes',
+        '_utilities',
+    )
+
+    url: str
+    property_id: str
+    listing_id: str
+    street_address: str
+    city: str
+    state: str
+    price: float
+    num_units: int
+    total_rent: float
+    tax_year: str
+    annual_taxes: float
+
+    # The value of each field until it's set
+    _DEFAULTS = {
+        'url': None,
+        'property_id': None,
+        'listing_id': None,
+        'street_address': None,
+        'city': None,
+        'state': None,
+        'price': 0.0,
+        'num_units': 0,
+        'total_rent': 0.0,
+        'tax_year': None,
+        'annual_taxes': 0.0,
+    }
+
+    def __getattr__(self, k: str):
+        # Only called for slots that haven't been set
+        try:
+            return Property._DEFAULTS[k]
+        except KeyError:
+            raise AttributeError(f"'Property' object has no attribute '{k}'") from None
+
+    def __getstate__(self) -> dict:
+        # Only pickle the slots that have been set, not their defaults
+        return slots_to_dict(self)
+
+    def __setstate__(self, state: dict):
+        for k, v in state.items():
+            setattr(self, k, v)
+
+    @property
+    def utilities_paid_by_unit(self) -> [[Utilities]]:
+        """
+        The utilities paid by the tenant of each unit.  This is a copy, so set it instead of changing it in place
+        """
+        codes = getattr(self, '_utilities', None)
+        if codes is None:
+            return None
+        return [unpack_utilities(code) for code in codes]
+
+    @utilities_paid_by_unit.setter
+    def utilities_paid_by_unit(self, utilities_paid_by_unit: [[Utilities]]):
+        if utilities_paid_by_unit is None:
+            self._utilities = None
+        else:
+            self._utilities = array('H', (pack_utilities(unit) for unit in utilities_paid_by_unit))
+
+    @property
+    def utility_codes(self) -> tuple:
+        """
+        The utilities paid by the tenant of each unit, packed into one int per unit by pack_utilities.  Quicker than
+        utilities_paid_by_unit when they're only compared or looked up, and hashable
+        """
+        codes = getattr(self, '_utilities', None)
+        return tuple(codes) if codes is not None else None
+
+    def utility_counts(self) -> [int]:
+        """
+        Count the units that have each utility in their utilities paid, without unpacking them
+        :return: The counts, in the order of Utilities
+        """
+        counts = [0] * len(Utilities)
+        for code in getattr(self, '_utilities', None) or ():
+            while code:
+                counts[(code & UTILITY_MASK) - 1] += 1
+                code >>= UTILITY_BITS
+        return counts
 
     @property
     def display_name(self) -> str:
         return f'{self.street_address}, {self.city}, {self.state}'
 
-    def to_json(self) -> str:
-        return json.dumps(self, indent=4, default=lambda o: o.name if isinstance(o, Enum) else o.__dict__)
+    def to_dict(self) -> dict:
+        """
+        :return: The fields that have been set, like __dict__ would be
+        """
+        d = slots_to_dict(self)
+        if '_utilities' in d:
+            d['utilities_paid_by_unit'] = self.utilities_paid_by_unit
+            del d['_utilities']
+        return d
 
+    def to_json(self) -> str:
+        return json.dumps(self, indent=4, default=lambda o: o.name if isinstance(o, Enum) else o.to_dict())
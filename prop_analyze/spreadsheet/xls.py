@@ -1,101 +1,242 @@
-from openpyxl import load_workbook
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from openpyxl import load_workbook, Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font
+from openpyxl.utils import get_column_letter
 from prop_analyze.property import Property
 from prop_analyze.analysis.parameters import get_variables_for_property
+from prop_analyze.analysis.result import AnalysisResult
 from prop_analyze.utils import log
 import os
+import pickle
+import re
 
+SPREADSHEET_DIR = os.path.dirname(os.path.realpath(__file__))
+TEMPLATE_FILE = f'{SPREADSHEET_DIR}/analysis_template_v1.xlsx'
 
-def output_to_xls(prop: Property) -> str:
+# The characters Excel doesn't allow in a sheet name, and how long one can be
+SHEET_NAME_INVALID_RE = re.compile(r'[\[\]:*?/\\]')
+SHEET_NAME_MAX_LEN = 31
 
-    path = os.path.dirname(os.path.realpath(__file__))
-    infile = f'{path}/analysis_template_v1.xlsx'
-    outfile = f'{path}/{prop.display_name}.xlsx'
+# The number formats the template uses
+CURRENCY_FORMAT = '"$"#,##0.00'
+PERCENT_FORMAT = '0.00%'
+
+SUMMARY_HEADERS = ('Rank', 'Property', 'Sheet', 'Number Of Units', 'Asking Price', 'Cash Flow Per Unit', 'COCR',
+                   'Redfin Link')
 
-    # Get the variables / parameters for this property
-    variables = get_variables_for_property(prop)
 
+def _cell_values(prop: Property, variables: dict) -> dict:
+    """
+    Map the property and its variables to the template's input cells
+    :return: dict of cell coordinate to value
+    """
     price = prop.price
-    rent = prop.total_rent
-    taxes = prop.annual_taxes
-    num_units = prop.num_units
-    v_down_payment = variables['down_payment']
-    v_closing_costs = variables['closing_costs']
-    v_renovation = variables['renovation_budget']
-    v_loan_points = variables['loan_points']
-    v_other_income = variables['other_income']
-    v_interest_rate = variables['interest_rate']
-    v_loan_years = variables['loan_years']
-    v_electricity = variables['electricity_expense']
-    v_gas = variables['gas_expense']
-    v_water = variables['water_expense']
-    v_sewer = variables['sewer_expense']
-    v_garbage = variables['garbage_expense']
-    v_hoa = variables['hoa_expense']
-    v_insurance = variables['insurance_expense']
-    v_other_expenses = variables['other_expense']
-    v_vacancy = variables['vacancy']
-    v_repairs = variables['repairs']
-    v_capex = variables['capex']
-    v_prop_mgmt = variables['prop_mgmt']
-
-    # Open the template
-    wb = load_workbook(filename=infile)
-    sheet = wb.worksheets[0]
+    cells = dict()
 
     # Asking Price
-    sheet['B1'] = price
+    cells['B1'] = price
     # Closing Costs
-    sheet['B2'] = v_closing_costs
+    cells['B2'] = variables['closing_costs']
     # Renovation Budget
-    sheet['B3'] = v_renovation
+    cells['B3'] = variables['renovation_budget']
     # Down Payment
-    sheet['B5'] = v_down_payment
+    cells['B5'] = variables['down_payment']
     # Loan Points
-    sheet['B7'] = v_loan_points
+    cells['B7'] = variables['loan_points']
     # Loan Interest
-    sheet['B8'] = v_interest_rate
+    cells['B8'] = variables['interest_rate']
     # Loan Years
-    sheet['B9'] = v_loan_years
+    cells['B9'] = variables['loan_years']
     # Number of Units
-    sheet['F1'] = num_units
+    cells['F1'] = prop.num_units
     # Gross Rent
-    sheet['F2'] = rent
+    cells['F2'] = prop.total_rent
     # Other Income
-    sheet['F3'] = v_other_income
+    cells['F3'] = variables['other_income']
     # Electricity
-    sheet['F4'] = v_electricity
+    cells['F4'] = variables['electricity_expense']
     # Gas
-    sheet['F5'] = v_gas
+    cells['F5'] = variables['gas_expense']
     # Water
-    sheet['F6'] = v_water
+    cells['F6'] = variables['water_expense']
     # Sewer
-    sheet['F7'] = v_sewer
+    cells['F7'] = variables['sewer_expense']
     # Garbage
-    sheet['F8'] = v_garbage
+    cells['F8'] = variables['garbage_expense']
     # HOA
-    sheet['F9'] = v_hoa
+    cells['F9'] = variables['hoa_expense']
     # Insurance
-    sheet['F10'] = v_insurance
+    cells['F10'] = variables['insurance_expense']
     # Taxes
-    sheet['F11'] = taxes
+    cells['F11'] = prop.annual_taxes
     # Other Expenses
-    sheet['F12'] = v_other_expenses
+    cells['F12'] = variables['other_expense']
     # Vacancy
-    sheet['F14'] = v_vacancy
+    cells['F14'] = variables['vacancy']
     # Repairs and Maintenance
-    sheet['F15'] = v_repairs
+    cells['F15'] = variables['repairs']
     # Capex
-    sheet['F16'] = v_capex
+    cells['F16'] = variables['capex']
     # Property Management
-    sheet['F17'] = v_prop_mgmt
+    cells['F17'] = variables['prop_mgmt']
     # Experiment Max Offer
-    sheet['I13'] = price * 0.9  # 90%
+    cells['I13'] = price * 0.9  # 90%
     # Redfin URL
-    sheet['A22'] = 'Redfin Link'
+    cells['A22'] = 'Redfin Link'
+
+    return cells
+
+
+def _fill_sheet(sheet, prop: Property, variables: dict):
+    """
+    Fill in a copy of the template's sheet for a property
+    """
+    for coordinate, value in _cell_values(prop, variables).items():
+        sheet[coordinate] = value
     sheet['A22'].hyperlink = prop.url
 
+
+@lru_cache(maxsize=None)
+def _template_pickle() -> bytes:
+    # Unpickling the parsed template is several times faster than loading it with openpyxl again
+    return pickle.dumps(load_workbook(filename=TEMPLATE_FILE))
+
+
+def _clone_template():
+    """
+    :return: A new copy of the template workbook, without reading and parsing the template file again
+    """
+    return pickle.loads(_template_pickle())
+
+
+def _write_xls(prop: Property, out_dir: str, variables: dict = None) -> str:
+    outfile = f'{out_dir}/{prop.display_name}.xlsx'
+
+    # Get the variables / parameters for this property
+    if variables is None:
+        variables = get_variables_for_property(prop)
+
+    # Copy the template
+    wb = _clone_template()
+    _fill_sheet(wb.worksheets[0], prop, variables)
+
     # Write to file
     wb.save(filename=outfile)
+    return outfile
+
+
+def output_to_xls(prop: Property, variables: dict = None, out_dir: str = SPREADSHEET_DIR) -> str:
+    """
+    Fill in the analysis spreadsheet template for a property
+    :param prop: The property
+    :param variables: The property's variables, if they've already been collected (ie. by Analysis)
+    :param out_dir: The directory to write the spreadsheet to
+    :return: The spreadsheet's file name
+    """
+    outfile = _write_xls(prop, out_dir, variables)
     log(f'Outputted to {outfile}')
+    return outfile
+
+
+def output_batch_to_xls(props: [Property], out_dir: str = SPREADSHEET_DIR, workers: int = 1) -> [str]:
+    """
+    Output a spreadsheet per property, reusing the parsed template for all of them
+    :param props: The properties
+    :param out_dir: The directory to write the spreadsheets to
+    :param workers: The number of processes to write them with
+    :return: The spreadsheet file names, in the order of props
+    """
+    if workers > 1 and len(props) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            outfiles = list(executor.map(_write_xls, props, [out_dir] * len(props)))
+    else:
+        outfiles = [_write_xls(p, out_dir) for p in props]
+
+    log(f'Outputted {len(outfiles)} spreadsheets to {out_dir}')
+    return outfiles
+
+
+@lru_cache(maxsize=None)
+def _template_layout() -> (list, dict):
+    """
+    Read the template's cells once, for writing copies of it in write-only mode
+    :return: The rows of (value, number format, bold) per cell, and the column widths
+    """
+    sheet = load_workbook(filename=TEMPLATE_FILE).worksheets[0]
+    rows = [[(cell.value, cell.number_format, bool(cell.font and cell.font.b)) for cell in row]
+            for row in sheet.iter_rows()]
+    widths = dict((k, d.width) for k, d in sheet.column_dimensions.items() if d.width)
+    return rows, widths
+
+
+def _sheet_name(prop: Property, rank: int) -> str:
+    """
+    A valid sheet name for a property.  The rank keeps them unique
+    """
+    name = f'{rank}. ' + SHEET_NAME_INVALID_RE.sub('', prop.street_address or prop.display_name)
+    return name[:SHEET_NAME_MAX_LEN].rstrip()
+
+
+def _formatted(sheet, value, number_format: str) -> WriteOnlyCell:
+    cell = WriteOnlyCell(sheet, value=value)
+    cell.number_format = number_format
+    return cell
+
+
+def _write_property_sheet(wb: Workbook, name: str, prop: Property, variables: dict):
+    rows, widths = _template_layout()
+    cells = _cell_values(prop, variables)
+
+    sheet = wb.create_sheet(name)
+    for col, width in widths.items():
+        sheet.column_dimensions[col].width = width
+
+    for r, row in enumerate(rows):
+        out = []
+        for c, (value, number_format, bold) in enumerate(row):
+            coordinate = f'{get_column_letter(c + 1)}{r + 1}'
+            value = cells.get(coordinate, value)
+            if value is None:
+                out.append(None)
+                continue
+
+            cell = WriteOnlyCell(sheet, value=value)
+            cell.number_format = number_format
+            if bold:
+                cell.font = Font(b=True)
+            if coordinate == 'A22':
+                cell.hyperlink = prop.url
+            out.append(cell)
+        sheet.append(out)
+
+
+def output_workbook_to_xls(results: [AnalysisResult], outfile: str) -> str:
+    """
+    Output one workbook with a summary sheet and a sheet per property, streamed in write-only mode
+    :param results: The analyses of the properties, best first
+    :param outfile: The file to write
+    :return: outfile
+    """
+    wb = Workbook(write_only=True)
+    names = [_sheet_name(res.property, i + 1) for i, res in enumerate(results)]
+
+    summary = wb.create_sheet('Summary')
+    summary.append(list(SUMMARY_HEADERS))
+    for i, (res, name) in enumerate(zip(results, names)):
+        p = res.property
+        link = WriteOnlyCell(summary, value=p.url)
+        link.hyperlink = p.url
+        summary.append([i + 1, p.display_name, name, p.num_units,
+                        _formatted(summary, p.price, CURRENCY_FORMAT),
+                        _formatted(summary, res.cash_flow_per_unit, CURRENCY_FORMAT),
+                        _formatted(summary, res.cocr, PERCENT_FORMAT),
+                        link])
+
+    for res, name in zip(results, names):
+        _write_property_sheet(wb, name, res.property, get_variables_for_property(res.property))
 
+    wb.save(outfile)
+    log(f'Outputted {len(results)} properties to {outfile}')
     return outfile
@@ -0,0 +1,276 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+
+from prop_analyze.property import Property, Utilities
+from prop_analyze.analysis.analyze import RESULT_METRICS
+from prop_analyze.analysis.result import AnalysisResult
+
+DEFAULT_STORE_PATH = os.path.join(os.path.expanduser('~'), '.cache', 'prop_analyze', 'properties.db')
+
+# The number of properties written per transaction
+DEFAULT_BATCH_SIZE = 500
+
+PROPERTY_COLUMNS = (
+    'url',
+    'street_address',
+    'city',
+    'state',
+    'price',
+    'num_units',
+    'total_rent',
+    'annual_taxes',
+    'tax_year',
+)
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS properties (
+    property_id TEXT NOT NULL,
+    listing_id TEXT NOT NULL,
+    url TEXT,
+    street_address TEXT,
+    city TEXT,
+    state TEXT,
+    price REAL,
+    num_units INTEGER,
+    total_rent REAL,
+    annual_taxes REAL,
+    tax_year TEXT,
+    utilities_paid_by_unit TEXT,
+    raw TEXT,
+    {', '.join(f'{m} REAL' for m in RESULT_METRICS)},
+    scraped_at REAL NOT NULL,
+    PRIMARY KEY (property_id, listing_id)
+);
+CREATE INDEX IF NOT EXISTS properties_location ON properties (state, city);
+CREATE INDEX IF NOT EXISTS properties_num_units ON properties (num_units);
+CREATE INDEX IF NOT EXISTS properties_price ON properties (price);
+CREATE INDEX IF NOT EXISTS properties_scraped_at ON properties (scraped_at);
+CREATE TABLE IF NOT EXISTS watched_listings (
+    search_url TEXT NOT NULL,
+    property_id TEXT NOT NULL,
+    listing_id TEXT NOT NULL,
+    price REAL,
+    fingerprint TEXT,
+    PRIMARY KEY (search_url, property_id, listing_id)
+);
+"""
+
+# Every column, in the order the rows are written
+COLUMNS = ('property_id', 'listing_id') + PROPERTY_COLUMNS + ('utilities_paid_by_unit', 'raw') + RESULT_METRICS + \
+          ('scraped_at',)
+
+UPSERT = f"""
+INSERT INTO properties ({', '.join(COLUMNS)}) VALUES ({', '.join('?' for _ in COLUMNS)})
+ON CONFLICT (property_id, listing_id) DO UPDATE SET
+{', '.join(f'{c} = excluded.{c}' for c in COLUMNS[2:])}
+"""
+
+
+class StoreFilter:
+    """
+    Which properties to get from the store.  Anything left as None isn't filtered on
+    """
+
+    state: str = None
+    city: str = None
+    min_units: int = None
+    max_units: int = None
+    min_price: float = None
+    max_price: float = None
+
+    # Only properties scraped at or after this time (seconds since the epoch)
+    scraped_since: float = None
+
+    # Only properties in the last snapshot of this watched search URL
+    search_url: str = None
+
+    def __init__(self, **kwargs):
+        for k, v in kwargs.items():
+            if not hasattr(self, k):
+                raise ValueError(f'Unknown filter {k}')
+            setattr(self, k, v)
+
+    def to_sql(self) -> (str, list):
+        """
+        :return: The WHERE clause (empty if there is nothing to filter on) and its parameters
+        """
+        clauses = []
+        params = []
+        for column, op, val in (('state', '=', self.state),
+                                ('city', '=', self.city),
+                                ('num_units', '>=', self.min_units),
+                                ('num_units', '<=', self.max_units),
+                                ('price', '>=', self.min_price),
+                                ('price', '<=', self.max_price),
+                                ('scraped_at', '>=', self.scraped_since)):
+            if val is not None:
+                clauses.append(f'{column} {op} ?')
+                params.append(val)
+        if self.search_url is not None:
+            clauses.append('(property_id, listing_id) IN '
+                           '(SELECT property_id, listing_id FROM watched_listings WHERE search_url = ?)')
+            params.append(self.search_url)
+        return (f'WHERE {" AND ".join(clauses)}' if clauses else ''), params
+
+
+class PropertyStore:
+    """
+    A local SQLite store of scraped properties and their analyses, keyed by their Redfin property and listing IDs.
+    Writes are buffered and upserted in batches, one transaction per batch, and can be made from any thread.
+    """
+
+    path: str
+    batch_size: int
+
+    def __init__(self, path: str = DEFAULT_STORE_PATH, batch_size: int = DEFAULT_BATCH_SIZE):
+        self.path = path
+        self.batch_size = batch_size
+        self._pending = []
+        self._lock = threading.Lock()
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript(SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        with self._lock:
+            self._write_pending()
+            return self._conn.execute('SELECT COUNT(*) FROM properties').fetchone()[0]
+
+    @staticmethod
+    def _to_row(res: AnalysisResult, raw: dict, scraped_at: float) -> tuple:
+        p = res.property
+        utilities = None
+        if p.utilities_paid_by_unit is not None:
+            utilities = json.dumps([[u.name for u in unit] for unit in p.utilities_paid_by_unit])
+        return (str(p.property_id), str(p.listing_id)) + \
+            tuple(getattr(p, c) for c in PROPERTY_COLUMNS) + \
+            (utilities, json.dumps(raw) if raw is not None else None) + \
+            tuple(getattr(res, m, None) for m in RESULT_METRICS) + \
+            (scraped_at,)
+
+    @staticmethod
+    def _from_row(row: sqlite3.Row) -> AnalysisResult:
+        p = Property()
+        p.property_id = row['property_id']
+        p.listing_id = row['listing_id']
+        for c in PROPERTY_COLUMNS:
+            setattr(p, c, row[c])
+        if row['utilities_paid_by_unit'] is not None:
+            p.utilities_paid_by_unit = [[Utilities[u] for u in unit]
+                                        for unit in json.loads(row['utilities_paid_by_unit'])]
+
+        res = AnalysisResult()
+        res.property = p
+        for m in RESULT_METRICS:
+            setattr(res, m, row[m])
+        return res
+
+    def add(self, res: AnalysisResult, raw: dict = None, scraped_at: float = None):
+        """
+        Add (or replace) a property and its analysis.  It's written with the next batch
+        :param res: The analysis, with its property
+        :param raw: The raw Redfin fields the property was built from, if there are any
+        :param scraped_at: When the property was scraped.  Defaults to now
+        """
+        p = res.property
+        if p.property_id is None or p.listing_id is None:
+            raise ValueError(f'{p.url} can not be stored without its Redfin property and listing IDs')
+
+        row = self._to_row(res, raw, scraped_at if scraped_at is not None else time.time())
+        with self._lock:
+            self._pending.append(row)
+            if len(self._pending) >= self.batch_size:
+                self._write_pending()
+
+    def _write_pending(self):
+        # Must hold the lock
+        if not self._pending:
+            return
+        with self._conn:
+            self._conn.executemany(UPSERT, self._pending)
+        self._pending = []
+
+    def flush(self):
+        """
+        Write everything that has been added
+        """
+        with self._lock:
+            self._write_pending()
+
+    def close(self):
+        with self._lock:
+            self._write_pending()
+            self._conn.close()
+
+    def query(self, store_filter: StoreFilter = None, order_by: str = 'cash_flow_per_unit', limit: int = None) \
+            -> [AnalysisResult]:
+        """
+        Get the best of the stored properties, with the filtering and ranking done by SQLite
+        :param store_filter: Which properties to get.  Defaults to all of them
+        :param order_by: The metric to rank by, best (highest) first
+        :param limit: The max number of properties to get
+        :return: The analyses, with their properties
+        """
+        if order_by not in RESULT_METRICS:
+            raise ValueError(f'Can not rank by {order_by}.  Must be one of {", ".join(RESULT_METRICS)}')
+
+        where, params = (store_filter or StoreFilter()).to_sql()
+        sql = f'SELECT * FROM properties {where} ORDER BY {order_by} DESC, scraped_at ASC'
+        if limit is not None:
+            sql += ' LIMIT ?'
+            params.append(limit)
+
+        with self._lock:
+            self._write_pending()
+            cur = self._conn.cursor()
+            cur.row_factory = sqlite3.Row
+            return [self._from_row(row) for row in cur.execute(sql, params)]
+
+    def get_raw(self, property_id: str, listing_id: str) -> dict:
+        """
+        Get the raw Redfin fields a stored property was built from
+        :return: The raw fields, or None if the property isn't stored or didn't have any
+        """
+        with self._lock:
+            self._write_pending()
+            row = self._conn.execute('SELECT raw FROM properties WHERE property_id = ? AND listing_id = ?',
+                                     (str(property_id), str(listing_id))).fetchone()
+        return json.loads(row[0]) if row and row[0] is not None else None
+
+    def get_snapshot(self, search_url: str) -> dict:
+        """
+        Get the last snapshot saved for a watched search
+        :param search_url: The search URL
+        :return: dict of (property ID, listing ID) to (price, fingerprint).  Empty if the search was never watched
+        """
+        with self._lock:
+            rows = self._conn.execute('SELECT property_id, listing_id, price, fingerprint FROM watched_listings '
+                                      'WHERE search_url = ?', (search_url,)).fetchall()
+        return dict(((pid, lid), (price, fingerprint)) for pid, lid, price, fingerprint in rows)
+
+    def save_snapshot(self, search_url: str, snapshot: dict):
+        """
+        Replace the snapshot of a watched search
+        :param search_url: The search URL
+        :param snapshot: dict of (property ID, listing ID) to (price, fingerprint), like get_snapshot
+        """
+        with self._lock:
+            self._write_pending()
+            with self._conn:
+                self._conn.execute('DELETE FROM watched_listings WHERE search_url = ?', (search_url,))
+                self._conn.executemany('INSERT INTO watched_listings VALUES (?, ?, ?, ?, ?)',
+                                       ((search_url, pid, lid, price, fingerprint)
+                                        for (pid, lid), (price, fingerprint) in snapshot.items()))
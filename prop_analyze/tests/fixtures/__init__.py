@@ -0,0 +1,13 @@
+import os
+
+FIXTURES_DIR = os.path.dirname(os.path.realpath(__file__))
+
+
+def load_fixture(name: str) -> str:
+    """
+    Read a recorded (and anonymized) Redfin response
+    :param name: The fixture's file name
+    :return: The response text
+    """
+    with open(os.path.join(FIXTURES_DIR, name)) as f:
+        return f.read()
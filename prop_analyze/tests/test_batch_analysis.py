@@ -0,0 +1,46 @@
+import random
+import unittest
+from prop_analyze.property import Property, Utilities
+from prop_analyze.analysis.analyze import Analysis, RESULT_METRICS
+from prop_analyze.analysis.batch import PropertyBatch, BatchAnalysis
+
+
+def create_random_property(i: int, rnd: random.Random) -> Property:
+    p = Property()
+    p.url = p.street_address = p.city = p.state = str(i)
+    p.num_units = rnd.randint(1, 24)
+    p.price = float(rnd.randint(50, 2000) * 1000) + rnd.random()
+    p.total_rent = rnd.randint(500, 1500) * p.num_units + rnd.random()
+    p.annual_taxes = rnd.uniform(1000, 40000)
+    p.utilities_paid_by_unit = [rnd.sample(Utilities.all(), rnd.randint(0, 5)) for _ in range(p.num_units)]
+    return p
+
+
+class TestBatchAnalysis(unittest.TestCase):
+
+    def test_batch_matches_scalar(self):
+        rnd = random.Random(42)
+        props = [create_random_property(i, rnd) for i in range(500)]
+
+        expected = [Analysis(p).anaylze() for p in props]
+        actual = BatchAnalysis(PropertyBatch.from_properties(props)).analyze().to_results()
+
+        for e, a in zip(expected, actual):
+            self.assertIs(e.property, a.property)
+            for k in RESULT_METRICS:
+                self.assertEqual(getattr(e, k), getattr(a, k), k)
+            self.assertEqual(e.to_json(), a.to_json())
+
+    def test_rank_matches_sort(self):
+        rnd = random.Random(7)
+        props = [create_random_property(i, rnd) for i in range(200)]
+        # Duplicate some properties to make ties
+        props += props[:50]
+
+        expected = [Analysis(p).anaylze() for p in props]
+        expected.sort(key=lambda r: r.cash_flow_per_unit, reverse=True)
+
+        res = BatchAnalysis(PropertyBatch.from_properties(props)).analyze()
+        actual = res.to_results(res.rank('cash_flow_per_unit'))
+
+        self.assertEqual([r.property for r in expected], [r.property for r in actual])
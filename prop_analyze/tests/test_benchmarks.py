@@ -0,0 +1,36 @@
+import os
+import tempfile
+import unittest
+from prop_analyze.benchmarks.stages import STAGES, run_suite, save_baseline, load_baseline, find_regressions
+
+
+class TestBenchmarkStages(unittest.TestCase):
+
+    def test_run_suite(self):
+        timed = []
+        results = run_suite([1, 2], on_result=lambda name, size, seconds: timed.append((name, size)))
+
+        self.assertEqual(list(results), [s.name for s in STAGES])
+        self.assertEqual(timed, [(s.name, size) for s in STAGES for size in (1, 2)])
+        for timings in results.values():
+            self.assertEqual(list(timings), ['1', '2'])
+            self.assertTrue(all(seconds > 0 for seconds in timings.values()))
+
+    def test_max_size(self):
+        # Sizes past a stage's max size are skipped rather than timed
+        xls = [s for s in STAGES if s.name == 'xls']
+        results = run_suite([1, xls[0].max_size + 1], xls)
+        self.assertEqual(list(results['xls']), ['1'])
+
+    def test_baseline(self):
+        baseline = {'analyze': {'1': 1e-5, '10': 1e-5}, 'rank': {'1': 1e-6}}
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'baseline.json')
+            self.assertIsNone(load_baseline(path))
+            save_baseline(baseline, path)
+            self.assertEqual(load_baseline(path), baseline)
+
+        # Only slower than the threshold is a regression, and only for the stages and sizes in the baseline
+        results = {'analyze': {'1': 1.1e-5, '10': 1.5e-5, '100': 1.0}, 'rank': {'1': 0.5e-6}, 'xls': {'1': 1.0}}
+        self.assertEqual(find_regressions(baseline, results, 0.2), [('analyze', 10, 1e-5, 1.5e-5)])
+        self.assertEqual(find_regressions(baseline, results, 0.6), [])
@@ -0,0 +1,56 @@
+import tempfile
+import unittest
+from prop_analyze.parsers.cache import ResponseCache, CachingTransport, OfflineCacheMiss, ENDPOINT_PAGE
+from prop_analyze.parsers.transport import StaticTransport
+
+URL = 'https://www.redfin.com/IL/Chicago/123-Main-St-60620/home/1'
+
+
+class TestResponseCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache = ResponseCache(self.tmp.name)
+        self.upstream = StaticTransport()
+        self.upstream.add(URL, '<html>page</html>', headers={'ETag': '"v1"'})
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_serves_fresh_responses_from_cache(self):
+        transport = CachingTransport(self.upstream, self.cache)
+
+        self.assertEqual(transport.get(URL).text, '<html>page</html>')
+        self.assertEqual(transport.get(URL).text, '<html>page</html>')
+        self.assertEqual(len(self.upstream.requested_urls), 1)
+
+        # A new cache over the same directory still has the response
+        offline = CachingTransport(StaticTransport(), ResponseCache(self.tmp.name), offline=True)
+        self.assertEqual(offline.get(URL).text, '<html>page</html>')
+
+    def test_revalidates_stale_responses(self):
+        transport = CachingTransport(self.upstream, self.cache, ttls={ENDPOINT_PAGE: 0})
+        transport.get(URL)
+
+        # Redfin says it has not changed
+        self.upstream.add(URL, '', status_code=304)
+        self.assertEqual(transport.get(URL).text, '<html>page</html>')
+        self.assertEqual(len(self.upstream.requested_urls), 2)
+
+    def test_offline_miss(self):
+        transport = CachingTransport(self.upstream, self.cache, offline=True)
+        with self.assertRaises(OfflineCacheMiss):
+            transport.get(URL)
+        self.assertEqual(self.upstream.requested_urls, [])
+
+    def test_eviction(self):
+        cache = ResponseCache(self.tmp.name, max_bytes=2000)
+        transport = CachingTransport(self.upstream, cache)
+        for i in range(20):
+            url = f'{URL}{i}'
+            self.upstream.add(url, f'{i}' * 1000)
+            transport.get(url)
+
+        self.assertLessEqual(cache.size, 2000)
+        self.assertIsNotNone(cache.get(f'{URL}19'))
+        self.assertIsNone(cache.get(f'{URL}0'))
@@ -0,0 +1,119 @@
+import csv
+import io
+import json
+import os
+import random
+import tempfile
+import unittest
+from prop_analyze.analysis.analyze import Analysis, RESULT_METRICS
+from prop_analyze.export import EXPORT_COLUMNS, NDJSONExporter, CSVExporter, ArrowExporter, export_format, \
+    open_exporter
+from prop_analyze.property import Property
+from prop_analyze.tests.test_batch_analysis import create_random_property
+
+
+def _analyses(n: int, seed: int = 0):
+    rnd = random.Random(seed)
+    analyses = []
+    for i in range(n):
+        p = create_random_property(i, rnd)
+        p.property_id = str(1000 + i)
+        p.city = 'Chicago'
+        p.state = 'IL'
+        analyses.append(Analysis(p).anaylze())
+    return analyses
+
+
+class TestExport(unittest.TestCase):
+
+    def test_ndjson(self):
+        analyses = _analyses(5)
+        out = io.StringIO()
+        with NDJSONExporter(out) as exporter:
+            for res in analyses:
+                exporter.write(res)
+        self.assertEqual(exporter.num_rows, 5)
+
+        lines = out.getvalue().splitlines()
+        self.assertEqual(len(lines), 5)
+        for line, res in zip(lines, analyses):
+            row = json.loads(line)
+            self.assertEqual(tuple(row), EXPORT_COLUMNS)
+            self.assertEqual(row['property_id'], res.property.property_id)
+            self.assertEqual(row['price'], res.property.price)
+            self.assertEqual(row['listing_id'], None)
+            self.assertEqual(row['utilities_paid_by_unit'],
+                             json.loads(res.property.to_json())['utilities_paid_by_unit'])
+            for k in RESULT_METRICS:
+                self.assertEqual(row[k], getattr(res, k), k)
+
+    def test_csv(self):
+        analyses = _analyses(5)
+        out = io.StringIO(newline='')
+        with CSVExporter(out) as exporter:
+            for res in analyses:
+                exporter.write(res)
+
+        rows = list(csv.reader(io.StringIO(out.getvalue())))
+        self.assertEqual(tuple(rows[0]), EXPORT_COLUMNS)
+        self.assertEqual(len(rows), 6)
+        for row, res in zip(rows[1:], analyses):
+            row = dict(zip(rows[0], row))
+            self.assertEqual(float(row['cash_flow_per_unit']), res.cash_flow_per_unit)
+            self.assertEqual(row['listing_id'], '')
+            units = row['utilities_paid_by_unit'].split(';')
+            self.assertEqual(len(units), len(res.property.utilities_paid_by_unit))
+            for unit, utilities in zip(units, res.property.utilities_paid_by_unit):
+                self.assertEqual(unit, '+'.join(u.name for u in utilities))
+
+    def test_property_without_utilities(self):
+        p = Property()
+        p.price = 100000.0
+        p.num_units = 2
+        p.total_rent = 2000.0
+        p.annual_taxes = 2000.0
+        res = Analysis(p).anaylze()
+        out = io.StringIO()
+        NDJSONExporter(out).write(res)
+        row = json.loads(out.getvalue())
+        self.assertIsNone(row['utilities_paid_by_unit'])
+        self.assertIsNone(row['url'])
+
+    def test_export_format(self):
+        self.assertEqual(export_format('-'), 'ndjson')
+        self.assertEqual(export_format('out.jsonl'), 'ndjson')
+        self.assertEqual(export_format('OUT.CSV'), 'csv')
+        self.assertEqual(export_format('out.arrow'), 'arrow')
+        with self.assertRaises(ValueError):
+            export_format('out.txt')
+
+    def test_open_exporter(self):
+        analyses = _analyses(3)
+        with tempfile.TemporaryDirectory() as tmp:
+            for name in ('out.ndjson', 'out.csv'):
+                path = os.path.join(tmp, name)
+                with open_exporter(path) as exporter:
+                    for res in analyses:
+                        exporter.write(res)
+                with open(path, newline='') as f:
+                    lines = f.read().splitlines()
+                self.assertEqual(len(lines), 3 + name.endswith('.csv'), name)
+
+    def test_arrow(self):
+        try:
+            import pyarrow.ipc
+        except ImportError:
+            self.skipTest('pyarrow is not installed')
+
+        analyses = _analyses(5)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'out.arrow')
+            with ArrowExporter(open(path, 'wb'), close_out=True, batch_size=2) as exporter:
+                for res in analyses:
+                    exporter.write(res)
+            with pyarrow.ipc.open_file(path) as reader:
+                table = reader.read_all()
+
+        self.assertEqual(tuple(table.column_names), EXPORT_COLUMNS)
+        self.assertEqual(table.num_rows, 5)
+        self.assertEqual(table.column('cocr').to_pylist(), [res.cocr for res in analyses])
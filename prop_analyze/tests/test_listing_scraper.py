@@ -0,0 +1,38 @@
+import random
+import time
+import unittest
+from unittest import mock
+from prop_analyze.parsers.redfin import RFListingScraper, RFScrapeResult
+from prop_analyze.parsers.transport import StaticTransport
+from prop_analyze.property import Property
+
+
+class TestListingScraperWorkers(unittest.TestCase):
+
+    @staticmethod
+    def _fake_scrape(scraper: RFListingScraper, url: str, home: dict = None) -> RFScrapeResult:
+        # Finish in a random order so the pool can't return results in order by accident
+        time.sleep(random.random() / 100)
+        res = RFScrapeResult()
+        res.property = Property()
+        res.property.url = url
+        return res
+
+    def _scrape(self, urls: [str], workers: int) -> [RFScrapeResult]:
+        scraper = RFListingScraper('https://www.redfin.com/city/1/IL/Chicago', workers=workers,
+                                   transport=StaticTransport())
+        scraper.property_urls = list(urls)
+        scraper.homes = [None] * len(urls)
+        scraper.results = []
+        with mock.patch.object(RFListingScraper, '_scrape_property', self._fake_scrape):
+            scraper._parse_properties()
+        return scraper.results
+
+    def test_concurrent_results_match_serial(self):
+        urls = [f'https://www.redfin.com/IL/Chicago/{i}/home/{i}' for i in range(50)]
+
+        serial = self._scrape(urls, workers=1)
+        concurrent = self._scrape(urls, workers=8)
+
+        self.assertEqual([r.property.url for r in serial], urls)
+        self.assertEqual([r.property.url for r in concurrent], urls)
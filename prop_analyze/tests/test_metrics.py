@@ -0,0 +1,147 @@
+import io
+import logging
+import os
+import tempfile
+import unittest
+import urllib.request
+from prop_analyze import metrics
+from prop_analyze.metrics import Metrics, MetricsFileWriter, MetricsServer, message_type
+from prop_analyze.parsers.cache import ResponseCache, CachingTransport
+from prop_analyze.parsers.redfin import RFListingScraper, RF_BASE_URL
+from prop_analyze.parsers.transport import StaticTransport, TransportResponse
+from prop_analyze.analysis.ranking import TopK
+from prop_analyze.pipeline import run_pipeline
+from prop_analyze.tests.test_pipeline import SyntheticListingTransport, SEARCH_URL
+from prop_analyze.utils import configure_logging, flush_logs, stop_logging, log
+
+
+class _ThrottledTransport(SyntheticListingTransport):
+    """
+    Throttles the below the fold data of every 5th property
+    """
+
+    def get(self, url: str, headers: dict = None) -> TransportResponse:
+        if '/belowTheFold?' in url and int(url.split('propertyId=')[1].split('&')[0]) % 5 == 0:
+            return TransportResponse(url, 429, '')
+        return super().get(url, headers)
+
+
+class TestMetrics(unittest.TestCase):
+
+    def test_pipeline(self):
+        scraper = RFListingScraper(SEARCH_URL, workers=4, transport=_ThrottledTransport(20))
+        with Metrics() as m:
+            run_pipeline(scraper, TopK(3))
+
+        self.assertEqual(m.total(metrics.LISTINGS), 20)
+        self.assertEqual(m.total(metrics.PROPERTIES_PARSED_TOTAL), 20)
+        self.assertEqual(m.total(metrics.PROPERTIES_ANALYZED_TOTAL), 16)
+        self.assertEqual(m.total(metrics.REQUESTS_IN_FLIGHT), 0)
+        self.assertEqual(m.total(metrics.REQUESTS_TOTAL, endpoint='details', status=200), 16)
+        self.assertEqual(m.total(metrics.REQUESTS_TOTAL, endpoint='details', status=429), 4)
+        self.assertEqual(m.total(metrics.REQUESTS_TOTAL), 22)
+
+        # Errors are grouped by type, not by the URL they were for
+        self.assertEqual(m.total(metrics.SCRAPE_ERRORS_TOTAL), 4)
+        self.assertEqual(m.total(metrics.SCRAPE_ERRORS_TOTAL, type='throttled'), 4)
+
+        text = m.render()
+        self.assertIn('# TYPE prop_analyze_requests_total counter\n', text)
+        self.assertIn('prop_analyze_requests_total{endpoint="details",status="429"} 4\n', text)
+        self.assertIn('prop_analyze_properties_parsed_total 20\n', text)
+        self.assertIn('prop_analyze_eta_seconds 0\n', text)
+        self.assertIn('prop_analyze_properties_parsed_per_second ', text)
+
+    def test_listings_add_up_across_searches(self):
+        transport = SyntheticListingTransport(20)
+        scraper = RFListingScraper(SEARCH_URL, workers=4, transport=transport)
+        with Metrics() as m:
+            self.assertTrue(scraper.load_homes())
+            homes = scraper.homes
+            list(scraper.iter_homes(homes[:5]))
+            list(scraper.iter_homes(homes[5:12]))
+
+        self.assertEqual(m.total(metrics.LISTINGS), 12)
+        self.assertEqual(m.total(metrics.PROPERTIES_PARSED_TOTAL), 12)
+        self.assertIn('prop_analyze_eta_seconds 0\n', m.render())
+
+    def test_message_type(self):
+        self.assertEqual(message_type('Could not find rent for Unit 3'), 'missing_rent')
+        self.assertEqual(message_type('Could not find rent for Unit 14'), 'missing_rent')
+        self.assertEqual(message_type(f'Received a 429 error code requesting Redfin URL {SEARCH_URL}'), 'throttled')
+        self.assertEqual(message_type(f'Received a 500 error code requesting Redfin URL {SEARCH_URL}'), 'http_error')
+        self.assertEqual(message_type('Unknown Tenant Pays value: Tenant Pays Internet'), 'unknown_tenant_pays')
+        self.assertEqual(message_type('3 tiles could not be searched, so some listings may be missing: ...'),
+                         'failed_tiles')
+        self.assertEqual(message_type('Something new'), 'other')
+
+    def test_cache_hit_ratio(self):
+        url = f'{RF_BASE_URL}/IL/Chicago/1-W-Example-St-60620/home/1'
+        upstream = StaticTransport()
+        upstream.add(url, '<html></html>')
+
+        with tempfile.TemporaryDirectory() as tmp:
+            transport = CachingTransport(upstream, ResponseCache(tmp))
+            with Metrics() as m:
+                for _ in range(4):
+                    transport.get(url)
+
+        self.assertEqual(m.total(metrics.CACHE_LOOKUPS_TOTAL, result='miss'), 1)
+        self.assertEqual(m.total(metrics.CACHE_LOOKUPS_TOTAL, result='hit'), 3)
+        self.assertIn('prop_analyze_cache_hit_ratio 0.75\n', m.render())
+
+    def test_nothing_recorded_when_off(self):
+        m = Metrics()
+        scraper = RFListingScraper(SEARCH_URL, transport=SyntheticListingTransport(5))
+        run_pipeline(scraper, TopK(3))
+
+        self.assertFalse(metrics.is_recording())
+        self.assertEqual(m.values, {})
+
+    def test_render(self):
+        m = Metrics()
+        m.add(metrics.SCRAPE_WARNINGS_TOTAL, 2, {'type': 'Could not "parse"'})
+        m.set(metrics.LISTINGS, 10)
+
+        lines = m.render().splitlines()
+        self.assertIn('prop_analyze_listings 10', lines)
+        self.assertIn('prop_analyze_scrape_warnings_total{type="Could not \\"parse\\""} 2', lines)
+        # Nothing has been requested, so there's no cache hit ratio or ETA
+        self.assertFalse([l for l in lines if 'cache_hit_ratio' in l or 'eta_seconds' in l])
+
+    def test_exporters(self):
+        m = Metrics()
+        m.set(metrics.LISTINGS, 3)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'prop_analyze.prom')
+            writer = MetricsFileWriter(m, path, interval=60)
+            writer.start()
+            writer.stop()
+            with open(path) as f:
+                self.assertIn('prop_analyze_listings 3\n', f.read())
+            self.assertEqual(os.listdir(tmp), ['prop_analyze.prom'])
+
+        server = MetricsServer(m, 0)
+        server.start()
+        try:
+            with urllib.request.urlopen(server.url) as r:
+                self.assertIn('prop_analyze_listings 3\n', r.read().decode('utf-8'))
+        finally:
+            server.stop()
+
+
+class TestLogging(unittest.TestCase):
+
+    def tearDown(self):
+        stop_logging()
+
+    def test_levels(self):
+        out = io.StringIO()
+        configure_logging('info', out)
+        log('parsed')
+        log('details', logging.DEBUG)
+        log('throttled', logging.WARNING)
+        flush_logs()
+
+        self.assertEqual(out.getvalue(), 'parsed\nthrottled\n')
@@ -0,0 +1,70 @@
+import random
+import struct
+import unittest
+from prop_analyze.property import Property
+from prop_analyze.analysis.parameters import all_params, get_variables_for_property, CompiledParameters
+from prop_analyze.tests.test_batch_analysis import create_random_property
+
+
+def _reference_variables(prop: Property, overrides: dict = None) -> dict:
+    """
+    get_variables_for_property as it was before the parameters were compiled
+    """
+    overrides = overrides or {}
+    variables = dict()
+    for p in all_params:
+        val = overrides.get(p.key, p.default_val)
+        if p.utility_type:
+            v = 0.0
+            for utilities_for_unit in prop.utilities_paid_by_unit:
+                if p.utility_type in utilities_for_unit:
+                    v += val
+        elif p.per_unit:
+            v = val * prop.num_units
+        else:
+            v = val
+        variables[p.key] = v
+    return variables
+
+
+def _bits(variables: dict) -> dict:
+    # Compare the exact bits of floats, so 0.1 + 0.2 and 0.3 don't count as the same
+    return dict((k, (type(v), struct.pack('<d', v) if isinstance(v, float) else v)) for k, v in variables.items())
+
+
+class TestCompiledParameters(unittest.TestCase):
+
+    def setUp(self):
+        rnd = random.Random(7)
+        self.props = [create_random_property(i, rnd) for i in range(300)]
+
+    def test_matches_reference(self):
+        for p in self.props:
+            variables = get_variables_for_property(p)
+            self.assertEqual(list(variables), list(_reference_variables(p)))
+            self.assertEqual(_bits(variables), _bits(_reference_variables(p)))
+
+    def test_overrides(self):
+        # Values that aren't exact in binary, where adding up per unit and multiplying disagree
+        overrides = {'electricity_expense': 27.3, 'water_expense': 0.1, 'insurance_expense': 512.7, 'vacancy': 0.09}
+        compiled = CompiledParameters(overrides=overrides)
+        overridden = CompiledParameters().with_overrides(overrides)
+
+        for p in self.props:
+            expected = _bits(_reference_variables(p, overrides))
+            self.assertEqual(_bits(compiled.variables_for(p)), expected)
+            self.assertEqual(_bits(overridden.variables_for(p)), expected)
+
+    def test_override_does_not_change_original(self):
+        compiled = CompiledParameters()
+        p = self.props[0]
+        before = _bits(compiled.variables_for(p))
+        compiled.with_overrides({'gas_expense': 99.9})
+
+        self.assertEqual(_bits(compiled.variables_for(p)), before)
+
+    def test_unknown_override(self):
+        with self.assertRaises(ValueError):
+            CompiledParameters(overrides={'not_a_param': 1.0})
+        with self.assertRaises(ValueError):
+            CompiledParameters().with_overrides({'not_a_param': 1.0})
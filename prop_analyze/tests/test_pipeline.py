@@ -0,0 +1,118 @@
+import os
+import json
+import tempfile
+import tracemalloc
+import unittest
+from prop_analyze.parsers.redfin import RFListingScraper, RF_BASE_URL
+from prop_analyze.parsers.transport import TransportResponse
+from prop_analyze.analysis.ranking import TopK
+from prop_analyze.pipeline import PipelineStats, analyze_results, scrape_listings, rank_analyses, run_pipeline
+from prop_analyze.store import PropertyStore
+from prop_analyze.tests.fixtures import load_fixture
+
+SEARCH_URL = f'{RF_BASE_URL}/city/29470/IL/Chicago/filter/property-type=multifamily'
+
+
+class SyntheticListingTransport:
+    """
+    Serves a search page with num_homes properties, and the same below the fold data for every one of them.
+    The requested URLs are only kept if record is set, so they don't count against the memory tests
+    """
+
+    def __init__(self, num_homes: int, record: bool = False):
+        gis_path = '/stingray/api/gis?al=1&num_homes=350&region_id=29470&v=8'
+        self.search_page = '<html><script>var x = {"url":"' + gis_path.replace('/', '\\u002F') + '"};</script></html>'
+        self.below_the_fold = load_fixture('below_the_fold.json')
+        self.requested_urls = [] if record else None
+
+        home = json.loads(load_fixture('gis_home.json'))
+        self.homes = []
+        for i in range(num_homes):
+            h = dict(home)
+            h['propertyId'] = 100000 + i
+            h['listingId'] = 200000 + i
+            h['price'] = {'value': 200000 + 1000 * (i % 97)}
+            h['url'] = f'/IL/Chicago/{i}-W-Example-St-60620/home/{100000 + i}'
+            self.homes.append(h)
+        self._gis = None
+
+    def get(self, url: str, headers: dict = None) -> TransportResponse:
+        if self.requested_urls is not None:
+            self.requested_urls.append(url)
+        if url == SEARCH_URL:
+            return TransportResponse(url, 200, self.search_page)
+        if '/stingray/api/gis?' in url:
+            if self._gis is None:
+                self._gis = '{}&&' + json.dumps({'payload': {'homes': self.homes}})
+            return TransportResponse(url, 200, self._gis)
+        if '/belowTheFold?' in url:
+            return TransportResponse(url, 200, self.below_the_fold)
+        return TransportResponse(url, 404, '')
+
+    def set_homes(self, homes: [dict]):
+        self.homes = homes
+        self._gis = None
+
+
+class TestPipeline(unittest.TestCase):
+
+    def test_ranks_every_property(self):
+        scraper = RFListingScraper(SEARCH_URL, workers=4, transport=SyntheticListingTransport(50))
+        stats = PipelineStats()
+        top = run_pipeline(scraper, TopK(5, key=lambda res: res.cash_flow_per_unit), stats)
+
+        self.assertEqual(stats.num_parsed, 50)
+        self.assertEqual(stats.num_analyzed, 50)
+        self.assertEqual(top.count, 50)
+        self.assertEqual(len(top.ranked()), 5)
+
+    def test_stores_every_analysis(self):
+        scraper = RFListingScraper(SEARCH_URL, workers=4, transport=SyntheticListingTransport(20))
+        with tempfile.TemporaryDirectory() as tmp, PropertyStore(os.path.join(tmp, 'properties.db')) as store:
+            run_pipeline(scraper, TopK(5, key=lambda res: res.cash_flow_per_unit), store=store)
+
+            self.assertEqual(len(store), 20)
+            self.assertEqual(store.get_raw('100000', '200000')['home']['propertyId'], 100000)
+
+    def test_stops_scraping_when_the_consumer_stops(self):
+        scraper = RFListingScraper(SEARCH_URL, workers=2, transport=SyntheticListingTransport(200))
+        stats = PipelineStats()
+        analyses = analyze_results(scrape_listings(scraper, stats), stats)
+        for _ in range(3):
+            next(analyses)
+        analyses.close()
+
+        self.assertEqual(stats.num_parsed, 3)
+
+    @staticmethod
+    def _peak_memory(num_homes: int) -> int:
+        """
+        The peak memory used while scraping, analyzing and ranking, on top of what the loaded listings take up
+        """
+        scraper = RFListingScraper(SEARCH_URL, workers=4, transport=SyntheticListingTransport(num_homes))
+        stats = PipelineStats()
+        top = TopK(10, key=lambda res: res.cash_flow_per_unit)
+
+        tracemalloc.start()
+        try:
+            analyses = analyze_results(scrape_listings(scraper, stats), stats)
+
+            # Pulling the first analysis loads the listings, which is the part that grows with the listing size
+            top.push(next(analyses))
+            tracemalloc.reset_peak()
+            baseline, _ = tracemalloc.get_traced_memory()
+
+            rank_analyses(analyses, top)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        assert stats.num_analyzed == num_homes
+        return peak - baseline
+
+    def test_memory_is_flat(self):
+        small = self._peak_memory(100)
+        large = self._peak_memory(1000)
+
+        # 10x the properties shouldn't need much more memory than what's left of the listings and the top k
+        self.assertLess(large, small * 1.5 + 256 * 1024)
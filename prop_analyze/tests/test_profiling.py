@@ -0,0 +1,69 @@
+import json
+import os
+import pstats
+import tempfile
+import unittest
+from prop_analyze import profiling
+from prop_analyze.profiling import Profiler, timed, count, percentile
+from prop_analyze.parsers.redfin import RFListingScraper
+from prop_analyze.analysis.ranking import TopK
+from prop_analyze.pipeline import run_pipeline
+from prop_analyze.tests.test_pipeline import SyntheticListingTransport, SEARCH_URL
+
+
+class TestProfiling(unittest.TestCase):
+
+    def test_profile_pipeline(self):
+        scraper = RFListingScraper(SEARCH_URL, workers=4, transport=SyntheticListingTransport(40))
+        with Profiler(num_slowest=5) as profiler:
+            run_pipeline(scraper, TopK(3))
+        report = json.loads(profiler.to_json())
+
+        stages = report['stages']
+        for stage in ('request', 'extra_data_parse', 'amenities', 'scrape', 'analysis', 'rank'):
+            self.assertIn(stage, stages)
+        self.assertEqual(stages['analysis']['count'], 40)
+        self.assertEqual(stages['scrape']['count'], 40)
+        for summary in stages.values():
+            self.assertLessEqual(summary['p50'], summary['p95'])
+            self.assertLessEqual(summary['p95'], summary['p99'])
+            self.assertLessEqual(summary['p99'], summary['max'])
+
+        # The search page, the gis search and the below the fold data of every property
+        self.assertEqual(report['counters']['requests'], 42)
+        self.assertGreater(report['counters']['response_bytes'], 0)
+
+        slowest = report['slowest_listings']
+        self.assertEqual(len(slowest), 5)
+        self.assertEqual([s['total'] for s in slowest], sorted((s['total'] for s in slowest), reverse=True))
+        self.assertEqual(set(slowest[0]['stages']), {'request', 'extra_data_parse', 'amenities', 'analysis'})
+
+    def test_nothing_recorded_when_off(self):
+        profiler = Profiler()
+        with profiler:
+            pass
+
+        # Timers outside of a profiler are the same do-nothing context manager, so they cost next to nothing
+        self.assertIs(timed('analysis'), timed('request', 'url'))
+        with timed('analysis'):
+            count('requests')
+        self.assertEqual(profiler.timings, {})
+        self.assertEqual(profiler.counters, {})
+        self.assertIsNone(profiling._active)
+
+    def test_pstats(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'profile.pstats')
+            with Profiler(pstats_file=path):
+                with timed('analysis'):
+                    sorted(range(1000))
+            stats = pstats.Stats(path)
+            self.assertTrue(any(func[2] == 'sorted' or 'sorted' in func[2] for func in stats.stats))
+
+    def test_percentile(self):
+        ordered = list(range(1, 101))
+        self.assertEqual(percentile(ordered, 50), 51)
+        self.assertEqual(percentile(ordered, 99), 99)
+        self.assertEqual(percentile(ordered, 100), 100)
+        self.assertEqual(percentile([3.0], 95), 3.0)
+        self.assertIsNone(percentile([], 50))
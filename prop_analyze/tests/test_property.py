@@ -0,0 +1,66 @@
+import json
+import pickle
+import unittest
+from prop_analyze.property import Property, Utilities, pack_utilities, unpack_utilities
+from prop_analyze.analysis.analyze import Analysis
+from prop_analyze.analysis.result import AnalysisResult
+
+
+class TestProperty(unittest.TestCase):
+
+    def _create_property(self) -> Property:
+        p = Property()
+        p.url = 'https://www.redfin.com/IL/Chicago/100-W-Example-St-60620/home/10000001'
+        p.street_address = '100 W Example St'
+        p.city = 'Chicago'
+        p.state = 'IL'
+        p.price = 325000.0
+        p.num_units = 3
+        p.total_rent = 3075.0
+        p.annual_taxes = 4821.37
+        p.utilities_paid_by_unit = [[Utilities.GAS, Utilities.ELECTRIC], Utilities.all(), []]
+        return p
+
+    def test_utilities_keep_their_order(self):
+        for utilities in ([], [Utilities.GARBAGE], [Utilities.GAS, Utilities.WATER], Utilities.all(),
+                          list(reversed(Utilities.all()))):
+            self.assertEqual(unpack_utilities(pack_utilities(utilities)), utilities)
+
+        p = self._create_property()
+        self.assertEqual(p.utilities_paid_by_unit, [[Utilities.GAS, Utilities.ELECTRIC], Utilities.all(), []])
+        self.assertEqual(p.utility_counts(), [1, 2, 2, 1, 1])
+        self.assertEqual(p.utility_codes, tuple(pack_utilities(u) for u in p.utilities_paid_by_unit))
+        with self.assertRaises(AttributeError):
+            p.utility_codes = ()
+
+    def test_defaults(self):
+        p = Property()
+        self.assertIsNone(p.url)
+        self.assertEqual(p.price, 0.0)
+        self.assertIsNone(p.utilities_paid_by_unit)
+        self.assertIsNone(p.utility_codes)
+        self.assertEqual(p.utility_counts(), [0] * len(Utilities))
+        self.assertEqual(p.to_json(), '{}')
+        with self.assertRaises(AttributeError):
+            p.not_a_field = 1
+
+        res = AnalysisResult()
+        self.assertIsNone(res.prob_negative_cash_flow)
+        with self.assertRaises(AttributeError):
+            res.cocr
+
+    def test_to_json_has_only_set_fields(self):
+        p = self._create_property()
+        d = json.loads(p.to_json())
+
+        self.assertNotIn('property_id', d)
+        self.assertNotIn('tax_year', d)
+        self.assertEqual(d['utilities_paid_by_unit'], [['GAS', 'ELECTRIC'], [u.name for u in Utilities], []])
+        self.assertEqual(list(d)[-1], 'utilities_paid_by_unit')
+
+    def test_pickle(self):
+        res = Analysis(self._create_property()).anaylze()
+        copy = pickle.loads(pickle.dumps(res))
+
+        self.assertEqual(copy.to_json(), res.to_json())
+        self.assertEqual(copy.property.to_json(), res.property.to_json())
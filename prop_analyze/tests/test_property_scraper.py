@@ -0,0 +1,129 @@
+import json
+import unittest
+from prop_analyze.parsers.redfin import RFPropertyScraper, RF_BASE_URL, index_amenities, extract_page_fields, \
+    extract_page_ids
+from prop_analyze.parsers.transport import StaticTransport
+from prop_analyze.property import Utilities
+from prop_analyze.tests.fixtures import load_fixture
+
+EXTRA_DATA_URL = f'{RF_BASE_URL}/stingray/api/home/details/belowTheFold?' \
+                 f'propertyId=10000001&accessLevel=1&listingId=20000001'
+
+class TestPropertyScraper(unittest.TestCase):
+
+    def setUp(self):
+        self.home = json.loads(load_fixture('gis_home.json'))
+        self.url = f'{RF_BASE_URL}{self.home["url"]}'
+        self.transport = StaticTransport()
+        self.transport.add(EXTRA_DATA_URL, load_fixture('below_the_fold.json'))
+        self.page_txt = load_fixture('listing.html')
+        self.transport.add(self.url, self.page_txt)
+
+    def _assert_property(self, res):
+        p = res.property
+        self.assertEqual(res.errors, [])
+        self.assertEqual(p.display_name, '100 W Example St, Chicago, IL')
+        self.assertEqual(p.price, 325000.0)
+        self.assertEqual((p.property_id, p.listing_id), ('10000001', '20000001'))
+        self.assertEqual(p.num_units, 3)
+        self.assertEqual(p.total_rent, 3075.0)
+        self.assertEqual(p.annual_taxes, 4821.37)
+        self.assertEqual(p.utilities_paid_by_unit, [[Utilities.ELECTRIC, Utilities.GAS],
+                                                    Utilities.all(),
+                                                    [Utilities.ELECTRIC]])
+
+    def test_parse_from_page(self):
+        res = RFPropertyScraper(self.url, self.transport).parse()
+
+        self._assert_property(res)
+        self.assertEqual(self.transport.requested_urls, [self.url, EXTRA_DATA_URL])
+
+    def test_parse_from_gis_record_skips_page(self):
+        res = RFPropertyScraper(self.url, self.transport, self.home).parse()
+
+        self._assert_property(res)
+        self.assertEqual(self.transport.requested_urls, [EXTRA_DATA_URL])
+
+    def test_incomplete_gis_record_falls_back_to_page(self):
+        del self.home['price']
+        res = RFPropertyScraper(self.url, self.transport, self.home).parse()
+
+        self._assert_property(res)
+        self.assertEqual(self.transport.requested_urls, [self.url, EXTRA_DATA_URL])
+
+    def test_access_level_from_page(self):
+        del self.home['price']
+        self.transport.add(self.url, self.page_txt.replace('"accessLevel":1', '"accessLevel":3'))
+        extra_data_url = EXTRA_DATA_URL.replace('accessLevel=1', 'accessLevel=3')
+        self.transport.add(extra_data_url, load_fixture('below_the_fold.json'))
+
+        # The page's accessLevel is used when the gis record doesn't have one
+        res = RFPropertyScraper(self.url, self.transport, self.home).parse()
+        self._assert_property(res)
+        self.assertEqual(self.transport.requested_urls, [self.url, extra_data_url])
+
+        # And the gis record's when it does
+        self.home['accessLevel'] = 1
+        self.transport.requested_urls.clear()
+        res = RFPropertyScraper(self.url, self.transport, self.home).parse()
+        self._assert_property(res)
+        self.assertEqual(self.transport.requested_urls, [self.url, EXTRA_DATA_URL])
+
+    def test_nested_tags_fall_back_to_soup(self):
+        self.page_txt = self.page_txt.replace('<span itemprop="streetAddress">100 W Example St,</span>',
+                                              '<span itemprop="streetAddress"><b>100</b> W Example St,</span>')
+        self.transport.add(self.url, self.page_txt)
+        scraper = RFPropertyScraper(self.url, self.transport)
+        res = scraper.parse()
+
+        self._assert_property(res)
+        self.assertIsNotNone(scraper.soup)
+
+    def test_fast_extraction_skips_soup(self):
+        scraper = RFPropertyScraper(self.url, self.transport)
+        self._assert_property(scraper.parse())
+        self.assertIsNone(scraper.soup)
+
+
+class TestExtractPageFields(unittest.TestCase):
+
+    def test_extract(self):
+        page_txt = '<span itemprop="addressRegion">IL</span>' \
+                   '<span class="x" itemprop=\'addressLocality\'>Chicago &amp; Suburbs,</span>' \
+                   '<span itemprop="addressLocality">Evanston,</span>' \
+                   '<div class="info-block price">\n<div class="statsValue">$1,000</div></div>' \
+                   '{"propertyId":1,"listingId":2,"propertyId":3}'
+
+        self.assertEqual(extract_page_fields(page_txt), {
+            'addressRegion': 'IL',
+            'addressLocality': 'Chicago & Suburbs,',
+            'price': '$1,000',
+            'propertyId': '1',
+            'listingId': '2',
+        })
+
+    def test_extract_ids(self):
+        page_txt = '<span itemprop="addressRegion">IL</span>' \
+                   '{"propertyId":1,"listingId":2,"propertyId":3,"accessLevel":4}'
+
+        self.assertEqual(extract_page_ids(page_txt), {'propertyId': '1', 'listingId': '2', 'accessLevel': '4'})
+
+
+class TestIndexAmenities(unittest.TestCase):
+
+    def test_first_combo_wins(self):
+        extra_data = {'amenitiesInfo': {'superGroups': [
+            {'amenityGroups': [{'referenceName': 'Unit1Information',
+                                'amenityEntries': [{'referenceName': 'RT1', 'amenityValues': ['$900']}]}]},
+            {'amenityGroups': [{'referenceName': 'Unit1Information',
+                                'amenityEntries': [{'referenceName': 'RT1', 'amenityValues': ['$1,000']},
+                                                   {'referenceName': 'TP1', 'amenityValues': ['Tenant Pays Gas']}]}]},
+        ]}}
+
+        self.assertEqual(index_amenities(extra_data), {
+            ('Unit1Information', 'RT1'): ['$900'],
+            ('Unit1Information', 'TP1'): ['Tenant Pays Gas'],
+        })
+
+    def test_missing_amenities(self):
+        self.assertEqual(index_amenities({}), {})
@@ -0,0 +1,27 @@
+import random
+import unittest
+from prop_analyze.analysis.ranking import TopK
+
+
+class TestTopK(unittest.TestCase):
+
+    def test_matches_stable_sort(self):
+        rnd = random.Random(1)
+        # Lots of ties, which must come out in the order they were pushed, like a stable sort
+        items = [(rnd.randint(0, 50), i) for i in range(2000)]
+
+        for k in (0, 1, 10, 100, 2000, 5000):
+            top = TopK(k, key=lambda item: item[0])
+            for item in items:
+                top.push(item)
+
+            expected = sorted(items, key=lambda item: item[0], reverse=True)[:k]
+            self.assertEqual(top.ranked(), expected)
+            self.assertLessEqual(len(top), max(k, 0))
+
+    def test_ranked_with_order(self):
+        top = TopK(2, key=lambda v: v)
+        for v in (5, 9, 1, 9):
+            top.push(v)
+
+        self.assertEqual(top.ranked_with_order(), [(1, 9), (3, 9)])
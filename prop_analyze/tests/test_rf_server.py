@@ -0,0 +1,81 @@
+import unittest
+from unittest import mock
+from prop_analyze.benchmarks.rf_server import RFStandInServer, synthesize_homes
+from prop_analyze.parsers import redfin
+from prop_analyze.parsers.redfin import RFListingScraper
+from prop_analyze.parsers.transport import RFTransport
+from prop_analyze.profiling import Profiler
+
+
+class TestRFStandInServer(unittest.TestCase):
+
+    def _scrape(self, server: RFStandInServer, transport: RFTransport) -> list:
+        server.start()
+        self.addCleanup(server.stop)
+        self.addCleanup(transport.close)
+
+        # The scrapers only accept URLs under RF_BASE_URL
+        with mock.patch.object(redfin, 'RF_BASE_URL', server.url):
+            return RFListingScraper(server.search_url, workers=4, transport=transport).parse_listings()
+
+    def test_scrape_search(self):
+        homes = synthesize_homes(30, seed=3, incomplete_rate=0.3)
+        incomplete = [h for h in homes if 'price' not in h]
+        self.assertTrue(incomplete)
+
+        server = RFStandInServer(homes=homes)
+        results = self._scrape(server, RFTransport(retries=0))
+
+        self.assertEqual([res.errors for res in results], [[]] * len(homes))
+        self.assertEqual([res.property.property_id for res in results], [str(h['propertyId']) for h in homes])
+        for res, h in zip(results, homes):
+            p = res.property
+            self.assertEqual(p.street_address, h['streetLine']['value'])
+            # The price comes from the listing page for the listings left out of the search
+            self.assertEqual(p.price, h['price']['value'] if 'price' in h else 325000.0)
+            self.assertEqual(p.num_units, 3)
+
+        # Only the incomplete listings had their page requested
+        self.assertEqual(server.stats, {'search': 1, 'gis': 1, 'listing': len(incomplete),
+                                        'below_the_fold': len(homes)})
+
+    def test_parse_on_processes(self):
+        homes = synthesize_homes(12, seed=6, incomplete_rate=0.5)
+        incomplete = [h for h in homes if 'price' not in h]
+        server = RFStandInServer(homes=homes)
+        server.start()
+        self.addCleanup(server.stop)
+        transport = RFTransport(retries=0)
+        self.addCleanup(transport.close)
+
+        with mock.patch.object(redfin, 'RF_BASE_URL', server.url):
+            serial = RFListingScraper(server.search_url, workers=4, transport=transport).parse_listings()
+            with Profiler() as profiler:
+                pooled = RFListingScraper(server.search_url, workers=4, transport=transport,
+                                          parse_workers=2).parse_listings()
+
+        self.assertEqual([res.errors for res in pooled], [[]] * len(serial))
+        self.assertEqual([res.property.to_json() for res in pooled], [res.property.to_json() for res in serial])
+        self.assertEqual([res.raw for res in pooled], [res.raw for res in serial])
+
+        # The timings of the stages run on the pool were sent back
+        stages = profiler.report()['stages']
+        self.assertEqual(stages['page_parse']['count'], len(incomplete))
+        self.assertEqual(stages['amenities']['count'], len(homes))
+
+    def test_faults_are_retried(self):
+        homes = synthesize_homes(30)
+        server = RFStandInServer(homes=homes, unavailable_rate=0.1, throttle_rate=0.1, drop_rate=0.1, retry_after=0,
+                                 seed=5)
+        results = self._scrape(server, RFTransport(retries=10, backoff_factor=0))
+
+        self.assertEqual([res.errors for res in results], [[]] * len(homes))
+        self.assertTrue(server.stats['503'] and server.stats['429'] and server.stats['drop'])
+
+    def test_faults_surface_as_errors(self):
+        server = RFStandInServer(homes=synthesize_homes(5), unavailable_rate=1.0)
+        results = self._scrape(server, RFTransport(retries=0))
+
+        # The search page itself is down, so nothing is found
+        self.assertEqual(results, [])
+        self.assertEqual(server.stats, {'search': 1, '503': 1})
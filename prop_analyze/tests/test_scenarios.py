@@ -0,0 +1,48 @@
+import copy
+import random
+import unittest
+from prop_analyze.analysis.parameters import all_params
+from prop_analyze.analysis.batch import PropertyBatch, BatchAnalysis
+from prop_analyze.analysis.scenarios import ScenarioGrid, evaluate_grid, CUBE_METRICS
+from prop_analyze.tests.test_batch_analysis import create_random_property
+
+
+class TestScenarioGrid(unittest.TestCase):
+
+    def test_parse(self):
+        grid = ScenarioGrid.parse(['interest_rate=0.06:0.08:0.01', 'loan_years=15,30'])
+
+        self.assertEqual(len(grid), 6)
+        columns = grid.columns()
+        self.assertEqual(columns['interest_rate'].tolist(), [0.06, 0.06, 0.07, 0.07, 0.08, 0.08])
+        self.assertEqual(columns['loan_years'].tolist(), [15, 30, 15, 30, 15, 30])
+
+    def test_unknown_parameter(self):
+        with self.assertRaises(ValueError):
+            ScenarioGrid.parse(['not_a_param=1,2'])
+
+    def test_bad_range(self):
+        with self.assertRaises(ValueError):
+            ScenarioGrid.parse(['interest_rate=0.06:0.08'])
+
+    def test_cube_matches_batch_per_scenario(self):
+        rnd = random.Random(3)
+        batch = PropertyBatch.from_properties([create_random_property(i, rnd) for i in range(100)])
+        grid = ScenarioGrid.parse(['interest_rate=0.06:0.08:0.005', 'down_payment=0.2,0.35', 'gas_expense=33.3,40'])
+
+        cube = evaluate_grid(batch, grid)
+        self.assertEqual(cube['cocr'].shape, (100, len(grid)))
+
+        # Each scenario must match analyzing the batch with those parameter values
+        columns = grid.columns()
+        for s in range(len(grid)):
+            params = []
+            for p in all_params:
+                p = copy.copy(p)
+                if p.key in columns:
+                    p.default_val = columns[p.key][s].item()
+                params.append(p)
+
+            expected = BatchAnalysis(batch, params).analyze()
+            for k in CUBE_METRICS:
+                self.assertEqual(cube[k][:, s].tolist(), expected[k].tolist(), k)
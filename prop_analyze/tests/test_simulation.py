@@ -0,0 +1,48 @@
+import random
+import unittest
+from prop_analyze.analysis.analyze import Analysis
+from prop_analyze.analysis.batch import PropertyBatch
+from prop_analyze.analysis.simulation import Simulation, Fixed, default_distributions, parse_distribution, Uniform
+from prop_analyze.tests.test_batch_analysis import create_random_property
+
+
+class TestSimulation(unittest.TestCase):
+
+    def setUp(self):
+        rnd = random.Random(5)
+        self.props = [create_random_property(i, rnd) for i in range(40)]
+        self.batch = PropertyBatch.from_properties(self.props)
+
+    def test_fixed_distributions_match_analysis(self):
+        # With every input fixed at its estimate, every draw is the plain analysis
+        fixed = dict((k, Fixed(d.mode)) for k, d in default_distributions().items())
+        res = Simulation(fixed, draws=10, seed=1).run(self.batch)
+
+        for i, p in enumerate(self.props):
+            expected = Analysis(p).anaylze()
+            for v in res.cash_flow_per_unit_percentiles[i]:
+                self.assertAlmostEqual(v, expected.cash_flow_per_unit, places=6)
+            self.assertEqual(res.prob_negative_cash_flow[i], 1.0 if expected.total_cash_flow < 0 else 0.0)
+
+    def test_seeded_results_dont_depend_on_workers(self):
+        a = Simulation(draws=1000, seed=42).run(self.batch)
+        b = Simulation(draws=1000, seed=42, workers=2).run(self.batch)
+
+        self.assertEqual(a.cash_flow_per_unit_percentiles.tolist(), b.cash_flow_per_unit_percentiles.tolist())
+        self.assertEqual(a.prob_negative_cash_flow.tolist(), b.prob_negative_cash_flow.tolist())
+
+    def test_apply(self):
+        results = [Analysis(p).anaylze() for p in self.props[:3]]
+        Simulation(draws=1000, seed=1).run(self.batch).apply(results)
+
+        self.assertEqual(list(results[0].cash_flow_per_unit_percentiles), ['p5', 'p25', 'p50', 'p75', 'p95'])
+        self.assertTrue(0.0 <= results[0].prob_negative_cash_flow <= 1.0)
+
+    def test_parse_distribution(self):
+        k, d = parse_distribution('vacancy=uniform:0.05,0.1')
+        self.assertEqual(k, 'vacancy')
+        self.assertIsInstance(d, Uniform)
+        self.assertEqual((d.low, d.high), (0.05, 0.1))
+
+        with self.assertRaises(ValueError):
+            Simulation({'interest_rate': Fixed(0.05)})
@@ -0,0 +1,78 @@
+import os
+import random
+import tempfile
+import unittest
+from prop_analyze.analysis.analyze import Analysis
+from prop_analyze.store import PropertyStore, StoreFilter
+from prop_analyze.tests.test_batch_analysis import create_random_property
+
+
+class TestPropertyStore(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'properties.db')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    @staticmethod
+    def _analyze(i: int, rnd: random.Random):
+        p = create_random_property(i, rnd)
+        p.property_id = str(1000 + i)
+        p.listing_id = str(2000 + i)
+        p.state = 'IL' if i % 2 else 'WI'
+        p.city = 'Chicago' if i % 2 else 'Milwaukee'
+        return Analysis(p).anaylze()
+
+    def test_round_trip(self):
+        res = self._analyze(1, random.Random(1))
+        raw = {'home': {'propertyId': 1001}, 'page_fields': {'tax_year': '2021'}}
+        with PropertyStore(self.path) as store:
+            store.add(res, raw)
+
+        with PropertyStore(self.path) as store:
+            stored, = store.query()
+            self.assertEqual(store.get_raw('1001', '2001'), raw)
+
+        for k in ('property_id', 'listing_id', 'url', 'street_address', 'city', 'state', 'price', 'num_units',
+                  'total_rent', 'annual_taxes', 'tax_year', 'utilities_paid_by_unit'):
+            self.assertEqual(getattr(stored.property, k), getattr(res.property, k), k)
+        self.assertEqual(stored.cash_flow_per_unit, res.cash_flow_per_unit)
+        self.assertEqual(stored.cocr, res.cocr)
+
+    def test_upsert_replaces(self):
+        rnd = random.Random(2)
+        res = self._analyze(1, rnd)
+        with PropertyStore(self.path) as store:
+            store.add(res, scraped_at=1)
+            res.property.price = 123.0
+            store.add(res, scraped_at=2)
+
+            self.assertEqual(len(store), 1)
+            self.assertEqual(store.query()[0].property.price, 123.0)
+
+    def test_filter_and_rank(self):
+        rnd = random.Random(3)
+        results = [self._analyze(i, rnd) for i in range(1, 1201)]
+        with PropertyStore(self.path, batch_size=100) as store:
+            for i, res in enumerate(results):
+                store.add(res, scraped_at=i)
+
+            self.assertEqual(len(store), len(results))
+
+            store_filter = StoreFilter(state='IL', min_units=3, max_price=500000, scraped_since=100)
+            best = store.query(store_filter, order_by='cocr', limit=5)
+
+        expected = sorted((r for i, r in enumerate(results)
+                           if r.property.state == 'IL' and r.property.num_units >= 3
+                           and r.property.price <= 500000 and i >= 100),
+                          key=lambda r: -r.cocr)[:5]
+        self.assertEqual([r.property.property_id for r in best], [r.property.property_id for r in expected])
+
+    def test_needs_ids(self):
+        res = self._analyze(1, random.Random(4))
+        res.property.listing_id = None
+        with PropertyStore(self.path) as store:
+            with self.assertRaises(ValueError):
+                store.add(res)
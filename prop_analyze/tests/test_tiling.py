@@ -0,0 +1,130 @@
+import threading
+import unittest
+from unittest import mock
+from prop_analyze.benchmarks.rf_server import RFStandInServer, synthesize_homes, AREA
+from prop_analyze.parsers import redfin
+from prop_analyze.parsers.redfin import RFListingScraper
+from prop_analyze.parsers.tiling import BBox, parse_poly, format_poly, parse_viewport, split_bbox, set_query_param, \
+    get_query_param
+from prop_analyze.parsers.transport import RFTransport, TransportResponse
+
+
+class TestTiling(unittest.TestCase):
+
+    def test_poly_round_trip(self):
+        box = BBox(41.64, -87.94, 42.02, -87.52)
+        self.assertEqual(parse_poly(format_poly(box)), box)
+        self.assertIsNone(parse_poly('not a poly'))
+
+    def test_parse_viewport(self):
+        url = 'https://www.redfin.com/city/29470/IL/Chicago/filter/property-type=multifamily,' \
+              'viewport=42.02:41.64:-87.52:-87.94'
+        self.assertEqual(parse_viewport(url), BBox(41.64, -87.94, 42.02, -87.52))
+        self.assertIsNone(parse_viewport('https://www.redfin.com/city/29470/IL/Chicago'))
+
+    def test_split_bbox(self):
+        quarters = split_bbox(BBox(0.0, 0.0, 2.0, 4.0))
+        self.assertEqual(quarters, [BBox(0.0, 0.0, 1.0, 2.0), BBox(0.0, 2.0, 1.0, 4.0),
+                                    BBox(1.0, 0.0, 2.0, 2.0), BBox(1.0, 2.0, 2.0, 4.0)])
+
+    def test_set_query_param(self):
+        url = 'https://www.redfin.com/stingray/api/gis?al=1&num_homes=3000&v=8'
+        tiled = set_query_param(url, 'poly', '-87.9 41.6,-87.5 41.6')
+        self.assertTrue(tiled.startswith('https://www.redfin.com/stingray/api/gis?al=1&num_homes=3000&v=8&poly='))
+        self.assertEqual(get_query_param(tiled, 'poly'), '-87.9 41.6,-87.5 41.6')
+        self.assertEqual(get_query_param(set_query_param(tiled, 'poly', 'x'), 'poly'), 'x')
+
+
+class _BadTileTransport:
+    """
+    Answers the first tile requested with a malformed gis search response
+    """
+
+    def __init__(self, transport):
+        self.transport = transport
+        self.bad_url = None
+        self._lock = threading.Lock()
+
+    def get(self, url: str, headers: dict = None):
+        with self._lock:
+            if self.bad_url is None and get_query_param(url, 'poly'):
+                self.bad_url = url
+        if url == self.bad_url:
+            return TransportResponse(url, 200, '{}&&{"payload":')
+        return self.transport.get(url, headers=headers)
+
+    def close(self):
+        self.transport.close()
+
+
+class TestTiledSearch(unittest.TestCase):
+
+    def _load_homes(self, homes: [dict], max_listings: int, viewport: bool = False,
+                    transport=None) -> RFListingScraper:
+        server = RFStandInServer(homes=homes)
+        server.start()
+        self.addCleanup(server.stop)
+        transport = transport or RFTransport()
+        self.addCleanup(transport.close)
+
+        with mock.patch.object(redfin, 'RF_BASE_URL', server.url):
+            url = server.search_url
+            if viewport:
+                url += f',viewport={AREA.north}:{AREA.south}:{AREA.east}:{AREA.west}'
+            scraper = RFListingScraper(url, transport=transport)
+            scraper.max_listings = max_listings
+            self.assertTrue(scraper.load_homes())
+        self.server = server
+        return scraper
+
+    def test_finds_every_listing(self):
+        homes = synthesize_homes(300, seed=1)
+        scraper = self._load_homes(homes, max_listings=40, viewport=True)
+
+        self.assertEqual(sorted(h['propertyId'] for h in scraper.homes), sorted(h['propertyId'] for h in homes))
+        self.assertEqual(len(scraper.property_urls), len(homes))
+        coverage = scraper.coverage
+        self.assertEqual(coverage['listings'], len(homes))
+        self.assertEqual(coverage['failed'], 0)
+        self.assertEqual(coverage['truncated'], 0)
+        self.assertGreater(coverage['split'], 1)
+        # Every tile that was split was replaced by its four quarters
+        self.assertEqual(coverage['tiles'], 1 + 4 * coverage['split'])
+        self.assertEqual(self.server.stats['gis'], coverage['tiles'])
+
+    def test_failed_tile(self):
+        homes = synthesize_homes(300, seed=1)
+        transport = _BadTileTransport(RFTransport())
+        scraper = self._load_homes(homes, max_listings=40, viewport=True, transport=transport)
+
+        # The rest of the search is still loaded, and the failed tile is a warning rather than an error
+        self.assertIsNotNone(transport.bad_url)
+        self.assertEqual(scraper.coverage['failed'], 1)
+        self.assertEqual(len(set(h['propertyId'] for h in scraper.homes)), len(scraper.homes))
+        self.assertGreater(len(scraper.homes), 40)
+        self.assertLess(len(scraper.homes), len(homes))
+        self.assertEqual(scraper.res.errors, [])
+        self.assertEqual(len(scraper.res.warnings), 1)
+        self.assertIn('1 tiles could not be searched', scraper.res.warnings[0])
+
+    def test_tiles_around_the_listings_without_a_viewport(self):
+        homes = synthesize_homes(300, seed=1)
+        scraper = self._load_homes(homes, max_listings=40)
+        self.assertEqual(len(scraper.homes), len(homes))
+        self.assertEqual(len(set(h['propertyId'] for h in scraper.homes)), len(homes))
+
+    def test_not_tiled_under_the_limit(self):
+        homes = synthesize_homes(30)
+        scraper = self._load_homes(homes, max_listings=100)
+        self.assertEqual(scraper.homes, homes)
+        self.assertIsNone(scraper.coverage)
+        self.assertEqual(self.server.stats['gis'], 1)
+
+    def test_no_locations(self):
+        homes = synthesize_homes(30)
+        for h in homes:
+            del h['latLong']
+        scraper = self._load_homes(homes, max_listings=10)
+        self.assertEqual(len(scraper.homes), 10)
+        self.assertEqual(scraper.coverage['truncated'], 1)
+        self.assertEqual(len(scraper.res.warnings), 1)
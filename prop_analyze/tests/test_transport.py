@@ -0,0 +1,30 @@
+import unittest
+from prop_analyze.parsers.redfin import RFPropertyScraper
+from prop_analyze.parsers.transport import StaticTransport, RFTransport
+
+URL = 'https://www.redfin.com/IL/Chicago/123-Main-St-60620/home/1'
+
+
+class TestTransport(unittest.TestCase):
+
+    def test_scraper_uses_injected_transport(self):
+        transport = StaticTransport()
+        transport.add(URL, '', status_code=503)
+
+        res = RFPropertyScraper(URL, transport).parse()
+
+        self.assertEqual(transport.requested_urls, [URL])
+        self.assertEqual(res.errors, ['Redfin is currently down for maintenance.'])
+
+    def test_missing_page(self):
+        res = RFPropertyScraper(URL, StaticTransport()).parse()
+        self.assertEqual(res.errors, [f'Received a 404 error code requesting Redfin URL {URL}'])
+
+    def test_pooled_session(self):
+        transport = RFTransport(pool_size=4, retries=2)
+        adapter = transport.session.get_adapter(URL)
+
+        self.assertEqual(adapter._pool_maxsize, 4)
+        self.assertEqual(adapter.max_retries.total, 2)
+        self.assertIn('gzip', transport.session.headers['accept-encoding'])
+        transport.close()
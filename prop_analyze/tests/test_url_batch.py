@@ -0,0 +1,140 @@
+import csv
+import io
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+from prop_analyze.benchmarks.rf_server import RFStandInServer, synthesize_homes
+from prop_analyze.parsers import redfin
+from prop_analyze.parsers.transport import RFTransport, TransportResponse
+from prop_analyze.url_batch import URLBatch, read_urls, url_kind, open_analyses_file, KIND_PROPERTY, KIND_SEARCH, \
+    URLS_FILE, ANALYSES_FILE, RANKING_FILE
+
+
+class TestReadURLs(unittest.TestCase):
+
+    def test_read_urls(self):
+        lines = io.StringIO('# nightly\n'
+                            'https://www.redfin.com/city/29470/IL/Chicago\n'
+                            '\n'
+                            '  https://www.redfin.com/IL/Chicago/7600-S-Green-St-60620/home/13913979/  \n'
+                            'https://www.redfin.com/city/29470/IL/Chicago#map\n')
+        self.assertEqual(read_urls(lines), ['https://www.redfin.com/city/29470/IL/Chicago',
+                                            'https://www.redfin.com/IL/Chicago/7600-S-Green-St-60620/home/13913979'])
+
+    def test_url_kind(self):
+        self.assertEqual(url_kind('https://www.redfin.com/IL/Chicago/7600-S-Green-St-60620/home/13913979'),
+                         KIND_PROPERTY)
+        self.assertEqual(url_kind('https://www.redfin.com/city/29470/IL/Chicago/filter/property-type=multifamily'),
+                         KIND_SEARCH)
+
+
+class _BrokenSearchTransport:
+    """
+    Serves a search page without a gis search URL for one search
+    """
+
+    def __init__(self, transport, broken_url: str):
+        self.transport = transport
+        self.broken_url = broken_url
+
+    def get(self, url: str, headers: dict = None):
+        if url == self.broken_url:
+            return TransportResponse(url, 200, '<html><body>Nothing to see</body></html>')
+        return self.transport.get(url, headers=headers)
+
+    def close(self):
+        self.transport.close()
+
+
+class TestURLBatch(unittest.TestCase):
+
+    def test_batch(self):
+        homes = synthesize_homes(20, seed=4, incomplete_rate=0.2)
+        server = RFStandInServer(homes=homes)
+        server.start()
+        self.addCleanup(server.stop)
+        transport = RFTransport(pool_size=4)
+        self.addCleanup(transport.close)
+
+        property_url = f'{server.url}{homes[3]["url"]}'
+        urls = [
+            property_url,
+            server.search_url,
+            # The same search again, written differently
+            f'{server.search_url}/',
+            # Different search, same listings
+            f'{server.search_url},min-beds=2',
+            f'{server.url}/nothing/here',
+        ]
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        analyses = []
+
+        def on_analysis(res, source_url):
+            analyses.append(res)
+            exporter.write(res, source_url)
+
+        with mock.patch.object(redfin, 'RF_BASE_URL', server.url), open_analyses_file(tmp.name) as exporter:
+            batch = URLBatch(urls, workers=4, transport=transport, count=5)
+            batch.run(on_analysis)
+
+        self.assertEqual(len(batch.outcomes), 4)
+        prop, search, other_search, missing = batch.outcomes
+        self.assertEqual((prop.kind, prop.num_listings, prop.num_scraped, prop.num_analyzed, prop.errors),
+                         (KIND_PROPERTY, 1, 1, 1, []))
+        self.assertEqual((search.num_listings, search.num_scraped, search.num_duplicates, search.num_analyzed),
+                         (20, 19, 1, 19))
+        self.assertEqual((other_search.num_listings, other_search.num_scraped, other_search.num_duplicates),
+                         (20, 0, 20))
+        self.assertIsNone(other_search.best)
+        self.assertEqual(missing.num_scraped, 0)
+        self.assertEqual(len(missing.errors), 1)
+
+        # Every listing is only scraped and analyzed once, and the searches share the search page requests
+        self.assertEqual(len(analyses), 20)
+        self.assertEqual(server.stats['below_the_fold'], 20)
+        self.assertEqual(server.stats['gis'], 2)
+
+        best = batch.top.ranked()
+        self.assertEqual(len(best), 5)
+        self.assertEqual(best[0].cash_flow_per_unit, max(res.cash_flow_per_unit for res in analyses))
+        self.assertEqual(search.best.cash_flow_per_unit,
+                         max(res.cash_flow_per_unit for res in analyses if res.property.url != property_url))
+
+        # Every streamed analysis says which URL of the batch it came from
+        with open(os.path.join(tmp.name, ANALYSES_FILE)) as f:
+            streamed = [json.loads(line) for line in f]
+        self.assertEqual([row['url'] for row in streamed], [res.property.url for res in analyses])
+        self.assertEqual(list(streamed[0])[0], 'source_url')
+        self.assertEqual([row['source_url'] for row in streamed if row['url'] == property_url], [property_url])
+        self.assertEqual(set(row['source_url'] for row in streamed if row['url'] != property_url), {server.search_url})
+
+        batch.save(tmp.name)
+        with open(os.path.join(tmp.name, URLS_FILE)) as f:
+            saved = [json.loads(line) for line in f]
+        with open(os.path.join(tmp.name, RANKING_FILE), newline='') as f:
+            ranking = list(csv.DictReader(f))
+        self.assertEqual([o['url'] for o in saved], batch.urls)
+        self.assertEqual([r['url'] for r in ranking], [res.property.url for res in best])
+
+    def test_broken_search(self):
+        homes = synthesize_homes(10, seed=4)
+        server = RFStandInServer(homes=homes)
+        server.start()
+        self.addCleanup(server.stop)
+        broken_url = f'{server.url}/city/1/IL/Broken'
+        transport = _BrokenSearchTransport(RFTransport(pool_size=4), broken_url)
+        self.addCleanup(transport.close)
+
+        with mock.patch.object(redfin, 'RF_BASE_URL', server.url):
+            batch = URLBatch([broken_url, server.search_url], workers=4, transport=transport)
+            batch.run()
+
+        broken, search = batch.outcomes
+        self.assertEqual(broken.num_scraped, 0)
+        self.assertEqual(len(broken.errors), 1)
+        self.assertIn('Could not load the listings', broken.errors[0])
+        # The other search is still run
+        self.assertEqual((search.num_listings, search.num_scraped, search.errors), (10, 10, []))
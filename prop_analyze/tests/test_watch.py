@@ -0,0 +1,109 @@
+import os
+import tempfile
+import unittest
+from prop_analyze.store import PropertyStore
+from prop_analyze.watch import SearchWatcher, DeltaKind
+from prop_analyze.tests.test_pipeline import SyntheticListingTransport, SEARCH_URL
+from prop_analyze.parsers.transport import TransportResponse
+
+
+class _NoUnitsTransport(SyntheticListingTransport):
+    """
+    Serves below the fold data without any units for one property, so it can't be analyzed
+    """
+
+    no_units_id = '999999'
+
+    def get(self, url: str, headers: dict = None) -> TransportResponse:
+        if '/belowTheFold?' in url and f'propertyId={self.no_units_id}&' in url:
+            if self.requested_urls is not None:
+                self.requested_urls.append(url)
+            return TransportResponse(url, 200, '{}&&{"payload": {}}')
+        return super().get(url, headers)
+
+
+class TestSearchWatcher(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = PropertyStore(os.path.join(self.tmp.name, 'properties.db'))
+        self.transport = _NoUnitsTransport(30, record=True)
+        self.watcher = SearchWatcher(SEARCH_URL, self.store, workers=4, transport=self.transport, count=3)
+
+    def tearDown(self):
+        self.store.close()
+        self.tmp.cleanup()
+
+    def _scraped_ids(self) -> [str]:
+        ids = [u.split('propertyId=')[1].split('&')[0] for u in self.transport.requested_urls if 'belowTheFold' in u]
+        self.transport.requested_urls.clear()
+        return sorted(ids)
+
+    def test_first_poll_scrapes_everything(self):
+        deltas = self.watcher.poll()
+
+        self.assertEqual(len(self._scraped_ids()), 30)
+        self.assertEqual([d.kind for d in deltas], [DeltaKind.ENTERED_TOP] * 3)
+        self.assertEqual([d.rank for d in deltas], [1, 2, 3])
+
+    def test_only_changes_are_scraped(self):
+        self.watcher.poll()
+        self._scraped_ids()
+
+        # Nothing changed, so nothing is scraped, and only the gis search is requested
+        self.assertEqual(self.watcher.poll(), [])
+        self.assertEqual(len(self.transport.requested_urls), 1)
+        self.assertIn('/stingray/api/gis?', self.transport.requested_urls[0])
+        self.assertEqual(self._scraped_ids(), [])
+
+        # Drop the price of one, remove one and add one
+        homes = [dict(h) for h in self.transport.homes]
+        homes[5]['price'] = {'value': 50000}
+        removed = homes.pop(7)
+        added = dict(homes[0])
+        added['propertyId'] = 999999
+        added['listingId'] = 888888
+        added['price'] = {'value': 900000}
+        added['url'] = '/IL/Chicago/1-New-St-60620/home/999999'
+        homes.append(added)
+        self.transport.set_homes(homes)
+
+        deltas = self.watcher.poll()
+        by_kind = dict((d.kind, d) for d in deltas)
+
+        self.assertEqual(self._scraped_ids(), ['100005', '999999'])
+        self.assertEqual(by_kind[DeltaKind.PRICE_DROP].property_id, '100005')
+        self.assertEqual(by_kind[DeltaKind.PRICE_DROP].new_price, 50000)
+        self.assertEqual(by_kind[DeltaKind.NEW].property_id, '999999')
+        self.assertEqual(by_kind[DeltaKind.REMOVED].property_id, str(removed['propertyId']))
+
+        # The price drop makes it the best property
+        self.assertEqual([d.property_id for d in deltas if d.kind == DeltaKind.ENTERED_TOP], ['100005'])
+        self.assertEqual(by_kind[DeltaKind.ENTERED_TOP].rank, 1)
+        self.assertIn(DeltaKind.LEFT_TOP, by_kind)
+
+    def test_failed_listing_is_only_scraped_again_when_it_changes(self):
+        self.watcher.poll()
+        self._scraped_ids()
+
+        homes = [dict(h) for h in self.transport.homes]
+        failing = dict(homes[0])
+        failing['propertyId'] = 999999
+        failing['listingId'] = 888888
+        failing['url'] = '/IL/Chicago/1-New-St-60620/home/999999'
+        homes.append(failing)
+        self.transport.set_homes(homes)
+
+        deltas = self.watcher.poll()
+        self.assertEqual(self._scraped_ids(), ['999999'])
+        new, = [d for d in deltas if d.kind == DeltaKind.NEW]
+        self.assertIsNone(new.analysis)
+
+        # It isn't scraped again while it's unchanged
+        self.assertEqual(self.watcher.poll(), [])
+        self.assertEqual(self._scraped_ids(), [])
+
+        failing['price'] = {'value': 1000}
+        self.transport.set_homes(homes)
+        self.watcher.poll()
+        self.assertEqual(self._scraped_ids(), ['999999'])
@@ -0,0 +1,105 @@
+import os
+import tempfile
+import time
+import unittest
+from unittest import mock
+from prop_analyze.benchmarks.rf_server import RFStandInServer, synthesize_homes
+from prop_analyze.parsers import redfin
+from prop_analyze.parsers.transport import RFTransport
+from prop_analyze.profiling import Profiler
+from prop_analyze.metrics import Metrics, PROPERTIES_PARSED_TOTAL, REQUESTS_TOTAL
+from prop_analyze.store import PropertyStore
+from prop_analyze.work_queue import WorkQueue, enqueue_search, run_workers, PENDING, LEASED, DONE, FAILED
+
+
+class TestWorkQueue(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'queue.db')
+        self.queue = WorkQueue(self.path, max_attempts=2)
+
+    def tearDown(self):
+        self.queue.close()
+        self.tmp.cleanup()
+
+    def test_add_skips_existing(self):
+        self.assertEqual(self.queue.add(['a', 'b']), 2)
+        self.assertEqual(self.queue.add(['b', 'c'], [{'url': 'b'}, {'url': 'c'}], 'search'), 1)
+        self.assertEqual(self.queue.counts(), {PENDING: 3, LEASED: 0, DONE: 0, FAILED: 0})
+
+    def test_lease_and_complete(self):
+        self.queue.add(['a', 'b', 'c'], [None, {'url': 'b'}, None])
+        jobs = self.queue.lease('w1', n=2)
+        self.assertEqual([(j.url, j.home, j.attempts) for j in jobs], [('a', None, 1), ('b', {'url': 'b'}, 1)])
+
+        # Another worker only gets what's left, even from its own connection
+        with WorkQueue(self.path) as other:
+            self.assertEqual([j.url for j in other.lease('w2', n=2)], ['c'])
+            self.assertEqual(other.lease('w2'), [])
+
+        self.assertTrue(self.queue.complete(jobs[0], 'w1'))
+        self.assertTrue(self.queue.complete(jobs[1], 'w1', ['Could not parse']))
+        self.assertEqual(self.queue.counts(), {PENDING: 0, LEASED: 1, DONE: 1, FAILED: 1})
+        self.assertEqual(self.queue.errors(), [('b', ['Could not parse'])])
+        self.assertEqual(self.queue.remaining(), 1)
+
+        self.assertEqual(self.queue.retry_failed(), 1)
+        self.assertEqual([j.url for j in self.queue.lease('w1')], ['b'])
+
+    def test_expired_lease(self):
+        self.queue.add(['a'])
+        job, = self.queue.lease('crashed', lease_seconds=0.05)
+        self.assertEqual(self.queue.lease('w2'), [])
+        time.sleep(0.1)
+
+        retried, = self.queue.lease('w2', lease_seconds=0.05)
+        self.assertEqual((retried.url, retried.attempts), ('a', 2))
+        # The worker that lost the lease can't mark the job done
+        self.assertFalse(self.queue.complete(job, 'crashed'))
+
+        # After max_attempts expired leases, the job is given up on
+        time.sleep(0.1)
+        self.assertEqual(self.queue.lease('w3'), [])
+        self.assertEqual(self.queue.counts()[FAILED], 1)
+        self.assertEqual(self.queue.remaining(), 0)
+
+
+class TestWorkers(unittest.TestCase):
+
+    def test_worker_processes(self):
+        homes = synthesize_homes(40, seed=5, incomplete_rate=0.2)
+        server = RFStandInServer(homes=homes)
+        server.start()
+        self.addCleanup(server.stop)
+        transport = RFTransport()
+        self.addCleanup(transport.close)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'queue.db')
+            # The workers may be started fresh rather than forked, so they're pointed at the server by RF_BASE_URL too
+            with mock.patch.dict(os.environ, {'RF_BASE_URL': server.url}), \
+                    mock.patch.object(redfin, 'RF_BASE_URL', server.url):
+                with WorkQueue(path) as queue:
+                    self.assertEqual(enqueue_search(queue, server.search_url, transport), len(homes))
+                    # A crashed worker's jobs
+                    crashed = queue.lease('crashed', n=3, lease_seconds=0.5)
+
+                with Profiler() as profiler, Metrics() as registry:
+                    run_workers(path, processes=3, lease_size=2)
+
+            with WorkQueue(path) as queue:
+                self.assertEqual(queue.counts(), {PENDING: 0, LEASED: 0, DONE: len(homes), FAILED: 0})
+            with PropertyStore(path) as store:
+                stored = store.query()
+
+        self.assertEqual(sorted(res.property.property_id for res in stored),
+                         sorted(str(h['propertyId']) for h in homes))
+        self.assertEqual(len(crashed), 3)
+        # Each listing was only scraped once, including the ones the crashed worker had leased
+        self.assertEqual(server.stats['below_the_fold'], len(homes))
+
+        # The workers' timings and metrics were merged into this process's
+        self.assertEqual(profiler.report()['stages']['scrape']['count'], len(homes))
+        self.assertEqual(registry.total(PROPERTIES_PARSED_TOTAL), len(homes))
+        self.assertGreaterEqual(registry.total(REQUESTS_TOTAL), len(homes))
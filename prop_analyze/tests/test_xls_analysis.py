@@ -1,4 +1,5 @@
 from openpyxl import load_workbook
+import tempfile
 import unittest
 from prop_analyze.property import Property, Utilities
 from prop_analyze.spreadsheet.xls import output_to_xls
@@ -7,6 +8,12 @@ from prop_analyze.analysis.analyze import Analysis
 
 class TestXlsMatchesAnalysis(unittest.TestCase):
 
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
     @staticmethod
     def _create_property(name: str,
                          price: float,
@@ -29,7 +36,7 @@ class TestXlsMatchesAnalysis(unittest.TestCase):
         res = analysis.anaylze()
 
         # Convert it to XLS
-        outfile = output_to_xls(prop)
+        outfile = output_to_xls(prop, out_dir=self.tmp.name)
 
         # Open the XLS file we just created
         wb = load_workbook(filename=outfile, data_only=True)
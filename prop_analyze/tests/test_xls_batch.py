@@ -0,0 +1,80 @@
+import os
+import random
+import tempfile
+import unittest
+from openpyxl import load_workbook
+from prop_analyze.analysis.analyze import Analysis
+from prop_analyze.analysis.parameters import get_variables_for_property
+from prop_analyze.spreadsheet.xls import output_to_xls, output_batch_to_xls, output_workbook_to_xls, TEMPLATE_FILE
+from prop_analyze.tests.test_batch_analysis import create_random_property
+
+
+class TestXlsBatch(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        rnd = random.Random(11)
+        self.props = [create_random_property(i, rnd) for i in range(5)]
+        for i, p in enumerate(self.props):
+            p.url = f'https://www.redfin.com/IL/Chicago/{i}-W-Example-St-60620/home/{i}'
+            p.street_address = f'{i} W Example St: Unit [A]'
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    @staticmethod
+    def _cells(sheet) -> dict:
+        return dict((c.coordinate, c.value) for row in sheet.iter_rows() for c in row if c.value is not None)
+
+    def test_batch_matches_single(self):
+        outfiles = output_batch_to_xls(self.props, self.tmp.name)
+
+        template = self._cells(load_workbook(TEMPLATE_FILE).worksheets[0])
+        for p, outfile in zip(self.props, outfiles):
+            sheet = load_workbook(outfile).worksheets[0]
+            cells = self._cells(sheet)
+
+            # Every template cell that isn't an input is kept as is.  B7 is the loan points input
+            for coordinate, value in template.items():
+                if coordinate != 'B7':
+                    self.assertEqual(cells[coordinate], value, coordinate)
+
+            variables = get_variables_for_property(p)
+            self.assertAlmostEqual(cells['B1'], p.price)
+            self.assertAlmostEqual(cells['F4'], variables['electricity_expense'])
+            self.assertAlmostEqual(cells['F17'], variables['prop_mgmt'])
+            self.assertAlmostEqual(cells['I13'], p.price * 0.9)
+            self.assertEqual(sheet['A22'].hyperlink.target, p.url)
+
+            # Filling a clone of the template gives the same thing as the single property output
+            single = output_to_xls(p, out_dir=self.tmp.name)
+            self.assertEqual(single, outfile)
+            self.assertEqual(self._cells(load_workbook(single).worksheets[0]), cells)
+
+    def test_workers(self):
+        serial = output_batch_to_xls(self.props, self.tmp.name)
+        serial_cells = [self._cells(load_workbook(f).worksheets[0]) for f in serial]
+
+        concurrent = output_batch_to_xls(self.props, self.tmp.name, workers=2)
+        self.assertEqual(concurrent, serial)
+        self.assertEqual([self._cells(load_workbook(f).worksheets[0]) for f in concurrent], serial_cells)
+
+    def test_workbook(self):
+        results = [Analysis(p).anaylze() for p in self.props]
+        outfile = output_workbook_to_xls(results, os.path.join(self.tmp.name, 'best.xlsx'))
+        single = output_batch_to_xls(self.props, self.tmp.name)
+
+        wb = load_workbook(outfile)
+        self.assertEqual(len(wb.sheetnames), len(results) + 1)
+        self.assertEqual(wb.sheetnames[0], 'Summary')
+        self.assertEqual(wb.sheetnames[1], '1. 0 W Example St Unit A')
+
+        summary = wb['Summary']
+        for i, res in enumerate(results):
+            row = [c.value for c in summary[i + 2]]
+            self.assertEqual(row[:4], [i + 1, res.property.display_name, wb.sheetnames[i + 1], res.property.num_units])
+            self.assertAlmostEqual(row[5], res.cash_flow_per_unit)
+
+        # Each property's sheet has the same cells as its own spreadsheet
+        for name, f in zip(wb.sheetnames[1:], single):
+            self.assertEqual(self._cells(wb[name]), self._cells(load_workbook(f).worksheets[0]))
@@ -0,0 +1,271 @@
+import json
+import logging
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+from prop_analyze.parsers.redfin import RFListingScraper, RF_BASE_URL
+from prop_analyze.analysis.ranking import TopK
+from prop_analyze.analysis.result import AnalysisResult
+from prop_analyze.pipeline import PipelineStats, analyze_results, rank_analyses
+from prop_analyze.store import PropertyStore
+from prop_analyze.export import NDJSONExporter, CSVExporter, EXPORT_COLUMNS, export_row
+from prop_analyze.utils import log
+
+# Analyzes a whole list of property and search URLs in one process, instead of running analyze and find_best once for
+# each.  Every URL shares the transport (and with it the pooled connections and the response cache) and user agent,
+# and the properties of every URL are scraped on one bounded pool of workers, so no worker sits idle waiting for the
+# next URL to start.  A property that's in more than one search, or is also given on its own, is only scraped once.
+
+# Property URLs look like https://www.redfin.com/IL/Chicago/7600-S-Green-St-60620/home/13913979
+PROPERTY_URL_RE = re.compile(r'/home/\d+$')
+
+KIND_PROPERTY = 'property'
+KIND_SEARCH = 'search'
+
+URLS_FILE = 'urls.ndjson'
+ANALYSES_FILE = 'analyses.ndjson'
+RANKING_FILE = 'ranking.csv'
+
+
+def normalize_url(url: str) -> str:
+    """
+    :return: The URL without surrounding whitespace, a #fragment or a trailing /, so the same URL written slightly
+    differently is only run once
+    """
+    return url.strip().split('#')[0].rstrip('/')
+
+
+def url_kind(url: str) -> str:
+    """
+    :return: Whether a URL is of a single property or of a search
+    """
+    return KIND_PROPERTY if PROPERTY_URL_RE.search(url.split('?')[0]) else KIND_SEARCH
+
+
+def read_urls(lines) -> [str]:
+    """
+    Read URLs one per line, skipping blank lines and # comments
+    :param lines: The lines, ie. an open file
+    :return: The URLs, without duplicates, in the order they first appear
+    """
+    urls = dict()
+    for line in lines:
+        line = line.strip()
+        if line and not line.startswith('#'):
+            urls.setdefault(normalize_url(line), None)
+    return list(urls)
+
+
+class URLOutcome:
+    """
+    What came of one URL in the batch
+    """
+
+    url: str
+    kind: str
+
+    # The properties the URL has:  1 for a property, the listings for a search
+    num_listings: int = 0
+
+    # The properties scraped for it.  Properties already scraped for an earlier URL in the batch aren't scraped again
+    num_scraped: int = 0
+    num_duplicates: int = 0
+
+    # The properties that scraped without critical errors and were analyzed
+    num_analyzed: int = 0
+
+    # The errors of the URL itself (ie. the search couldn't be loaded), or of its property
+    errors: [str]
+
+    # The best of its analyses, by cash flow per unit
+    best: AnalysisResult = None
+
+    def __init__(self, url: str, kind: str):
+        self.url = url
+        self.kind = kind
+        self.errors = []
+
+    def to_json(self) -> str:
+        p = self.best.property if self.best else None
+        return json.dumps({
+            'url': self.url,
+            'kind': self.kind,
+            'num_listings': self.num_listings,
+            'num_scraped': self.num_scraped,
+            'num_duplicates': self.num_duplicates,
+            'num_analyzed': self.num_analyzed,
+            'errors': self.errors,
+            'best_url': p.url if p else None,
+            'best_cash_flow_per_unit': self.best.cash_flow_per_unit if self.best else None,
+        })
+
+
+def _load_search(scraper: RFListingScraper) -> [str]:
+    """
+    Load the listings of one search of a batch.  A search that can't be loaded, even because its page or gis search
+    response is malformed, only fails its own URL
+    :return: The errors, or None if it loaded
+    """
+    try:
+        if scraper.load_homes():
+            return None
+    except Exception as e:
+        log(f'Could not load the listings of {scraper.url}: {e!r}', logging.WARNING)
+        return [f'Could not load the listings: {e!r}']
+    return scraper.res.errors or ['Could not load the listings']
+
+
+class URLBatch:
+    """
+    Scrapes, analyzes and ranks the properties of a list of property and search URLs
+    """
+
+    urls: [str]
+    outcomes: [URLOutcome]
+    top: TopK
+    stats: PipelineStats
+
+    def __init__(self, urls: [str], workers: int = 1, transport=None, count: int = 10, store: PropertyStore = None,
+                 parse_workers: int = 0):
+        """
+        :param urls: The property and search URLs
+        :param workers: The number of properties to scrape concurrently, across all the URLs
+        :param transport: The transport to share between every URL
+        :param count: The number of best properties to rank, across all the URLs
+        :param store: If given, every analysis is added to it
+        :param parse_workers: The number of processes to parse the listing pages on.  0 to parse them on the workers
+        """
+        self.urls = list(dict.fromkeys(normalize_url(u) for u in urls))
+        self.workers = max(1, workers)
+        self.store = store
+        self.outcomes = [URLOutcome(u, url_kind(u)) for u in self.urls]
+        self.top = TopK(count, key=lambda res: res.cash_flow_per_unit)
+        self.stats = PipelineStats()
+
+        # Scrapes every property, whatever URL it's from.  Its own URL is never requested
+        self._scraper = RFListingScraper(RF_BASE_URL, workers=self.workers, transport=transport,
+                                         parse_workers=parse_workers)
+        self.transport = self._scraper.transport
+        self.user_agent = self._scraper.user_agent
+
+    def _load_searches(self) -> dict:
+        """
+        Load the listings of every search, concurrently
+        :return: dict of search URL to its scraper, for the ones that loaded
+        """
+        searches = [o for o in self.outcomes if o.kind == KIND_SEARCH]
+        if not searches:
+            return {}
+
+        scrapers = [RFListingScraper(o.url, transport=self.transport, user_agent=self.user_agent) for o in searches]
+        with ThreadPoolExecutor(max_workers=min(self.workers, len(scrapers))) as executor:
+            loaded = list(executor.map(_load_search, scrapers))
+
+        loaded_scrapers = dict()
+        for o, scraper, errors in zip(searches, scrapers, loaded):
+            if errors:
+                o.errors.extend(errors)
+            else:
+                o.num_listings = len(scraper.homes)
+                loaded_scrapers[o.url] = scraper
+        return loaded_scrapers
+
+    def _properties(self, searches: dict) -> ([str], [dict], [URLOutcome]):
+        """
+        :param searches: The loaded searches
+        :return: The URL of every property to scrape, its gis search record if it has one, and the outcome of the URL
+        it's for.  Each property is only in there once, for the first URL it's in
+        """
+        urls, homes, outcomes = [], [], []
+        seen = set()
+        for o in self.outcomes:
+            if o.kind == KIND_PROPERTY:
+                o.num_listings = 1
+                candidates = [(o.url, None)]
+            elif o.url in searches:
+                scraper = searches[o.url]
+                candidates = zip(scraper.property_urls, scraper.homes)
+            else:
+                continue
+
+            for url, home in candidates:
+                url = normalize_url(url)
+                if url in seen:
+                    o.num_duplicates += 1
+                    continue
+                seen.add(url)
+                urls.append(url)
+                homes.append(home)
+                outcomes.append(o)
+        return urls, homes, outcomes
+
+    def run(self, on_analysis=None) -> TopK:
+        """
+        Run every URL
+        :param on_analysis: Optionally called with every analysis as it's done, and the URL of the batch it came from
+        :return: The best properties of every URL together
+        """
+        searches = self._load_searches()
+        urls, homes, outcomes = self._properties(searches)
+        log(f'Scraping {len(urls)} properties from {len(self.urls)} URLs')
+
+        # The property URL of an analysis is the URL it was scraped from
+        by_url = dict(zip(urls, outcomes))
+
+        def scraped():
+            for o, res in zip(outcomes, self._scraper.iter_urls(urls, homes)):
+                self.stats.num_parsed += 1
+                o.num_scraped += 1
+                if o.kind == KIND_PROPERTY:
+                    o.errors.extend(res.errors)
+                yield res
+
+        def analyzed(res: AnalysisResult):
+            o = by_url[res.property.url]
+            o.num_analyzed += 1
+            if o.best is None or res.cash_flow_per_unit > o.best.cash_flow_per_unit:
+                o.best = res
+            if on_analysis:
+                on_analysis(res, o.url)
+
+        rank_analyses(analyze_results(scraped(), self.stats, self.store), self.top, analyzed)
+        log(f'Parsed {self.stats.num_parsed} total properties.  {self.stats.num_analyzed} properties had no errors')
+        return self.top
+
+    def save(self, out_dir: str):
+        """
+        Save the outcome of every URL to urls.ndjson and the best properties of them all, best first, to ranking.csv
+        :param out_dir: The directory to save them in
+        """
+        os.makedirs(out_dir, exist_ok=True)
+        with open(os.path.join(out_dir, URLS_FILE), 'w') as f:
+            for o in self.outcomes:
+                f.write(o.to_json())
+                f.write('\n')
+        with open(os.path.join(out_dir, RANKING_FILE), 'w', newline='') as f:
+            with CSVExporter(f) as exporter:
+                for res in self.top.ranked():
+                    exporter.write(res)
+
+
+class AnalysesExporter(NDJSONExporter):
+    """
+    The NDJSON export of every analysis of a batch, with the URL of the batch each one came from as its first key,
+    source_url
+    """
+
+    def write(self, res: AnalysisResult, source_url: str = None):
+        row = dict(source_url=source_url)
+        row.update(zip(EXPORT_COLUMNS, export_row(res, utilities_as_str=False)))
+        self.out.write(self._encode(row))
+        self.out.write('\n')
+        self.num_rows += 1
+
+
+def open_analyses_file(out_dir: str) -> AnalysesExporter:
+    """
+    Open the file every analysis of a batch is streamed to, analyses.ndjson
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    return AnalysesExporter(open(os.path.join(out_dir, ANALYSES_FILE), 'w'), close_out=True)
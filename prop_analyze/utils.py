@@ -1,11 +1,68 @@
 
-def log(msg):
+import atexit
+import logging
+import logging.handlers
+import queue
+import sys
+
+# Log records are put on a queue and written by a background thread, so logging never blocks the scraper's hot path
+# on a slow terminal or file.  Until configure_logging is called, only warnings and errors are output.
+logger = logging.getLogger('prop_analyze')
+
+_log_queue: queue.Queue = None
+_log_listener: logging.handlers.QueueListener = None
+
+
+def configure_logging(level: str = 'info', stream=None):
+    """
+    Output log messages at or above a level, through a background thread
+    :param level: The lowest level to output, ie. debug, info, warning or error
+    :param stream: Where to write them.  Defaults to stdout
+    """
+    global _log_queue, _log_listener
+    stop_logging()
+
+    handler = logging.StreamHandler(stream or sys.stdout)
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    _log_queue = queue.Queue()
+    _log_listener = logging.handlers.QueueListener(_log_queue, handler)
+    _log_listener.start()
+
+    logger.handlers = [logging.handlers.QueueHandler(_log_queue)]
+    logger.setLevel(level.upper())
+    logger.propagate = False
+
+
+def flush_logs():
+    """
+    Wait for every message logged so far to be written, ie. before printing results to the same stream
+    """
+    if _log_queue is not None:
+        _log_queue.join()
+
+
+def stop_logging():
+    """
+    Write the messages still on the queue and stop the background thread
+    """
+    global _log_queue, _log_listener
+    if _log_listener is not None:
+        _log_listener.stop()
+        logger.handlers = []
+        _log_queue = _log_listener = None
+
+
+atexit.register(stop_logging)
+
+
+def log(msg, level: int = logging.INFO):
     """
-    Log an error message
+    Log a message
     :param msg: The message to log
+    :param level: The level to log it at
     :return:
     """
-    print(msg)
+    logger.log(level, msg)
 
 
 def curr_str_to_float(v: str) -> float:
@@ -33,3 +90,18 @@ def float_to_percent(f: float) -> str:
     :return: string
     """
     return '{:.1%}'.format(f)
+
+
+def slots_to_dict(o) -> dict:
+    """
+    The equivalent of __dict__ for an object with __slots__
+    :param o: The object
+    :return: dict of the slots that have been set, in the order they are declared
+    """
+    d = dict()
+    for k in type(o).__slots__:
+        try:
+            d[k] = object.__getattribute__(o, k)
+        except AttributeError:
+            pass
+    return d
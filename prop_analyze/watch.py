@@ -0,0 +1,188 @@
+import json
+from enum import Enum
+
+from prop_analyze.parsers.redfin import RFListingScraper, RF_BASE_URL, gis_value
+from prop_analyze.analysis.result import AnalysisResult
+from prop_analyze.pipeline import PipelineStats, analyze_results
+from prop_analyze.store import PropertyStore, StoreFilter
+from prop_analyze.utils import log, float_to_curr
+
+# The fields of a gis search record that mean a listing needs to be scraped again when they change
+CHANGE_FIELDS = ('price', 'mlsStatus', 'beds', 'baths', 'sqFt')
+
+
+class DeltaKind(Enum):
+    NEW = 1
+    REMOVED = 2
+    PRICE_DROP = 3
+    PRICE_INCREASE = 4
+    CHANGED = 5
+    ENTERED_TOP = 6
+    LEFT_TOP = 7
+
+
+class Delta:
+    """
+    Something that changed in a watched search since its last snapshot
+    """
+
+    kind: DeltaKind
+    property_id: str
+    listing_id: str
+    url: str = None
+    old_price: float = None
+    new_price: float = None
+
+    # The rank in the top k, for ENTERED_TOP
+    rank: int = None
+
+    # The latest analysis of the property, if there is one
+    analysis: AnalysisResult = None
+
+    def __init__(self, kind: DeltaKind, property_id: str, listing_id: str, **kwargs):
+        self.kind = kind
+        self.property_id = property_id
+        self.listing_id = listing_id
+        for k, v in kwargs.items():
+            setattr(self, k, v)
+
+    def describe(self) -> str:
+        """
+        :return: A one line description of the change
+        """
+        name = self.analysis.property.display_name if self.analysis else self.url
+        msg = f'{self.kind.name}: {name}'
+        if self.old_price is not None and self.new_price is not None:
+            msg += f' ({float_to_curr(self.old_price)} -> {float_to_curr(self.new_price)})'
+        if self.rank is not None:
+            msg += f' at #{self.rank}'
+        if self.analysis:
+            msg += f' - {float_to_curr(self.analysis.cash_flow_per_unit)} per unit'
+        return msg
+
+    def to_json(self) -> str:
+        return json.dumps({
+            'kind': self.kind.name,
+            'property_id': self.property_id,
+            'listing_id': self.listing_id,
+            'url': self.url,
+            'old_price': self.old_price,
+            'new_price': self.new_price,
+            'rank': self.rank,
+            'cash_flow_per_unit': self.analysis.cash_flow_per_unit if self.analysis else None,
+        })
+
+
+def snapshot_home(home: dict) -> (tuple, float, str):
+    """
+    Get what's tracked about a listing between snapshots
+    :param home: The gis search record of the listing
+    :return: The (property ID, listing ID) key, the price, and a fingerprint of the CHANGE_FIELDS
+    """
+    key = (str(home.get('propertyId')), str(home.get('listingId')))
+    price = gis_value(home, 'price')
+    fingerprint = json.dumps([gis_value(home, k) for k in CHANGE_FIELDS])
+    return key, float(price) if price is not None else None, fingerprint
+
+
+class SearchWatcher:
+    """
+    Watches a Redfin search.  Each poll only requests the gis search results, diffs them against the last snapshot
+    in the store, and scrapes and analyzes just the listings that are new or changed.  Everything else comes from
+    the store.
+    """
+
+    store: PropertyStore
+    count: int
+    order_by: str
+
+    def __init__(self, search_url: str, store: PropertyStore, workers: int = 1, transport=None, count: int = 10,
+                 order_by: str = 'cash_flow_per_unit'):
+        self.store = store
+        self.count = count
+        self.order_by = order_by
+
+        # Kept between polls, so the listings page only has to be requested once to find the gis URL
+        self._scraper = RFListingScraper(search_url, workers=workers, transport=transport)
+
+    @property
+    def search_url(self) -> str:
+        return self._scraper.url
+
+    def _top(self) -> [AnalysisResult]:
+        return self.store.query(StoreFilter(search_url=self.search_url), order_by=self.order_by, limit=self.count)
+
+    def poll(self) -> [Delta]:
+        """
+        Check the search for changes, and bring the store up to date with them
+        :return: The changes since the last poll, or None if the search results couldn't be loaded
+        """
+        if not self._scraper.load_homes():
+            return None
+
+        previous = self.store.get_snapshot(self.search_url)
+        previous_top = self._top()
+
+        # Diff the search results against the last snapshot
+        current = dict()
+        to_scrape = []
+        homes_by_key = dict()
+        for h in self._scraper.homes:
+            key, price, fingerprint = snapshot_home(h)
+            current[key] = (price, fingerprint)
+            homes_by_key[key] = h
+            if key not in previous or previous[key][1] != fingerprint:
+                to_scrape.append(h)
+
+        log(f'{len(current)} listings, {len(to_scrape)} new or changed since the last snapshot')
+
+        # Scrape and store just the new and changed listings
+        analyses = dict()
+        stats = PipelineStats()
+        for res in analyze_results(self._scraper.iter_homes(to_scrape), stats, self.store):
+            p = res.property
+            analyses[(p.property_id, p.listing_id)] = res
+
+        # Listings that didn't scrape (ie. they have no unit count) are kept in the snapshot too, so they're only
+        # tried again once they change, instead of on every poll
+        num_failed = len(to_scrape) - len(analyses)
+        if num_failed:
+            log(f'{num_failed} new or changed listings could not be analyzed.  They will be tried again if they change')
+        self.store.save_snapshot(self.search_url, current)
+
+        deltas = []
+
+        # The first snapshot of a search is all new, so only its top k is interesting
+        if previous:
+            for key, (price, _) in current.items():
+                url = f'{RF_BASE_URL}{homes_by_key[key]["url"]}'
+                if key not in previous:
+                    deltas.append(Delta(DeltaKind.NEW, *key, url=url, new_price=price, analysis=analyses.get(key)))
+                elif key in analyses:
+                    old_price = previous[key][0]
+                    if old_price is not None and price is not None and price < old_price:
+                        kind = DeltaKind.PRICE_DROP
+                    elif old_price is not None and price is not None and price > old_price:
+                        kind = DeltaKind.PRICE_INCREASE
+                    else:
+                        kind = DeltaKind.CHANGED
+                    deltas.append(Delta(kind, *key, url=url, old_price=old_price, new_price=price,
+                                        analysis=analyses[key]))
+
+            for key in previous.keys() - current.keys():
+                deltas.append(Delta(DeltaKind.REMOVED, *key, old_price=previous[key][0]))
+
+        # Compare the top k before and after
+        top = self._top()
+        previous_keys = set((r.property.property_id, r.property.listing_id) for r in previous_top)
+        top_keys = set((r.property.property_id, r.property.listing_id) for r in top)
+        for i, res in enumerate(top):
+            key = (res.property.property_id, res.property.listing_id)
+            if key not in previous_keys:
+                deltas.append(Delta(DeltaKind.ENTERED_TOP, *key, url=res.property.url, rank=i + 1, analysis=res))
+        for res in previous_top:
+            key = (res.property.property_id, res.property.listing_id)
+            if key not in top_keys:
+                deltas.append(Delta(DeltaKind.LEFT_TOP, *key, url=res.property.url, analysis=res))
+
+        return deltas
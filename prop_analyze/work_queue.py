@@ -0,0 +1,400 @@
+import os
+import json
+import time
+import socket
+import logging
+import sqlite3
+import multiprocessing
+from queue import Empty
+
+from prop_analyze.parsers.redfin import RFListingScraper, RFPropertyScraper
+from prop_analyze.parsers.transport import RFTransport
+from prop_analyze.analysis.analyze import Analysis
+from prop_analyze.store import PropertyStore
+from prop_analyze.profiling import Profiler, timed
+from prop_analyze import metrics, profiling
+from prop_analyze.utils import log, logger, configure_logging, stop_logging
+
+# Spreads scraping over any number of worker processes on this machine.  A coordinator expands search URLs into one job
+# per listing, on a durable queue in a SQLite database.  Workers lease a few jobs at a time, scrape and analyze them,
+# save the analyses to the property store in the same database, then mark the jobs done.  A lease expires if its worker
+# doesn't finish the jobs in time, ie. because it crashed, and then the jobs are leased to another worker.  So a job can
+# be run more than once, but the store upserts by property, and only the worker holding a job's lease can mark it done.
+# The database is in WAL mode, which needs every process using it to be on the same host, so the queue mustn't be
+# shared between machines over a network filesystem.
+
+DEFAULT_QUEUE_PATH = os.path.join(os.path.expanduser('~'), '.cache', 'prop_analyze', 'queue.db')
+
+# How long a worker has to finish the jobs it leased before they can be leased to another one
+DEFAULT_LEASE_SECONDS = 300.0
+
+# The number of jobs leased at a time
+DEFAULT_LEASE_SIZE = 4
+
+# Jobs whose lease expired this many times are given up on
+DEFAULT_MAX_ATTEMPTS = 3
+
+# How long an idle worker waits before checking the queue again
+POLL_INTERVAL = 1.0
+
+PENDING = 'pending'
+LEASED = 'leased'
+DONE = 'done'
+FAILED = 'failed'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    url TEXT NOT NULL UNIQUE,
+    search_url TEXT,
+    home TEXT,
+    state TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker TEXT,
+    lease_expires REAL,
+    errors TEXT,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, lease_expires);
+"""
+
+
+class Job:
+    """
+    A property to scrape and analyze
+    """
+
+    id: int
+    url: str
+
+    # The gis search record of the property, if it came from a search
+    home: dict = None
+
+    # The number of times it has been leased, including this time
+    attempts: int = 0
+
+    def __init__(self, id: int, url: str, home: dict = None, attempts: int = 0):
+        self.id = id
+        self.url = url
+        self.home = home
+        self.attempts = attempts
+
+
+def default_worker_id() -> str:
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+class WorkQueue:
+    """
+    The queue of jobs, in a SQLite database.  Every process opens its own WorkQueue on the same file.  Leasing is done in
+    a write transaction, so no two workers ever hold the same job at the same time
+    """
+
+    path: str
+    max_attempts: int
+
+    def __init__(self, path: str = DEFAULT_QUEUE_PATH, max_attempts: int = DEFAULT_MAX_ATTEMPTS):
+        self.path = path
+        self.max_attempts = max_attempts
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Transactions are started explicitly, so leasing can take the write lock before it reads
+        self._conn = sqlite3.connect(path, timeout=60, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript(SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._conn.close()
+
+    def _write(self, sql: str, params=()):
+        self._conn.execute('BEGIN IMMEDIATE')
+        try:
+            cur = self._conn.execute(sql, params)
+            self._conn.execute('COMMIT')
+            return cur
+        except BaseException:
+            self._conn.execute('ROLLBACK')
+            raise
+
+    def add(self, urls: [str], homes: [dict] = None, search_url: str = None) -> int:
+        """
+        Add jobs for properties.  Properties that already have a job are skipped
+        :param urls: The property URLs
+        :param homes: The gis search record of each, if they came from a search
+        :param search_url: The search they came from
+        :return: The number of jobs added
+        """
+        homes = homes if homes is not None else [None] * len(urls)
+        now = time.time()
+        rows = [(url, search_url, json.dumps(home) if home is not None else None, PENDING, now)
+                for url, home in zip(urls, homes)]
+        self._conn.execute('BEGIN IMMEDIATE')
+        try:
+            before = self._conn.total_changes
+            self._conn.executemany('INSERT OR IGNORE INTO jobs (url, search_url, home, state, updated_at) '
+                                   'VALUES (?, ?, ?, ?, ?)', rows)
+            added = self._conn.total_changes - before
+            self._conn.execute('COMMIT')
+        except BaseException:
+            self._conn.execute('ROLLBACK')
+            raise
+        return added
+
+    def lease(self, worker: str, n: int = DEFAULT_LEASE_SIZE, lease_seconds: float = DEFAULT_LEASE_SECONDS) -> [Job]:
+        """
+        Lease the next jobs, pending ones or ones whose lease expired
+        :param worker: Who's leasing them
+        :param n: The max number of jobs to lease
+        :param lease_seconds: How long the worker has to finish them
+        :return: The jobs.  Empty if there are none to lease right now
+        """
+        now = time.time()
+        self._conn.execute('BEGIN IMMEDIATE')
+        try:
+            # Jobs that keep timing out (ie. crash their worker every time) are given up on
+            self._conn.execute('UPDATE jobs SET state = ?, errors = ?, updated_at = ? '
+                               'WHERE state = ? AND lease_expires < ? AND attempts >= ?',
+                               (FAILED, json.dumps(['The lease expired too many times']), now, LEASED, now,
+                                self.max_attempts))
+            rows = self._conn.execute('SELECT id, url, home, attempts FROM jobs '
+                                      'WHERE state = ? OR (state = ? AND lease_expires < ?) ORDER BY id LIMIT ?',
+                                      (PENDING, LEASED, now, n)).fetchall()
+            self._conn.executemany('UPDATE jobs SET state = ?, worker = ?, lease_expires = ?, attempts = attempts + 1, '
+                                   'updated_at = ? WHERE id = ?',
+                                   ((LEASED, worker, now + lease_seconds, now, row[0]) for row in rows))
+            self._conn.execute('COMMIT')
+        except BaseException:
+            self._conn.execute('ROLLBACK')
+            raise
+        return [Job(id, url, json.loads(home) if home is not None else None, attempts + 1)
+                for id, url, home, attempts in rows]
+
+    def complete(self, job: Job, worker: str, errors: [str] = None) -> bool:
+        """
+        Mark a leased job done, or failed if it had errors
+        :param job: The job
+        :param worker: The worker that leased it
+        :param errors: The critical errors scraping it, if there were any
+        :return: Whether the worker still held the lease.  If it didn't, the job is left to the worker that does
+        """
+        state = FAILED if errors else DONE
+        cur = self._write('UPDATE jobs SET state = ?, errors = ?, lease_expires = NULL, updated_at = ? '
+                          'WHERE id = ? AND worker = ? AND state = ?',
+                          (state, json.dumps(errors) if errors else None, time.time(), job.id, worker, LEASED))
+        return cur.rowcount == 1
+
+    def retry_failed(self) -> int:
+        """
+        Put the failed jobs back on the queue
+        :return: The number of jobs
+        """
+        return self._write('UPDATE jobs SET state = ?, attempts = 0, errors = NULL, updated_at = ? WHERE state = ?',
+                           (PENDING, time.time(), FAILED)).rowcount
+
+    def counts(self) -> dict:
+        """
+        :return: dict of state to the number of jobs in it.  Expired leases are still counted as leased
+        """
+        counts = dict.fromkeys((PENDING, LEASED, DONE, FAILED), 0)
+        counts.update(self._conn.execute('SELECT state, COUNT(*) FROM jobs GROUP BY state').fetchall())
+        return counts
+
+    def remaining(self) -> int:
+        """
+        :return: The number of jobs that aren't done or failed
+        """
+        counts = self.counts()
+        return counts[PENDING] + counts[LEASED]
+
+    def errors(self) -> [(str, [str])]:
+        """
+        :return: The URL and errors of every failed job
+        """
+        rows = self._conn.execute('SELECT url, errors FROM jobs WHERE state = ? ORDER BY id', (FAILED,)).fetchall()
+        return [(url, json.loads(errors) if errors else []) for url, errors in rows]
+
+
+def enqueue_search(queue: WorkQueue, search_url: str, transport=None) -> int:
+    """
+    Add a job for every listing of a search
+    :param queue: The queue
+    :param search_url: The search URL
+    :param transport: The transport to load the search with
+    :return: The number of jobs added, or None if the search couldn't be loaded
+    """
+    scraper = RFListingScraper(search_url, transport=transport)
+    if not scraper.load_homes():
+        return None
+    return queue.add(scraper.property_urls, scraper.homes, search_url)
+
+
+class QueueWorker:
+    """
+    Leases jobs, scrapes and analyzes them, and saves the analyses to the store, until the queue is empty
+    """
+
+    def __init__(self, queue: WorkQueue, store: PropertyStore, transport=None, worker_id: str = None,
+                 lease_size: int = DEFAULT_LEASE_SIZE, lease_seconds: float = DEFAULT_LEASE_SECONDS):
+        self.queue = queue
+        self.store = store
+        self.transport = transport
+        self.worker_id = worker_id or default_worker_id()
+        self.lease_size = lease_size
+        self.lease_seconds = lease_seconds
+        self.user_agent = None
+
+        # The number of jobs this worker has done and failed
+        self.num_done = 0
+        self.num_failed = 0
+
+    def run_job(self, job: Job) -> [str]:
+        """
+        Scrape and analyze a job's property, and add it to the store
+        :return: The critical errors, if there were any
+        """
+        scraper = RFPropertyScraper(job.url, self.transport, job.home, self.user_agent)
+        self.user_agent = scraper.user_agent
+        with timed('scrape'):
+            res = scraper.parse()
+        scraper.release()
+        metrics.record_scrape(res)
+        if res.errors:
+            return res.errors
+
+        with timed('analysis', job.url):
+            analysis = Analysis(res.property).anaylze()
+        metrics.inc(metrics.PROPERTIES_ANALYZED_TOTAL)
+        with timed('store', job.url):
+            self.store.add(analysis, res.raw)
+        return None
+
+    def run(self, wait: bool = False, max_jobs: int = None, on_jobs_done=None) -> int:
+        """
+        Work through the queue
+        :param wait: Keep waiting for more jobs once the queue is empty, instead of stopping
+        :param max_jobs: Stop after this many jobs
+        :param on_jobs_done: Optionally called after each batch of leased jobs is done
+        :return: The number of jobs done or failed
+        """
+        num_run = 0
+        while max_jobs is None or num_run < max_jobs:
+            n = self.lease_size if max_jobs is None else min(self.lease_size, max_jobs - num_run)
+            jobs = self.queue.lease(self.worker_id, n, self.lease_seconds)
+            if not jobs:
+                # Jobs leased by other workers may still come back, if their leases expire
+                if not wait and self.queue.remaining() == 0:
+                    break
+                time.sleep(POLL_INTERVAL)
+                continue
+
+            for job in jobs:
+                errors = self.run_job(job)
+                # The analysis has to be saved before the job is marked done, so it's never lost if this worker dies
+                self.store.flush()
+                if self.queue.complete(job, self.worker_id, errors):
+                    if errors:
+                        self.num_failed += 1
+                    else:
+                        self.num_done += 1
+                num_run += 1
+            if on_jobs_done:
+                on_jobs_done()
+        return num_run
+
+
+def _work(queue_path: str, store_path: str, lease_size: int, lease_seconds: float, wait: bool, pool_size: int,
+          log_level: str, recorded: multiprocessing.Queue = None, profile: bool = False, record_metrics: bool = False):
+    # The logging thread, profiler and metrics aren't carried over to a new process.  The worker records its own
+    # timings and metrics, and sends them to the parent after every batch of jobs, to be merged into the parent's
+    configure_logging(log_level)
+    profiler = Profiler() if profile else None
+    registry = metrics.Metrics() if record_metrics else None
+    if profiler:
+        profiler.start()
+    if registry:
+        registry.start()
+
+    def send_recorded():
+        recorded.put((profiler.drain() if profiler else None, registry.drain() if registry else None))
+
+    transport = RFTransport(pool_size=pool_size)
+    try:
+        with WorkQueue(queue_path) as queue, PropertyStore(store_path) as store:
+            worker = QueueWorker(queue, store, transport, lease_size=lease_size, lease_seconds=lease_seconds)
+            worker.run(wait, on_jobs_done=send_recorded if recorded is not None else None)
+            log(f'Worker {worker.worker_id} done: {worker.num_done} properties, {worker.num_failed} failed')
+    finally:
+        transport.close()
+        if profiler:
+            profiler.stop()
+        if registry:
+            registry.stop()
+        if recorded is not None:
+            send_recorded()
+        stop_logging()
+
+
+def _merge_recorded(recorded: multiprocessing.Queue, timeout: float = None):
+    """
+    Merge what the workers sent into this process's profiler and metrics
+    :param timeout: How long to wait for the first of it.  Doesn't wait if None
+    """
+    try:
+        while True:
+            profile, values = recorded.get(timeout=timeout) if timeout else recorded.get_nowait()
+            timeout = None
+            if profile:
+                profiling.merge(profile)
+            if values:
+                metrics.merge(values)
+    except Empty:
+        pass
+
+
+def run_workers(queue_path: str, processes: int, store_path: str = None, lease_size: int = DEFAULT_LEASE_SIZE,
+                lease_seconds: float = DEFAULT_LEASE_SECONDS, wait: bool = False, pool_size: int = 2):
+    """
+    Work through the queue on a number of worker processes, each with its own connections to Redfin.  If this process
+    is profiling or recording metrics, the workers' timings and metrics are merged into its own as they go
+    :param queue_path: The queue's database
+    :param processes: The number of worker processes
+    :param store_path: The property store to save the analyses to.  Defaults to the queue's database
+    :param lease_size: The number of jobs each worker leases at a time
+    :param lease_seconds: How long a worker has to finish the jobs it leased
+    :param wait: Keep waiting for more jobs once the queue is empty, instead of stopping
+    :param pool_size: The number of pooled connections per worker
+    """
+    profile = profiling.is_profiling()
+    record_metrics = metrics.is_recording()
+    # The workers are started fresh instead of forked, like the parsing processes, so they don't copy locks held by
+    # this process's threads and run the same on every platform
+    ctx = multiprocessing.get_context('spawn')
+    recorded = ctx.Queue() if profile or record_metrics else None
+    args = (queue_path, store_path or queue_path, lease_size, lease_seconds, wait, pool_size,
+            logging.getLevelName(logger.getEffectiveLevel()).lower(), recorded, profile, record_metrics)
+    workers = [ctx.Process(target=_work, args=args) for _ in range(max(1, processes))]
+    for w in workers:
+        w.start()
+    try:
+        if recorded is None:
+            for w in workers:
+                w.join()
+        else:
+            # What the workers send has to be read before they're joined, or a worker can block on exiting until it is
+            while any(w.is_alive() for w in workers):
+                _merge_recorded(recorded, timeout=POLL_INTERVAL)
+            _merge_recorded(recorded)
+            for w in workers:
+                w.join()
+    finally:
+        for w in workers:
+            if w.is_alive():
+                w.terminate()